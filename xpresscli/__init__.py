@@ -1,4 +1,4 @@
-from models import Client
+from .client import Client
 
 __version__ = '0.1.0'
 
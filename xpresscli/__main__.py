@@ -0,0 +1,77 @@
+import sys
+
+from .experiment import CLIParser
+
+
+def parser_spec():
+    """The parser spec for the xpresscli command itself"""
+    return {
+        "parser": {
+            "prog": "xpresscli",
+            "description": "Tools for xpresscli parser specs",
+            "subparsers": {
+                "dest": "command",
+                "title": "Tools",
+                "required": True,
+                "commands": [
+                    {
+                        "name": "compile",
+                        "help": "compile a spec to a standalone parser module",
+                        "description": "generate a Python module that builds the parser without loading the spec",
+                        "manager": "xpresscli.compiler.handle_compile",
+                        "options": [
+                            {
+                                "flag": ["spec_file"],
+                                "type": "pathlib.Path",
+                                "help": "the JSON parser spec"
+                            },
+                            {
+                                "flag": ["-o", "--output"],
+                                "type": "pathlib.Path",
+                                "help": "write the module to this file [default: stdout]"
+                            }
+                        ]
+                    },
+                    {
+                        "name": "validate",
+                        "help": "check a spec for problems",
+                        "description": "report every problem in the spec with its JSON path",
+                        "manager": "xpresscli.schema.handle_validate",
+                        "options": [
+                            {
+                                "flag": ["spec_file"],
+                                "help": "the JSON parser spec"
+                            }
+                        ]
+                    },
+                    {
+                        "name": "run",
+                        "help": "run a command defined in a spec",
+                        "description": "parse the command line with the parser in the spec and run its manager",
+                        "manager": "xpresscli.client.handle_run",
+                        "options": [
+                            {
+                                "flag": ["spec_file"],
+                                "help": "the JSON parser spec"
+                            },
+                            {
+                                "flag": ["argv"],
+                                "nargs": "...",
+                                "help": "the command line to run"
+                            }
+                        ]
+                    }
+                ]
+            }
+        }
+    }
+
+
+def main(argv=None):
+    parser = CLIParser(parser_spec())
+    args = parser.parse_args(argv)
+    return parser.managers[args.command](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
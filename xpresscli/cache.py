@@ -0,0 +1,46 @@
+"""Small helpers for the files xpresscli caches between runs"""
+from __future__ import annotations
+
+import os
+
+
+def cache_dir() -> str:
+    """The directory for xpresscli caches
+
+    ``XPRESSCLI_CACHE_DIR`` takes precedence over ``$XDG_CACHE_HOME/xpresscli`` and ``~/.cache/xpresscli``.
+    """
+    directory = os.environ.get('XPRESSCLI_CACHE_DIR')
+    if directory is None:
+        directory = os.path.join(
+            os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+            'xpresscli'
+        )
+    return directory
+
+
+def read_json(filename, default=None):
+    """Return the contents of the JSON file or the default if it is missing or unreadable"""
+    import json
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json(filename, data) -> bool:
+    """Atomically replace the JSON file; return False if it could not be written or the data is not JSON"""
+    import json
+    temporary = f"{filename}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        with open(temporary, 'w') as f:
+            json.dump(data, f)
+        os.replace(temporary, filename)
+    except (OSError, TypeError, ValueError):
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        return False
+    return True
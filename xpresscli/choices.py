@@ -0,0 +1,133 @@
+"""Choices for options with too many valid values to list
+
+An option's ``choices`` may be a mapping naming where the values come from instead of a list::
+
+    "choices": {"values": ["emd_1234", "emd_1235"]}
+    "choices": {"file": "entries.txt"}
+    "choices": {"callable": "oil.entries.entry_ids"}
+
+A file has one value per line (blank lines and lines starting with ``#`` are skipped) or is a JSON list if its name
+ends in ``.json``. The values of a file are converted with the option's ``type``. A callable takes no arguments and
+returns an iterable of values. Files and callables are only read when a value is first checked, and each file is
+read once per process for as long as it is unchanged.
+
+Membership is checked against a :class:`frozenset`. Help and error messages show the first few values and the
+count. Shell completion uses a sorted index built the first time it is asked for completions.
+"""
+from __future__ import annotations
+
+import os
+
+#: how many values help and error messages show
+RENDER_LIMIT = 5
+
+#: the keys of a choices mapping, one of which must be given
+SOURCES = ('values', 'file', 'callable')
+
+# (path, convert) -> ((st_mtime_ns, st_size), values)
+_files = dict()
+
+
+def _read(filename, convert=None) -> frozenset:
+    """The values in the file, reusing the values already read if the file has not changed"""
+    path = os.path.realpath(os.path.expanduser(str(filename)))
+    stat = os.stat(path)
+    identity = stat.st_mtime_ns, stat.st_size
+    cached = _files.get((path, convert))
+    if cached is not None and cached[0] == identity:
+        return cached[1]
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            import json
+            values = json.load(f)
+        else:
+            values = [line.strip() for line in f]
+            values = [value for value in values if value and not value.startswith('#')]
+    if convert is not None:
+        values = map(convert, values)
+    values = frozenset(values)
+    _files[(path, convert)] = identity, values
+    return values
+
+
+def clear_cache():
+    _files.clear()
+
+
+class IndexedChoices:
+    """A set of choices that is hashed for membership tests and loaded when it is first used
+
+    Iterating gives the values in sorted order.
+    """
+
+    def __init__(self, values=None, filename=None, function=None, convert=None):
+        if sum(source is not None for source in (values, filename, function)) != 1:
+            raise ValueError(f"choices must give exactly one of {', '.join(SOURCES)}")
+        self.filename = filename
+        self.function = function
+        self.convert = convert
+        self._values = None if values is None else frozenset(values)
+        self._sorted = None
+        self._keys = None
+
+    @classmethod
+    def from_spec(cls, spec: dict, convert=None) -> IndexedChoices:
+        """The choices for a ``choices`` mapping in a spec"""
+        unknown = set(spec) - set(SOURCES)
+        if unknown:
+            raise ValueError(f"unknown choices key {sorted(unknown)[0]!r}; one of {', '.join(SOURCES)}")
+        return cls(spec.get('values'), spec.get('file'), spec.get('callable'), convert)
+
+    @property
+    def values(self) -> frozenset:
+        if self._values is None:
+            if self.filename is not None:
+                self._values = _read(self.filename, self.convert)
+            else:
+                from .experiment import resolve_name
+                self._values = frozenset(resolve_name(self.function)())
+        return self._values
+
+    def __contains__(self, value):
+        try:
+            return value in self.values
+        except TypeError:
+            # unhashable values are never choices
+            return False
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.index())
+
+    def index(self) -> tuple:
+        """The values sorted by their text for prefix searches"""
+        if self._sorted is None:
+            self._sorted = tuple(sorted(self.values, key=str))
+            self._keys = tuple(map(str, self._sorted))
+        return self._sorted
+
+    def completions(self, prefix='') -> list:
+        """The values whose text starts with ``prefix``"""
+        import bisect
+        index = self.index()
+        start = bisect.bisect_left(self._keys, prefix)
+        end = bisect.bisect_right(self._keys, prefix + '\U0010ffff', start)
+        return list(index[start:end])
+
+    def render(self, limit=RENDER_LIMIT) -> str:
+        """The first values and the number of values"""
+        import heapq
+        shown = heapq.nsmallest(limit, self.values, key=str)
+        text = ', '.join(map(repr, shown))
+        if len(self.values) > limit:
+            text += f", ... ({len(self.values)} choices)"
+        return text
+
+    def __repr__(self):
+        if self.filename is not None:
+            return f"IndexedChoices(filename={self.filename!r})"
+        if self.function is not None:
+            return f"IndexedChoices(function={self.function!r})"
+        return f"IndexedChoices({self.render()})"
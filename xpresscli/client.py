@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import threading
+from typing import NamedTuple, Optional
+
+from . import memprofile
+from .experiment import STREAM_FORMATS, CLIParser, ParserExit
+from .output import is_stream, stream_records
+from .plugins import merge_plugin_commands
+from .spec import copy_spec, load_spec, normalize_spec
+
+_invocation = threading.local()
+_install_lock = threading.Lock()
+
+
+class _ThreadLocalStream:
+    """Stands in for ``sys.stdin``/``sys.stdout``/``sys.stderr`` and routes each thread to its own stream
+
+    Threads without a stream of their own use the stream that was replaced.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    @property
+    def _target(self):
+        return getattr(self._local, 'stream', None) or self._stream
+
+    def write(self, data):
+        return self._target.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def __iter__(self):
+        return iter(self._target)
+
+
+def _thread_local_stream(name) -> _ThreadLocalStream:
+    """Put a :class:`_ThreadLocalStream` in place of ``sys.<name>`` unless it is already there"""
+    stream = getattr(sys, name)
+    if not isinstance(stream, _ThreadLocalStream):
+        with _install_lock:
+            stream = getattr(sys, name)
+            if not isinstance(stream, _ThreadLocalStream):
+                stream = _ThreadLocalStream(stream)
+                setattr(sys, name, stream)
+    return stream
+
+
+@contextlib.contextmanager
+def _redirect(**streams):
+    """Route this thread's standard streams to the given streams"""
+    proxies = {name: _thread_local_stream(name) for name in streams}
+    for name, stream in streams.items():
+        proxies[name]._local.stream = stream
+    try:
+        yield
+    finally:
+        for proxy in proxies.values():
+            proxy._local.stream = None
+
+
+def get_environ():
+    """The environment of the current :meth:`Client.invoke` call or ``os.environ`` outside one"""
+    environ = getattr(_invocation, 'environ', None)
+    return os.environ if environ is None else environ
+
+
+class InvocationResult(NamedTuple):
+    """The outcome of :meth:`Client.invoke`"""
+    #: the exit status as the process would have had it
+    exit_status: int
+    #: everything written to stdout during the call
+    stdout: str
+    #: everything written to stderr during the call
+    stderr: str
+    #: the parser's error message if the command line was invalid
+    error: Optional[str] = None
+    #: the exception raised by a manager, if any
+    exception: Optional[BaseException] = None
+
+
+class Client:
+    """User facing class used to instantiate a xpresscli object
+
+    The parser is built from the spec in ``parser_file`` unless the spec itself is given as ``parser_spec``; specs in
+    the ``DynamicParser`` format are translated (see :func:`spec.normalize_spec`). The spec is validated first
+    (see :mod:`xpresscli.schema`) unless ``validate`` is false.
+
+    With ``--xcli-memprofile PATH`` on the program's command line or ``XPRESSCLI_MEMPROFILE=PATH`` in the environment
+    the memory used to build the parser and to parse and run the command is written to ``PATH``
+    (see :mod:`xpresscli.memprofile`). Each command given to :meth:`execute` afterwards (e.g. in the shell) with the
+    environment variable set writes its own report, numbered ``PATH-2``, ``PATH-3`` and so on. :meth:`invoke` does
+    not profile commands; if it is called first, the report only has the build.
+    """
+
+    def __init__(self, parser_file='cli.json', parser_spec: dict = None, validate: bool = True):
+        self._parser_file = parser_file
+        filename = memprofile.requested()
+        # the number of memory reports written to each path
+        self._memprofile_reports = dict()
+        self._memprofile = None
+        if filename is not None:
+            self._memprofile = memprofile.MemoryProfile(self._report_file(filename)).start()
+        with memprofile.phase(self._memprofile, 'build'):
+            self._build(parser_file, parser_spec, validate)
+
+    def _build(self, parser_file, parser_spec, validate):
+        if parser_spec is None:
+            parser_spec = load_spec(parser_file)
+            filename = str(parser_file)
+        else:
+            parser_spec = copy_spec(parser_spec)
+            filename = None
+        parser_spec = merge_plugin_commands(normalize_spec(parser_spec))
+        if validate:
+            from .schema import check_spec
+            check_spec(parser_spec, filename)
+        self.parser = CLIParser(parser_spec)
+        self.managers = self.parser.managers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._finish_memprofile()
+        return False
+
+    def _report_file(self, filename) -> str:
+        count = self._memprofile_reports[filename] = self._memprofile_reports.get(filename, 0) + 1
+        return memprofile.numbered(filename, count)
+
+    def _finish_memprofile(self, argv=None):
+        """Write the report of the profile started when the client was built if no command has used it"""
+        profile, self._memprofile = self._memprofile, None
+        if profile is not None:
+            profile.argv = argv
+            profile.finish()
+
+    def execute(self, command=None, short_circuit: bool = None) -> int:
+        """Execute the command using the parser and manager
+
+        The command line may chain several commands with the parser's separator (``++`` by default), e.g.
+        ``prep -e emd_1 ++ load -e emd_1``. Every command is parsed before any is run and all of them share this
+        client's parser and managers. Managers that return records (iterators or async iterators) have them
+        written as they are produced (see :mod:`xpresscli.output`). The exit status is that of the first command
+        that fails, or zero. Unless ``short_circuit`` (by default taken from the spec) is false, no more commands are
+        run after a failure.
+
+        A leading ``--shell`` (unless the spec defines it) starts the interactive shell instead.
+        """
+        argv = sys.argv[1:] if command is None else list(command)
+        argv, filename = memprofile.strip_flag(argv)
+        if argv[:1] == ['--shell'] and '--shell' not in self.parser._option_string_actions:
+            self._finish_memprofile(argv)
+            return self.shell()
+        # a profile started when the client was built covers the first command it runs
+        profile, self._memprofile = self._memprofile, None
+        if profile is None:
+            filename = filename or memprofile.requested(argv)
+            if filename is None:
+                return self._run(argv, short_circuit)
+            profile = memprofile.MemoryProfile(self._report_file(filename))
+        with profile:
+            profile.argv = argv
+            return self._run(argv, short_circuit, profile)
+
+    def _run(self, argv, short_circuit=None, profile=None):
+        if short_circuit is None:
+            short_circuit = self.parser.short_circuit
+        with memprofile.phase(profile, 'parse'):
+            chain = [self.parser.parse_args(args, env=get_environ()) for args in self.parser.split_chain(argv)]
+        with memprofile.phase(profile, 'dispatch'):
+            return self._dispatch(chain, short_circuit)
+
+    def _dispatch(self, chain, short_circuit):
+        exit_status = 0
+        subparsers = self.parser.subparsers
+        # without a dest argparse does not record the command
+        dest = None if subparsers is None or subparsers.dest == argparse.SUPPRESS else subparsers.dest
+        for args in chain:
+            name = None if dest is None else getattr(args, dest)
+            if name is None:
+                self.parser.error("a command is required")
+            if name not in self.managers:
+                self.parser.exit(1, f"{self.parser.prog}: error: no manager for command {name!r}\n")
+            status = self.managers[name](args)
+            if is_stream(status):
+                status = stream_records(
+                    status,
+                    getattr(args, 'xcli_output_format', STREAM_FORMATS[0]),
+                    getattr(args, 'xcli_output', None)
+                )
+            if status and not exit_status:
+                exit_status = status
+                if short_circuit:
+                    break
+        if len(chain) == 1:
+            return status
+        return exit_status
+
+    def invoke(self, argv, stdin=None, env=None, short_circuit: bool = None) -> InvocationResult:
+        """Run the command line in this thread and return the outcome instead of exiting
+
+        Unlike :meth:`execute` this neither reads ``sys.argv`` nor raises ``SystemExit``, and any number of threads
+        may invoke commands on one client at the same time. What the parser and the managers write to
+        ``sys.stdout`` and ``sys.stderr`` is captured for this call only (the first call puts thread-aware stand-ins
+        for the standard streams in place).
+
+        :param argv: the command line without the program name
+        :param stdin: a string or a file object to serve as ``sys.stdin`` [default: no input]
+        :param env: the environment to use in place of ``os.environ``; managers read it with :func:`get_environ`
+        """
+        self._finish_memprofile()
+        stdout, stderr = io.StringIO(), io.StringIO()
+        if stdin is None or isinstance(stdin, str):
+            stdin = io.StringIO(stdin or '')
+        error = exception = None
+        _invocation.environ = env
+        try:
+            with _redirect(stdin=stdin, stdout=stdout, stderr=stderr):
+                try:
+                    exit_status = self._run(list(argv), short_circuit)
+                except ParserExit as exit:
+                    exit_status = exit.status
+                    if exit.status and exit.message:
+                        error = exit.message.strip()
+                except SystemExit as exit:
+                    if exit.code is None or isinstance(exit.code, int):
+                        exit_status = exit.code or 0
+                    else:
+                        print(exit.code, file=sys.stderr)
+                        exit_status = 1
+                except Exception as err:
+                    import traceback
+                    traceback.print_exc()
+                    exit_status, exception = 1, err
+        finally:
+            _invocation.environ = None
+        if exit_status is None:
+            exit_status = 0
+        return InvocationResult(exit_status, stdout.getvalue(), stderr.getvalue(), error, exception)
+
+    def shell(self, history_file=None, **kwargs) -> int:
+        """Run commands interactively in this process and return the exit status of the last one
+
+        :param history_file: where to keep the command history [default: ~/.<prog>_history]
+        """
+        from .shell import Shell
+        shell = Shell(self, history_file=history_file, **kwargs)
+        shell.cmdloop()
+        return shell.exit_status
+
+
+def handle_run(args) -> int:
+    """The manager for the 'run' command."""
+    with Client(args.spec_file) as client:
+        return client.execute(args.argv)
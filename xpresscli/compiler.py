@@ -0,0 +1,245 @@
+"""Compile a parser spec into a standalone Python module
+
+The generated module builds the parser with direct ``add_argument`` calls, resolved types and a static
+dispatch table so that running it needs neither the spec, ``json`` nor ``eval``. It depends on xpresscli at run
+time only if the spec uses ``env`` or ``config`` fallbacks, ``choices`` mappings, ``retry`` or ``timeout`` policies
+or ``stream`` (see :func:`compile_spec`).
+"""
+from __future__ import annotations
+
+import copy
+import re
+
+from .experiment import stream_options
+from .plugins import merge_plugin_commands
+from .spec import load_spec, normalize_spec
+
+_DOTTED_NAME = re.compile(r'[A-Za-z_]\w*(\.[A-Za-z_]\w*)+')
+
+_TEMPLATE = '''\
+"""Parser for {prog!r} generated by xpresscli; do not edit"""
+{imports}
+
+COMMAND_DEST = {command_dest!r}
+
+MANAGERS = {{
+{managers}}}
+{policies}{streams}
+
+def build_parser():
+{body}
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    command = None if COMMAND_DEST is None else getattr(args, COMMAND_DEST)
+    if command is None:
+        parser.error("a command is required")
+    if command not in MANAGERS:
+        parser.exit(1, f"{{parser.prog}}: error: no manager for command {{command!r}}\\n")
+    module, function = MANAGERS[command]
+{dispatch}
+
+if __name__ == '__main__':
+    sys.exit(main())
+'''
+
+
+# only emitted for specs with retry or timeout policies, which need xpresscli at run time (as do specs with env or
+# config fallbacks and streaming commands)
+_POLICIES_TEMPLATE = '''
+POLICIES = {{
+{policies}}}
+'''
+
+_POLICY_DISPATCH = '''\
+    if command in POLICIES:
+        from xpresscli.experiment import Manager
+        return Manager(f"{module}.{function}", **POLICIES[command])(args)
+'''
+
+_DISPATCH = '''\
+    return getattr(importlib.import_module(module), function)(args)
+'''
+
+# only emitted for specs with streaming commands, which need xpresscli at run time
+_STREAM_DISPATCH = '''\
+    if command in POLICIES:
+        from xpresscli.experiment import Manager
+        result = Manager(f"{module}.{function}", **POLICIES[command])(args)
+    else:
+        result = getattr(importlib.import_module(module), function)(args)
+    if command in STREAMS:
+        from xpresscli.output import is_stream, stream_records
+        if is_stream(result):
+            return stream_records(result, args.xcli_output_format, args.xcli_output)
+    return result
+'''
+
+
+class _Emitter:
+    """Accumulates the body of the generated ``build_parser`` function"""
+
+    def __init__(self, extensions=False):
+        self.lines = list()
+        self.imports = {'argparse', 'importlib', 'sys'}
+        # options with env or config fallbacks or indexed choices need the parser class from xpresscli at run time
+        self.extensions = extensions
+        self.parser_class = 'CommandParser' if extensions else 'argparse.ArgumentParser'
+
+    def emit(self, line):
+        self.lines.append(f"    {line}")
+
+    def arguments(self, *args, **kwargs):
+        """Render call arguments with every value as a Python literal"""
+        rendered = [repr(arg) for arg in args]
+        for key, value in kwargs.items():
+            if key == 'type':
+                rendered.append(f"type={self.type_source(value)}")
+            else:
+                rendered.append(f"{key}={value!r}")
+        return ', '.join(rendered)
+
+    def type_source(self, type_string):
+        """The source for a type named in the spec, importing its module if it is dotted"""
+        if _DOTTED_NAME.fullmatch(type_string):
+            self.imports.add(type_string.rsplit('.', 1)[0])
+        return type_string
+
+    def options(self, target, options):
+        for arg_spec in options or []:
+            arg_spec = dict(arg_spec)
+            flag = arg_spec.pop('flag')
+            fallbacks = {key: arg_spec.pop(key) for key in ['env', 'config'] if key in arg_spec}
+            choices = arg_spec.pop('choices') if isinstance(arg_spec.get('choices'), dict) else None
+            call = f"{target}.add_argument({self.arguments(*flag, **arg_spec)})"
+            if choices is not None:
+                call = f"add_choices({call}, {choices!r})"
+            if fallbacks:
+                call = f"add_fallbacks({call}, {self.arguments(**fallbacks)})"
+            self.emit(call)
+
+    def groups(self, target, groups):
+        for group_spec in groups or []:
+            group_spec = dict(group_spec)
+            options = group_spec.pop('options')
+            self.emit(f"group = {target}.add_argument_group({self.arguments(**group_spec)})")
+            self.options('group', options)
+
+    def mutually_exclusive_groups(self, target, mutex_groups):
+        for group_spec in mutex_groups or []:
+            group_spec = dict(group_spec)
+            group_spec.pop('title')
+            options = group_spec.pop('options')
+            self.emit(f"group = {target}.add_mutually_exclusive_group({self.arguments(**group_spec)})")
+            self.options('group', options)
+
+
+def _has_extensions(spec) -> bool:
+    """Whether any option in the spec declares env or config fallbacks or indexed choices"""
+    if isinstance(spec, dict):
+        if 'flag' in spec and ('env' in spec or 'config' in spec or isinstance(spec.get('choices'), dict)):
+            return True
+        return any(_has_extensions(value) for value in spec.values())
+    if isinstance(spec, list):
+        return any(_has_extensions(value) for value in spec)
+    return False
+
+
+def compile_spec(parser_spec: dict) -> str:
+    """Return the source of a module that builds the same parser as ``CLIParser(parser_spec)``
+
+    The spec is walked in the same order as :class:`CLIParser` so that help output and positional
+    ordering are identical. Options with ``env`` or ``config`` fallbacks or a ``choices`` mapping are set up with
+    :mod:`xpresscli.experiment`, and so are commands with ``retry`` or ``timeout`` policies; the records of
+    ``stream`` commands are written with :mod:`xpresscli.output`. The module imports xpresscli only for these.
+    """
+    parser_spec = merge_plugin_commands(copy.deepcopy(normalize_spec(parser_spec)))
+    emitter = _Emitter(extensions=_has_extensions(parser_spec))
+    spec = parser_spec['parser']
+    parent_parsers_spec = spec.pop('parent_parsers', None)
+    subparsers_spec = spec.pop('subparsers', None)
+    options = spec.pop('options', None)
+    groups = spec.pop('groups', None)
+    mutex_groups = spec.pop('mutually_exclusive_groups', None)
+    # chaining is handled by Client.execute
+    spec.pop('chain', None)
+    config_option = spec.pop('config_option', None)
+    emitter.emit(f"parser = {emitter.parser_class}({emitter.arguments(**spec)})")
+    if config_option is not None:
+        emitter.emit(f"parser.config_option = {config_option!r}")
+    emitter.emit("parents = dict()")
+    for parent_spec in parent_parsers_spec or []:
+        parent_spec = dict(parent_spec)
+        parent_options = parent_spec.pop('options')
+        emitter.emit(f"parents[{parent_spec['prog']!r}] = argparse.ArgumentParser({emitter.arguments(**parent_spec)})")
+        emitter.options(f"parents[{parent_spec['prog']!r}]", parent_options)
+    managers = dict()
+    policies = dict()
+    streams = list()
+    command_dest = None
+    if subparsers_spec is not None:
+        subparsers_spec = dict(subparsers_spec)
+        commands = subparsers_spec.pop('commands', None)
+        subparsers_spec.pop('subparsers', None)
+        command_dest = subparsers_spec.get('dest')
+        emitter.emit(
+            f"subparsers = parser.add_subparsers({emitter.arguments(**subparsers_spec)}, "
+            f"parser_class={emitter.parser_class})"
+        )
+        for command in commands:
+            command = dict(command)
+            command_options = command.pop('options', None)
+            command_groups = command.pop('groups', None)
+            command_mutex_groups = command.pop('mutually_exclusive_groups', None)
+            # the command's dest holds the alias it was called by
+            aliases = [command['name'], *(command.get('aliases') or ())]
+            manager_string = command.pop('manager', None)
+            if manager_string is not None:
+                managers.update(dict.fromkeys(aliases, tuple(manager_string.rsplit('.', 1))))
+            command_policies = {key: command.pop(key) for key in ['retry', 'timeout'] if key in command}
+            if command_policies:
+                policies.update(dict.fromkeys(aliases, command_policies))
+            stream = command.pop('stream', None)
+            if stream:
+                streams.extend(aliases)
+                command_options = (command_options or []) + stream_options(stream)
+            parents = ', '.join(f"parents[{parent!r}]" for parent in command.pop('parents', None) or [])
+            emitter.emit(f"command = subparsers.add_parser({emitter.arguments(**command)}, parents=[{parents}])")
+            # mirror CLIParser: groups are only added to commands that have options
+            if command_options is not None:
+                emitter.options('command', command_options)
+                emitter.groups('command', command_groups)
+                emitter.mutually_exclusive_groups('command', command_mutex_groups)
+    emitter.options('parser', options)
+    emitter.groups('parser', groups)
+    emitter.mutually_exclusive_groups('parser', mutex_groups)
+    return _TEMPLATE.format(
+        prog=spec.get('prog'),
+        imports='\n'.join(
+            [f"import {module}" for module in sorted(emitter.imports)]
+            + (["from xpresscli.experiment import CommandParser, add_choices, add_fallbacks"]
+               if emitter.extensions else [])
+        ),
+        command_dest=command_dest,
+        managers=''.join(f"    {name!r}: {target!r},\n" for name, target in managers.items()),
+        policies=_POLICIES_TEMPLATE.format(
+            policies=''.join(f"    {name!r}: {policy!r},\n" for name, policy in policies.items())
+        ) if policies or streams else '',
+        streams=f"\nSTREAMS = {tuple(streams)!r}\n" if streams else '',
+        dispatch=_STREAM_DISPATCH if streams else _POLICY_DISPATCH + _DISPATCH if policies else _DISPATCH,
+        body='\n'.join(emitter.lines),
+    )
+
+
+def handle_compile(args) -> int:
+    """The manager for the 'compile' command."""
+    source = compile_spec(load_spec(args.spec_file))
+    if args.output is None:
+        print(source, end='')
+    else:
+        with open(args.output, 'w') as f:
+            f.write(source)
+    return 0
@@ -0,0 +1,56 @@
+"""Config files for options with ``config`` fallbacks
+
+Imported by :mod:`xpresscli.experiment` only when a config file is read, to keep :mod:`configparser` off the
+startup path.
+"""
+from __future__ import annotations
+
+import configparser
+import os
+from typing import Iterable, List, Optional, Union
+
+
+class LocalConfigParser(configparser.ConfigParser):
+    """A local config parser that can be used to parse a config file."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(
+            interpolation=configparser.ExtendedInterpolation(),
+            converters={
+                'list': self.get_list,
+                'tuple': self.get_tuple,
+                'python': self.get_python,
+            }, *args, **kwargs)
+        self._filenames = None
+
+    @property
+    def filenames(self):
+        return self._filenames
+
+    def read(self, filenames: Union[os.PathLike, Iterable[os.PathLike]], encoding: Optional[str] = None) -> List[str]:
+        self._filenames = filenames
+        return super().read(filenames, encoding)
+
+    def __str__(self):
+        string = ""
+        for section in self.sections():
+            string += f"[{section}]\n"
+            for option in self[section]:
+                string += f"{option} = {self.get(section, option, raw=True)}\n"
+            string += "\n"
+        return string
+
+    @staticmethod
+    def get_list(value):
+        """Convert the option value to a list"""
+        return list(map(lambda s: s.strip(), value.split(',')))
+
+    @staticmethod
+    def get_tuple(value):
+        """Convert the option value to a tuple"""
+        return tuple(map(lambda s: s.strip(), value.split(',')))
+
+    @staticmethod
+    def get_python(value):
+        """Evaluate the option value as literal Python code"""
+        return eval(value)
@@ -1,24 +1,49 @@
 from __future__ import annotations
 
 import argparse
-import configparser
+import builtins
+import collections.abc
+import copy
+import functools
 import importlib
-import inspect
-import json
 import os
-import pathlib
-import shlex
 import sys
-import unittest
-from typing import Union, Optional, Iterable, List
+import threading
+import time
+from typing import Union, Optional, List
 
-_ = pathlib.Path  # prevent pycharm from removing the import
+from .choices import IndexedChoices
+from .plugins import merge_plugin_commands
+
+
+def __getattr__(name):
+    # the config parser lives with the rest of the config support, which is only imported when it is used
+    if name == 'LocalConfigParser':
+        from .config import LocalConfigParser
+        return LocalConfigParser
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def resolve_name(name):
+    """The object named by a builtin name such as ``int`` or a dotted name such as ``pathlib.Path``
+
+    The module of a dotted name is imported when the name is resolved.
+    """
+    if '.' not in name:
+        return getattr(builtins, name)
+    module, attribute = name.rsplit('.', 1)
+    return getattr(importlib.import_module(module), attribute)
+
+
+def _load_specs(specs):
+    import json
+    return json.loads(specs)
 
 
 def parse_options(parser, options):
     """Parse the options"""
     if isinstance(options, str):
-        specs = json.loads(options)
+        specs = _load_specs(options)
     elif isinstance(options, list):
         specs = options
     elif options is None:
@@ -28,16 +53,23 @@ def parse_options(parser, options):
     for arg_spec in specs:
         # Add the argument to the parser
         flag = arg_spec.pop('flag')
-        # fixme: convert string types to actual types
         if 'type' in arg_spec:
-            arg_spec['type'] = eval(arg_spec['type'])
-        parser.add_argument(*flag, **arg_spec)
+            arg_spec['type'] = resolve_name(arg_spec['type'])
+        env = arg_spec.pop('env', None)
+        config = arg_spec.pop('config', None)
+        # indexed choices are added once the type is known so that file values can be converted
+        choices = arg_spec.pop('choices') if isinstance(arg_spec.get('choices'), dict) else None
+        action = parser.add_argument(*flag, **arg_spec)
+        if choices is not None:
+            add_choices(action, choices)
+        if env is not None or config is not None:
+            add_fallbacks(action, env, config)
 
 
 def parse_groups(parser, groups):
     """Parse the groups"""
     if isinstance(groups, str):
-        specs = json.loads(groups)
+        specs = _load_specs(groups)
     elif isinstance(groups, list):
         specs = groups
     elif groups is None:
@@ -56,7 +88,7 @@ def parse_groups(parser, groups):
 def parse_mutually_exclusive_groups(parser, mutex_groups):
     """Parse the mutually exclusive mutex_groups"""
     if isinstance(mutex_groups, str):
-        specs = json.loads(mutex_groups)
+        specs = _load_specs(mutex_groups)
     elif isinstance(mutex_groups, list):
         specs = mutex_groups
     elif mutex_groups is None:
@@ -76,7 +108,7 @@ def parse_mutually_exclusive_groups(parser, mutex_groups):
 def parse_parents(parent_parsers_spec) -> Dict[argparse.ArgumentParser]:
     """Parse the parent parsers"""
     if isinstance(parent_parsers_spec, str):
-        specs = json.loads(parent_parsers_spec)
+        specs = _load_specs(parent_parsers_spec)
     elif isinstance(parent_parsers_spec, list):
         specs = parent_parsers_spec
     elif parent_parsers_spec is None:
@@ -93,10 +125,347 @@ def parse_parents(parent_parsers_spec) -> Dict[argparse.ArgumentParser]:
     return parent_parsers
 
 
-class CLIParser(argparse.ArgumentParser):
+class LazySubParsersAction(argparse._SubParsersAction):
+    """Subparsers action that finishes building a command parser only when the command is selected
+
+    Each command gets a bare parser up front so that the command names and help are available to the
+    main parser. Parent options and the command's own options are only added to the parser of the command
+    that is actually used so build time grows with the number of commands rather than commands times options.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending = dict()
+        self._lock = threading.Lock()
+
+    def add_parser(self, name, setup=None, **kwargs):
+        """Add a parser for the command and defer calling ``setup(parser)`` until it is needed"""
+        parser = super().add_parser(name, **kwargs)
+        if setup is not None:
+            # the command and its aliases share a single pending setup
+            pending = [setup]
+            for alias in [name, *kwargs.get('aliases', ())]:
+                self._pending[alias] = pending
+        return parser
+
+    def get_parser(self, name):
+        """The fully built parser for the command; safe to call from several threads"""
+        if name in self._pending:
+            with self._lock:
+                pending = self._pending.get(name)
+                if pending:
+                    pending.pop()(self._name_parser_map[name])
+                # only forget the command once it is built so that other threads wait for the lock
+                self._pending.pop(name, None)
+        return self._name_parser_map[name]
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        if values[0] in self._pending:
+            self.get_parser(values[0])
+        super().__call__(parser, namespace, values, option_string=option_string)
+
+
+#: the formats the records of a streaming command can be written in; the first is the default
+STREAM_FORMATS = ('jsonl', 'csv', 'table')
+
+
+def stream_options(stream_spec) -> list:
+    """The option specs for choosing the output of a command declaring ``stream``
+
+    ``stream_spec`` is ``true`` or a mapping with any of ``format`` (the default format), ``format_flag`` and
+    ``output_flag``. The values are read from ``xcli_output_format`` and ``xcli_output``.
+    """
+    if not isinstance(stream_spec, dict):
+        stream_spec = dict()
+    output_format = stream_spec.get('format', STREAM_FORMATS[0])
+    return [
+        {
+            "flag": stream_spec.get('format_flag', ['--output-format']),
+            "dest": "xcli_output_format",
+            "metavar": "FORMAT",
+            "choices": list(STREAM_FORMATS),
+            "default": output_format,
+            "help": f"write the results as one of {', '.join(STREAM_FORMATS)} [default: {output_format}]",
+        },
+        {
+            "flag": stream_spec.get('output_flag', ['--output']),
+            "dest": "xcli_output",
+            "metavar": "FILE",
+            "help": "write the results to this file, compressed if it ends in .gz, .bz2 or .xz [default: stdout]",
+        },
+    ]
+
+
+def setup_command(command_parser, parents=None, options=None, groups=None, mutex_groups=None):
+    """Add the parent actions and the command's own options and groups to the command parser"""
+    for parent in parents or []:
+        # the same as passing parents to the constructor; actions are shared by reference
+        command_parser._add_container_actions(parent)
+        command_parser._defaults.update(parent._defaults)
+    if options is not None:
+        parse_options(command_parser, options)
+        if groups is not None:
+            parse_groups(command_parser, groups)
+        if mutex_groups is not None:
+            parse_mutually_exclusive_groups(command_parser, mutex_groups)
+
+
+class ParserExit(SystemExit):
+    """Raised by the parsers where argparse would call ``sys.exit``
+
+    Left uncaught it ends the program exactly as ``sys.exit`` would; a caller that must keep running
+    (e.g. the interactive shell) catches it and reads ``status`` and ``message`` instead.
+    """
+
+    def __init__(self, status=0, message=None):
+        super().__init__(status)
+        self.status = status
+        self.message = message
+
+
+class _Fallback:
+    """Stands in for the default of an option with fallbacks so that options missing from argv can be told apart
+
+    It renders as the real default so that ``%(default)s`` in the help is unchanged.
+    """
+    __slots__ = ('default',)
+
+    def __init__(self, default):
+        self.default = default
+
+    def __str__(self):
+        return str(self.default)
+
+    def __repr__(self):
+        return repr(self.default)
+
+
+_TRUE = ('1', 'true', 'yes', 'on')
+_FALSE = ('0', 'false', 'no', 'off', '')
+
+# argparse builds the values of these actions on top of their default, so the default is left in place; the value
+# is still the default itself only if the option was not on the command line
+_ACCUMULATING = (argparse._AppendAction, argparse._AppendConstAction, argparse._CountAction)
+
+
+def add_fallbacks(action, env=None, config=None):
+    """Let the option take its value from environment variables or a config file when it is not on the command line
+
+    :param env: the name of an environment variable or a list of names, the first one set wins
+    :param config: the key of a config file value as ``section.option``
+    """
+    if not action.option_strings:
+        raise ValueError(f"only options can have env or config fallbacks, not '{action.dest}'")
+    action.env = [env] if isinstance(env, str) else list(env or [])
+    action.config = config
+    # checked once the fallbacks have been tried; the usage no longer marks the option as required
+    action.fallback_required, action.required = action.required, False
+    if not isinstance(action, _ACCUMULATING):
+        action.default = _Fallback(action.default)
+    if action.help is not argparse.SUPPRESS:
+        sources = [f"env: {', '.join(action.env)}"] if action.env else []
+        if config is not None:
+            sources.append(f"config: {config}")
+        action.help = f"{action.help or ''} [{'; '.join(sources)}]".lstrip()
+    return action
+
+
+def add_choices(action, choices):
+    """Restrict the option to indexed choices, given as a ``choices`` mapping or as :class:`IndexedChoices`
+
+    The metavar defaults to the one argparse derives from the dest rather than a list of every choice.
+    """
+    if not isinstance(choices, IndexedChoices):
+        choices = IndexedChoices.from_spec(choices, convert=action.type)
+    action.choices = choices
+    if action.metavar is None:
+        action.metavar = action.dest.upper() if action.option_strings else action.dest
+    return action
+
+
+class HelpFormatter(argparse.HelpFormatter):
+    """Shows the first few indexed choices in help instead of all of them"""
+
+    def _expand_help(self, action):
+        if isinstance(action.choices, IndexedChoices):
+            # argparse joins the choices into %(choices)s
+            action = copy.copy(action)
+            action.choices = [action.choices.render()]
+        return super()._expand_help(action)
+
+
+# the environment and config of the parse_args call in progress on this thread
+_sources = threading.local()
+
+
+class CommandParser(argparse.ArgumentParser):
+    """The parser class for commands; exits by raising :class:`ParserExit`
+
+    Options declaring ``env`` or ``config`` fallbacks that are missing from the command line are resolved once
+    parsing is done: the environment first, then the config, then the default.
+    """
+    #: the dest of the option naming the config file that ``config`` fallbacks are read from
+    config_option = None
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('formatter_class', HelpFormatter)
+        super().__init__(*args, **kwargs)
+
+    def exit(self, status=0, message=None):
+        if message:
+            self._print_message(message, sys.stderr)
+        raise ParserExit(status, message)
+
+    def parse_args(self, args=None, namespace=None, env=None, config=None):
+        """As :meth:`argparse.ArgumentParser.parse_args`
+
+        :param env: the environment for ``env`` fallbacks [default: ``os.environ``]
+        :param config: a :class:`configparser.ConfigParser` or a mapping of sections for ``config`` fallbacks
+            [default: the file named by the ``config_option`` option, if any]
+        """
+        args, argv = self.parse_known_args(args, namespace, env=env, config=config)
+        if argv:
+            self.error(f"unrecognized arguments: {' '.join(argv)}")
+        return args
+
+    def parse_known_args(self, args=None, namespace=None, env=None, config=None):
+        if getattr(_sources, 'active', False):
+            # a command parser called by its parent parser
+            namespace, argv = super().parse_known_args(args, namespace)
+            self._resolve_fallbacks(namespace)
+            return namespace, argv
+        _sources.active = True
+        _sources.env = os.environ if env is None else env
+        _sources.config = config
+        _sources.config_option = self.config_option
+        try:
+            namespace, argv = super().parse_known_args(args, namespace)
+            self._resolve_fallbacks(namespace)
+            return namespace, argv
+        finally:
+            _sources.active = False
+            _sources.env = _sources.config = None
+
+    def _fallback_table(self):
+        """The options with fallbacks and their mutually exclusive siblings; built once per set of actions"""
+        table = getattr(self, '_fallbacks', None)
+        if table is None or table[0] != len(self._actions):
+            siblings = dict()
+            for group in self._mutually_exclusive_groups:
+                for action in group._group_actions:
+                    siblings[action] = [sibling for sibling in group._group_actions if sibling is not action]
+            entries = [(action, siblings.get(action, [])) for action in self._actions if hasattr(action, 'env')]
+            table = self._fallbacks = (len(self._actions), entries)
+        return table[1]
+
+    def _resolve_fallbacks(self, namespace):
+        entries = self._fallback_table()
+        if not entries:
+            return
+        unresolved = list()
+        for action, siblings in entries:
+            if self._given(namespace, action):
+                continue
+            value = getattr(namespace, action.dest, None)
+            default = value.default if isinstance(value, _Fallback) else value
+            if any(self._given(namespace, sibling) for sibling in siblings):
+                setattr(namespace, action.dest, default)
+                continue
+            for name in action.env:
+                if name in _sources.env:
+                    setattr(namespace, action.dest,
+                            self._fallback_value(action, _sources.env[name], f"environment variable {name}"))
+                    break
+            else:
+                unresolved.append((action, default))
+        config = self._config(namespace) if any(action.config for action, _ in unresolved) else None
+        missing = list()
+        for action, default in unresolved:
+            if config is not None and action.config is not None:
+                section, _, option = action.config.partition('.')
+                try:
+                    setattr(namespace, action.dest,
+                            self._fallback_value(action, config[section][option], f"config {action.config}"))
+                    continue
+                except KeyError:
+                    pass
+            if isinstance(default, str):
+                default = self._get_value(action, default)
+            setattr(namespace, action.dest, default)
+            if action.fallback_required and default is None:
+                missing.append('/'.join(action.option_strings))
+        if missing:
+            self.error(f"the following arguments are required: {', '.join(missing)}")
+
+    def _check_value(self, action, value):
+        if isinstance(action.choices, IndexedChoices):
+            # argparse would list every choice in the message
+            if value not in action.choices:
+                raise argparse.ArgumentError(
+                    action, f"invalid choice: {value!r} (choose from {action.choices.render()})"
+                )
+            return
+        super()._check_value(action, value)
+
+    @staticmethod
+    def _given(namespace, action) -> bool:
+        value = getattr(namespace, action.dest, None)
+        return not isinstance(value, _Fallback) and value is not action.default
 
-    def __init__(self, parser_spec: dict):
-        self._parser_spec = parser_spec.get('parser')
+    @staticmethod
+    def _config(namespace):
+        """The config given to parse_args or read from the file named by the config option"""
+        if _sources.config is None and _sources.config_option is not None:
+            filename = getattr(namespace, _sources.config_option, None)
+            if filename is not None and not isinstance(filename, _Fallback):
+                from .config import LocalConfigParser
+                config = LocalConfigParser()
+                config.read(filename)
+                _sources.config = config
+        return _sources.config
+
+    def _fallback_value(self, action, string, source):
+        """Convert a value from the environment or a config file as if it had been on the command line"""
+        try:
+            if action.nargs == 0:
+                default = action.default.default if isinstance(action.default, _Fallback) else action.default
+                if isinstance(action, argparse._CountAction):
+                    return int(string)
+                if string.strip().lower() in _TRUE:
+                    if isinstance(action, argparse._AppendConstAction):
+                        return [*(default or []), action.const]
+                    return action.const
+                if string.strip().lower() in _FALSE:
+                    return default
+                raise argparse.ArgumentError(action, f"invalid boolean value: {string!r}")
+            if action.nargs in (None, argparse.OPTIONAL):
+                values = self._get_value(action, string)
+                self._check_value(action, values)
+            else:
+                import shlex
+                values = [self._get_value(action, value) for value in shlex.split(string)]
+                for value in values:
+                    self._check_value(action, value)
+        except (argparse.ArgumentError, ValueError) as err:
+            message = err.message if isinstance(err, argparse.ArgumentError) else str(err)
+            self.error(f"argument {'/'.join(action.option_strings)}: {message} (from {source})")
+        if isinstance(action, argparse._AppendAction) and not isinstance(action, argparse._ExtendAction):
+            return [values]
+        return values
+
+
+class CLIParser(CommandParser):
+    #: the token that separates chained commands on one command line
+    chain_separator = '++'
+
+    def __init__(self, parser_spec: dict, lazy_commands: bool = True):
+        self._lazy_commands = lazy_commands
+        self._parser_spec = merge_plugin_commands(parser_spec).get('parser')
+        self._chain_spec = self._parser_spec.pop('chain', None) or dict()
+        self.config_option = self._parser_spec.pop('config_option', self.config_option)
+        self.chain_separator = self._chain_spec.get('separator', self.chain_separator)
+        # whether to stop at the first chained command that fails
+        self.short_circuit = self._chain_spec.get('short_circuit', True)
         self._parent_parsers_spec = self._parser_spec.pop('parent_parsers', None)
         self._subparsers_spec = self._parser_spec.pop('subparsers', None)
         self._options = self._parser_spec.pop('options', None)
@@ -125,95 +494,126 @@ class CLIParser(argparse.ArgumentParser):
             _subparser = subparsers_spec.pop('subparsers', None)
             subparsers = self.add_subparsers(
                 **subparsers_spec,
-                parser_class=argparse.ArgumentParser
+                parser_class=CommandParser,
+                action=LazySubParsersAction
             )
             # add the commands
             for command in commands:
                 options = command.pop('options', None)
                 groups = command.pop('groups', None)
                 mutex_groups = command.pop('mutually_exclusive_groups', None)
+                stream = command.pop('stream', None)
+                if stream:
+                    options = (options or []) + stream_options(stream)
                 manager_string = command.pop('manager', None)
-                self.managers[command['name']] = Manager(manager_string)
+                retry, timeout = command.pop('retry', None), command.pop('timeout', None)
+                # commands without a manager can be parsed but not run
+                if manager_string is not None:
+                    manager = Manager(manager_string, retry=retry, timeout=timeout)
+                    # the command's dest holds the alias it was called by
+                    for alias in [command['name'], *(command.get('aliases') or ())]:
+                        self.managers[alias] = manager
                 _parents = command.pop('parents', None)
                 if _parents is not None:
                     parents = [self.parent_parsers[parent] for parent in _parents]
                 else:
                     parents = []
-                command_parser = subparsers.add_parser(**command, parents=parents)
-                if options is not None:
-                    parse_options(command_parser, options)
-                    if groups is not None:
-                        parse_groups(command_parser, groups)
-                    if mutex_groups is not None:
-                        parse_mutually_exclusive_groups(command_parser, mutex_groups)
+                if self._lazy_commands:
+                    subparsers.add_parser(
+                        **command,
+                        setup=functools.partial(setup_command, parents=parents, options=options, groups=groups,
+                                                mutex_groups=mutex_groups)
+                    )
+                else:
+                    command_parser = subparsers.add_parser(**command)
+                    setup_command(command_parser, parents, options, groups, mutex_groups)
             return subparsers
 
-    def __str__(self):
-        return self.format_help()
+    def split_chain(self, args: List[str]) -> List[List[str]]:
+        """Split the command line into one command line per chained command
 
+        ``prep -e emd_1 ++ load -e emd_1`` gives ``[['prep', '-e', 'emd_1'], ['load', '-e', 'emd_1']]``.
 
-class LocalConfigParser(configparser.ConfigParser):
-    """A local config parser that can be used to parse a config file."""
+        Every argument equal to the separator ends a command, whatever option precedes it, except those after ``--``
+        which belong to the last command. Give an option value equal to the separator attached to its flag
+        (``--name=++`` or ``-n++``) and positionals or ``nargs='...'`` remainders that contain it after ``--``.
+        """
+        chain = [[]]
+        for index, arg in enumerate(args):
+            if arg == '--':
+                chain[-1].extend(args[index:])
+                break
+            if arg == self.chain_separator:
+                chain.append([])
+            else:
+                chain[-1].append(arg)
+        return [command for command in chain if command] or [[]]
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(
-            interpolation=configparser.ExtendedInterpolation(),
-            converters={
-                'list': self.get_list,
-                'tuple': self.get_tuple,
-                'python': self.get_python,
-            }, *args, **kwargs)
-        self._filenames = None
+    def __str__(self):
+        return self.format_help()
 
-    @property
-    def filenames(self):
-        return self._filenames
 
-    def read(self, filenames: Union[os.PathLike, Iterable[os.PathLike]], encoding: Optional[str] = None) -> List[str]:
-        self._filenames = filenames
-        return super().read(filenames, encoding)
+class ManagerTimeout(TimeoutError):
+    """Raised when a manager runs for longer than its timeout"""
 
-    def __str__(self):
-        string = ""
-        for section in self.sections():
-            string += f"[{section}]\n"
-            for option in self[section]:
-                string += f"{option} = {self.get(section, option, raw=True)}\n"
-            string += "\n"
-        return string
 
-    @staticmethod
-    def get_list(value):
-        """Convert the option value to a list"""
-        return list(map(lambda s: s.strip(), value.split(',')))
+class RetryPolicy:
+    """When and how often to run a manager again
 
-    @staticmethod
-    def get_tuple(value):
-        """Convert the option value to a tuple"""
-        return tuple(map(lambda s: s.strip(), value.split(',')))
+    A manager is retried if it returns one of ``exit_codes`` or raises one of ``exceptions`` (names of builtin
+    exceptions such as ``"OSError"`` or dotted paths such as ``"requests.ConnectionError"``). The n-th retry waits
+    ``backoff * 2 ** (n - 1)`` seconds capped at ``max_backoff``; with ``jitter`` the wait is drawn uniformly from
+    zero to that value. If the parsed arguments have a true ``disable_flag`` attribute (e.g. ``no_retry``)
+    the manager is run only once.
+    """
 
-    @staticmethod
-    def get_python(value):
-        """Evaluate the option value as literal Python code"""
-        return eval(value)
+    def __init__(self, max_attempts=3, backoff=1.0, max_backoff=60.0, jitter=True, exit_codes=(), exceptions=(),
+                 disable_flag=None):
+        if max_attempts < 1:
+            raise ValueError(f"max_attempts must be at least 1, not {max_attempts}")
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.exit_codes = frozenset(exit_codes)
+        self._exception_names = tuple(exceptions)
+        self._exceptions = None
+        self.disable_flag = disable_flag
+
+    @property
+    def exceptions(self) -> tuple:
+        """The retryable exception classes; resolved on first use"""
+        if self._exceptions is None:
+            self._exceptions = tuple(resolve_name(name) for name in self._exception_names)
+        return self._exceptions
 
+    def attempts(self, args=None) -> int:
+        """The number of times to try the manager given the parsed arguments"""
+        if self.disable_flag is not None and getattr(args, self.disable_flag, False):
+            return 1
+        return self.max_attempts
 
-def command_manager(args: argparse.Namespace) -> int:
-    """The manager for the 'command' command."""
-    print(f"{args = }")
-    return 0
+    def delay(self, attempt) -> float:
+        """The number of seconds to wait after the given (1-based) failed attempt"""
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        if self.jitter:
+            import random
+            delay = random.uniform(0, delay)
+        return delay
 
+    def should_retry_status(self, exit_status) -> bool:
+        return exit_status in self.exit_codes
 
-def command2_manager(args: argparse.Namespace) -> int:
-    """The manager for the 'command' command."""
-    print(f"{args = }")
-    return 0
+    def should_retry_exception(self, exception) -> bool:
+        return isinstance(exception, self.exceptions)
 
 
 class Manager:
-    def __init__(self, manager_string):
+    def __init__(self, manager_string, retry: Union[RetryPolicy, dict, None] = None, timeout: Optional[float] = None):
         self._manager_string = manager_string
         self._module, self._function = self._partition_manager()
+        self.retry = RetryPolicy(**retry) if isinstance(retry, dict) else retry
+        self.timeout = timeout
 
     @property
     def module(self):
@@ -228,670 +628,87 @@ class Manager:
         return self._manager_string.rsplit('.', 1)
 
     def __call__(self, *args, **kwargs):
-        return self.function(*args, **kwargs)
+        if self.retry is None:
+            return self._call(*args, **kwargs)
+        attempts = self.retry.attempts(args[0] if args else None)
+        for attempt in range(1, attempts + 1):
+            try:
+                exit_status = self._call(*args, **kwargs)
+            except Exception as exception:
+                if attempt == attempts or not self.retry.should_retry_exception(exception):
+                    raise
+            else:
+                if attempt == attempts or not self.retry.should_retry_status(exit_status):
+                    return exit_status
+            time.sleep(self.retry.delay(attempt))
+
+    def _call(self, *args, **kwargs):
+        """Call the manager once within the timeout, running it to completion if it is a coroutine"""
+        if self.timeout is None:
+            result = self.function(*args, **kwargs)
+        else:
+            result = self._call_with_timeout(*args, **kwargs)
+        if isinstance(result, collections.abc.Awaitable):
+            import asyncio
+            if self.timeout is not None:
+                result = asyncio.wait_for(result, self.timeout)
+            try:
+                result = asyncio.run(result)
+            except asyncio.TimeoutError:
+                raise ManagerTimeout(f"{self} timed out after {self.timeout}s") from None
+        return result
+
+    def _call_with_timeout(self, *args, **kwargs):
+        import inspect
+        import signal
+        if inspect.iscoroutinefunction(self.function):
+            # the coroutine is awaited within the timeout by _call
+            return self.function(*args, **kwargs)
+        if threading.current_thread() is threading.main_thread() and hasattr(signal, 'setitimer'):
+            return self._call_with_alarm(*args, **kwargs)
+        return self._call_in_thread(*args, **kwargs)
+
+    def _call_with_alarm(self, *args, **kwargs):
+        """Interrupt the manager with SIGALRM when the timeout expires"""
+        import signal
+
+        def alarm(signum, frame):
+            raise ManagerTimeout(f"{self} timed out after {self.timeout}s")
+
+        previous_handler = signal.signal(signal.SIGALRM, alarm)
+        signal.setitimer(signal.ITIMER_REAL, self.timeout)
+        try:
+            return self.function(*args, **kwargs)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+
+    def _call_in_thread(self, *args, **kwargs):
+        """Wait for the manager in another thread; a thread cannot be interrupted so it is abandoned on timeout"""
+        outcome = dict()
+
+        def target():
+            try:
+                outcome['result'] = self.function(*args, **kwargs)
+            except BaseException as exception:
+                outcome['exception'] = exception
+
+        thread = threading.Thread(target=target, name=str(self), daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            raise ManagerTimeout(f"{self} timed out after {self.timeout}s")
+        if 'exception' in outcome:
+            raise outcome['exception']
+        return outcome['result']
 
     def __str__(self):
         return f"{self._module}.{self._function}"
 
 
-class Client:
-    def __init__(self, parser_file='cli.json'):
-        self.parser = create_parser(parser_file)
-        self.managers = create_commands(self.parser, parser_file)
-
-    def execute(self, command=None):
-        """Execute the command using the parser and manager"""
-        args = self.parser.parse_args(command)
-        # we need to know the name of the subcommand destination
-        # manager = self.managers[self.subparser.dest]
-        manager = self.managers[args.command]
-        return manager(args)
-
-
 def main():
     return 0
 
 
 if __name__ == '__main__':
     main()
-
-
-# unittests
-class Tests(unittest.TestCase):
-    def setUp(self):
-        self.parser_spec = {
-            "parser": {
-                "prog": "oil",
-                "description": "Custom script with dynamic arguments",
-                "add_help": True,
-                "parent_parsers": [
-                    {
-                        "prog": "parent1",
-                        "add_help": False,
-                        "options": [
-                            {
-                                "flag": [
-                                    "--config-file"
-                                ],
-                                "type": "pathlib.Path",
-                                "help": "Path to the config file"
-                            },
-                            {
-                                "flag": [
-                                    "--dry-run"
-                                ],
-                                "help": "Dry run mode",
-                                "action": "store_true"
-                            }
-                        ]
-                    }
-                ],
-                "subparsers": {
-                    "title": "subcommands",
-                    "description": "valid subcommands",
-                    "dest": "subcommand",
-                    "required": True,
-                    "subparsers": None,
-                    "commands": [
-                        {
-                            "name": "command",
-                            "help": "command help",
-                            "parents": ["parent1"],
-                            "options": [
-                                {
-                                    "flag": [
-                                        "input_file"
-                                    ],
-                                    "help": "Path to the input file"
-                                },
-                                {
-                                    "flag": [
-                                        "-o"
-                                    ],
-                                    "help": "Path to the output file"
-                                },
-                                {
-                                    "flag": [
-                                        "--verbose"
-                                    ],
-                                    "help": "Enable verbose mode",
-                                    "action": "store_true"
-                                }
-                            ],
-                            "manager": "experiment.command_manager"
-                        },
-                        {
-                            "name": "command2",
-                            "help": "command2 help",
-                            "options": [
-                                {
-                                    "flag": [
-                                        "input_file"
-                                    ],
-                                    "help": "Path to the input file"
-                                },
-                                {
-                                    "flag": [
-                                        "-o"
-                                    ],
-                                    "help": "Path to the output file"
-                                },
-                                {
-                                    "flag": [
-                                        "--verbose"
-                                    ],
-                                    "help": "Enable verbose mode",
-                                    "action": "store_true"
-                                }
-                            ],
-                            "mutually_exclusive_groups": [
-                                {
-                                    "title": "mutex_group",
-                                    "required": True,
-                                    "options": [
-                                        {
-                                            "flag": [
-                                                "-f"
-                                            ],
-                                            "help": "Never option",
-                                        },
-                                        {
-                                            "flag": [
-                                                "-g"
-                                            ],
-                                            "help": "Mixed option",
-                                            "action": "store_true"
-                                        }
-                                    ]
-                                }
-                            ],
-                            "manager": "experiment.command2_manager"
-                        }
-                    ]
-                },
-                "options": [
-                    {
-                        "flag": [
-                            "-x"
-                        ],
-                        "help": "Path to the output file"
-                    },
-                    {
-                        "flag": [
-                            "-w"
-                        ],
-                        "help": "Enable verbose mode",
-                        "action": "store_true"
-                    }
-                ],
-                "groups": [
-                    {
-                        "title": "group1",
-                        "description": "group1 description",
-                        "options": [
-                            {
-                                "flag": [
-                                    "-y"
-                                ],
-                                "help": "Path to the output file"
-                            },
-                            {
-                                "flag": [
-                                    "-z"
-                                ],
-                                "help": "Enable verbose mode",
-                                "action": "store_true"
-                            }
-                        ]
-                    },
-                    {
-                        "title": "group2",
-                        "description": "group2 description",
-                        "options": [
-                            {
-                                "flag": [
-                                    "-c"
-                                ],
-                                "help": "Some other option"
-                            },
-                            {
-                                "flag": [
-                                    "-b"
-                                ],
-                                "help": "Another option",
-                                "action": "store_false"
-                            }
-                        ]
-                    }
-                ],
-                "mutually_exclusive_groups": [
-                    {
-                        "title": "mutex_group",
-                        "required": False,
-                        "options": [
-                            {
-                                "flag": [
-                                    "-n"
-                                ],
-                                "help": "Never option",
-                            },
-                            {
-                                "flag": [
-                                    "-m"
-                                ],
-                                "help": "Mixed option",
-                                "action": "store_true"
-                            }
-                        ]
-                    }
-                ]
-            },
-            # "config": {
-            #     "format": "ini",
-            #     "filename": "config.ini",
-            #     "location": "user",
-            #     "create": True
-            # }
-        }
-
-    def test_create_parser(self):
-        """
-        Test the example provided in the question.
-        """
-        # todo: there will have to be a way to prevent the wrong arguments from being passed; perhaps a schema enforced?
-        sys.argv = shlex.split('script.py -x 37 -w')
-        parser_spec = self.parser_spec  # json.loads(self.parser_spec)
-        parser_spec['parser']['subparsers']['required'] = False
-        parser = CLIParser(parser_spec=parser_spec)
-        args = parser.parse_args()
-        self.assertIsInstance(args, argparse.Namespace)
-        self.assertEqual('37', args.x)
-        self.assertTrue(args.w)
-
-    def test_create_subparser(self):
-        """
-        Test the example provided in the question.
-        """
-        parser = CLIParser(parser_spec=self.parser_spec)
-        self.assertIsInstance(parser, CLIParser)
-        self.assertIsNotNone(parser.subparsers)
-
-    def test_create_command(self):
-        """Add a command to a subparser."""
-        parser = CLIParser(parser_spec=self.parser_spec)
-        sys.argv = shlex.split('script.py command input.txt -o output.txt --verbose')
-        args = parser.parse_args()
-        self.assertEqual('command', args.subcommand)
-        sys.argv = shlex.split('script.py command2 input.txt -o output.txt --verbose -f nothing')
-        args = parser.parse_args()
-        self.assertEqual('command2', args.subcommand)
-
-    def test_manager_class(self):
-        """Test that the manager attribute can be fired
-         and an appropriate error is raised if it is not.
-         """
-        # todo: what should a manager do?
-        # 1. it should take a string
-        # 2. it should partition the string into the module and function
-        # 3. it should import the module
-        # 4. it should call the function
-        # 5. it should return the exit status
-        # manager = Manager("experiment.command_manager")
-        # exit_status = manager(args)
-        sys.argv = shlex.split('script.py command input.txt -o output.txt --verbose')
-        parser = CLIParser(parser_spec=self.parser_spec)
-        args = parser.parse_args()
-        manager = parser.managers[args.subcommand]
-        self.assertTrue(hasattr(manager, "module"))
-        self.assertTrue(hasattr(manager, "function"))
-        self.assertTrue(hasattr(manager, "__call__"))
-        self.assertTrue(inspect.ismethod(getattr(manager, "__call__")))
-        self.assertEqual("experiment.command_manager", str(manager))
-        # trigger the manager
-        exit_status = manager(args)
-        self.assertEqual(0, exit_status)
-
-    def test_option_groups(self):
-        """Test that the option groups are added to the parser."""
-        parser = CLIParser(parser_spec=self.parser_spec)
-        self.assertIsInstance(parser, CLIParser)
-        self.assertIsNotNone(parser.groups)
-        self.assertEqual(2, len(parser.groups))
-        self.assertIn('group1', parser.groups)
-        self.assertIn('group2', parser.groups)
-        self.assertIsInstance(parser.groups['group1'], argparse._ArgumentGroup)
-        self.assertIsInstance(parser.groups['group2'], argparse._ArgumentGroup)
-        self.assertIsInstance(parser.groups, dict)
-
-    def test_mutually_exclusive_groups(self):
-        """Test that the mutually exclusive groups are added to the parser."""
-        parser = CLIParser(parser_spec=self.parser_spec)
-        self.assertIsInstance(parser, CLIParser)
-        self.assertIsNotNone(parser.mutually_exclusive_groups)
-        self.assertEqual(1, len(parser.mutually_exclusive_groups))
-        self.assertIn('mutex_group', parser.mutually_exclusive_groups)
-        self.assertIsInstance(parser.mutually_exclusive_groups['mutex_group'], argparse._MutuallyExclusiveGroup)
-        self.assertIsInstance(parser.mutually_exclusive_groups, dict)
-
-    def test_parent_parser(self):
-        """Test that the parent parser is added to the parser."""
-        parser = CLIParser(parser_spec=self.parser_spec)
-        self.assertIsInstance(parser.parent_parsers, dict)
-        self.assertIn('parent1', parser.parent_parsers)
-        self.assertIsInstance(parser.parent_parsers['parent1'], argparse.ArgumentParser)
-        sys.argv = shlex.split('oil -n something command --config-file /path/to/file --dry-run'
-                               ' input.txt -o output.txt --verbose')
-        args = parser.parse_args()
-        self.assertEqual(pathlib.Path('/path/to/file'), args.config_file)
-        self.assertTrue(args.dry_run)
-        self.assertEqual('input.txt', args.input_file)
-        self.assertEqual('output.txt', args.o)
-        self.assertTrue(args.verbose)
-
-    # def test_config(self):
-    #     """Test that we can define a config file"""
-    #     parser = CLIParser(parser_spec=self.parser_spec)
-    #     self.assertIsInstance(parser.configs, LocalConfigParser)
-
-
-class TestOil(unittest.TestCase):
-    """Test using expresscli on the oil project github.com/emdb-empiar/oil"""
-
-    def setUp(self):
-        LIMIT_COUNT = 1000
-        MIN_MEMORY = 1024
-        MAX_MEMORY = 128000
-        # MIN_ARRAY_SIZE = 2
-        # MAX_ARRAY_SIZE = 100
-        self.parser_spec = {
-            "parser": {
-                "prog": "oil",
-                "description": "process and load .map files into OMERO for the Volume Browser",
-                "parent_parsers": [
-                    {
-                        "prog": "parent1",
-                        "add_help": False,
-                        "options": [
-                            {
-                                "flag": ["--dry-run"],
-                                "help": "print out what would be done [default: False]",
-                                "action": "store_true"
-                            },
-                            {
-                                "flag": ["-c", "--config-file"],
-                                "type": "pathlib.Path",
-                                "help": "oil configs [default: value of OILCONF environment variable]"
-                            },
-                            {
-                                "flag": ["-v", "--verbose"],
-                                "help": "verbose output to terminal in addition to log files [default: False]",
-                                "action": "store_true"
-                            },
-                            {
-                                "flag": ["-d", "--debug"],
-                                "help": "debug [False]",
-                                "action": "store_true"
-                            },
-                            {
-                                "flag": ["--no-retry"],
-                                "help": "run async jobs sequentially i.e. if one fails, terminate immediately [False]",
-                            },
-                            {
-                                "flag": ["--no-summary"],
-                                "action": "store_true",
-                                "help": "do not display the oil status [False]",
-                            },
-                            {
-                                'flag': ['--lsf'],
-                                'default': False,
-                                'action': 'store_true',
-                                'help': "run the command on the job scheduler according to the configs [False]"
-                            },
-                            {
-                                'flag': ['--lsf-job-name'],
-                                'help': f"give the job a short meaningful name [default: None]"
-                            },
-                            {
-                                'flag': ['--lsf-memory'],
-                                'type': 'int',
-                                'default': 1024,
-                                'help': f"run the command with this much memory requested in MiB e.g. 1024 = 1024MiB = 1GiB; valid values in range {MIN_MEMORY}-{MAX_MEMORY} [{MIN_MEMORY}]"
-                            },
-                            {
-                                'flag': ['--lsf-depends-on'],
-                                'help': f"wait for the job of the specified ID to complete first"
-                            },
-                            {
-                                'flag': ['--lsf-array-size'],
-                                'type': 'int',
-                                'help': f"run builds in parallel by spawning an job array of this size [1]"
-                            }
-                        ]
-                    }
-                ],
-                "subparsers": {
-                    "dest": "command",
-                    "title": "Tools",
-                    "help": "oil utilities",
-                    "required": True,
-                    "commands": [
-                        {
-                            "name": "init",
-                            "help": "initialise oil",
-                            "description": "initialise an oil installation by creating resource directories",
-                            "parents": ["parent1"],
-                            "manager": "oil.handlers.init"
-                        },
-                        {
-                            "name": "status",
-                            "description": "print the status of oil",
-                            "help": "display the status of oil",
-                            "parents": ["parent1"],
-                            "manager": "oil.handlers.status"
-                        },
-                        {
-                            "name": "load",
-                            "description": "prepare params, build image files and import metadata into OMERO for a single entry",
-                            "help": "load the entry specified by ID",
-                            "parents": ["parent1"],
-                            "manager": "oil.handlers.load",
-                            "options": [
-                                {
-                                    'flag': ['--use-ssh'],
-                                    'action': 'store_true',
-                                    'help': "run import through an SSH call [False]"
-                                },
-                                {
-                                    'flag': ['--force'],
-                                    'action': 'store_true',
-                                    'help': "'y' by default [False]"
-                                },
-                                {
-                                    'flag': ['--purge'],
-                                    'action': "store_true",
-                                    'help': "purge an existing entry before load [False]"
-                                },
-                                {
-                                    'flag': ['--map-dir'],
-                                    'help': "a comma-separated (no spaces) sequence of paths to search for files; "
-                                            "by default we read the value from configs; this option overrides configs"
-                                },
-                                {
-                                    'flag': ['-x', '--extension'],
-                                    'help': "the extension use"
-                                },
-                                {
-                                    'flag': ['--limit'],
-                                    'type': 'int',
-                                    'default': LIMIT_COUNT,
-                                    'help': f"limit the number of entries processed at any one time; "
-                                            f"to remove the limit set limit to zero [default: {LIMIT_COUNT}]"
-                                },
-                            ],
-                            "mutually_exclusive_groups": [
-                                {
-                                    "title": "load_input_group",
-                                    "required": False,
-                                    "options": [
-                                        {
-                                            'flag': ['-e', '--entry-name'],
-                                            'help': "name of the entry e.g. emd_1234 or empiar_12345"
-                                        },
-                                        {
-                                            'flag': ['-p', '--entry-path'],
-                                            'action': 'append',
-                                            'type': 'pathlib.Path',
-                                            'help': "the relative/absolute path to the entry file e.g. /path/to/emd_1234.map; "
-                                                    "the file must be a canonically named file; "
-                                                    "this option takes precedence over --map-dir and configs[dirs][map_dir] [default: None]"
-                                        },
-                                        {
-                                            'flag': ['-f', '--entries-file'],
-                                            'type': 'pathlib.Path',
-                                            'help': "name of a file with a list of entry names"
-                                        },
-                                    ]
-                                }
-                            ]
-                        },
-                        {
-                            "name": "prep",
-                            "description": "runs the prep step which generates all build parameters",
-                            "help": "prepare entry parameters for build",
-                            "parents": ["parent1"],
-                            "manager": "oil.handlers.prep",
-                            "options": [
-                                {
-                                    'flag': ['--use-ssh'],
-                                    'action': 'store_true',
-                                    'help': "run import through an SSH call [False]"
-                                },
-                                {
-                                    'flag': ['--map-dir'],
-                                    'help': "a comma-separated (no spaces) sequence of paths to search for files; "
-                                            "by default we read the value from configs; this option overrides configs"
-                                },
-                                {
-                                    'flag': ['-x', '--extension'],
-                                    'help': "the extension use"
-                                },
-                                {
-                                    'flag': ['--limit'],
-                                    'type': 'int',
-                                    'default': LIMIT_COUNT,
-                                    'help': f"limit the number of entries processed at any one time; "
-                                            f"to remove the limit set limit to zero [default: {LIMIT_COUNT}]"
-                                },
-                            ],
-                            "mutually_exclusive_groups": [
-                                {
-                                    "title": "prep_input_group",
-                                    "required": False,
-                                    "options": [
-                                        {
-                                            'flag': ['-e', '--entry-name'],
-                                            'help': "name of the entry e.g. emd_1234 or empiar_12345"
-                                        },
-                                        {
-                                            'flag': ['-p', '--entry-path'],
-                                            'action': 'append',
-                                            'type': 'pathlib.Path',
-                                            'help': "the relative/absolute path to the entry file e.g. /path/to/emd_1234.map; "
-                                                    "the file must be a canonically named file; "
-                                                    "this option takes precedence over --map-dir and configs[dirs][map_dir] [default: None]"
-                                        },
-                                        {
-                                            'flag': ['-f', '--entries-file'],
-                                            'type': 'pathlib.Path',
-                                            'help': "name of a file with a list of entry names"
-                                        },
-                                        {
-                                            'flag': ['-j', '--entries-json'],
-                                            'type': 'pathlib.Path',
-                                            'help': "name of a JSON file with the entries in a field called 'entries' as a list"
-                                        }
-                                    ]
-                                }
-                            ]
-                        }
-                    ]
-                }
-            }
-        }
-        self.parser = CLIParser(parser_spec=self.parser_spec)
-        self.cli = lambda command_str: self.parser.parse_args(shlex.split(command_str))
-        self.TEST_CONFIG_PATH = pathlib.Path(__file__).parent / 'test_config.ini'
-        # os.environ['OILCONF'] = str(self.TEST_CONFIG_PATH)
-
-        # def tearDown(self):
-        #     del os.environ['OILCONF']
-
-    def test_init(self):
-        """Test oil initialisation"""
-        args = self.cli(f'init --config-file {self.TEST_CONFIG_PATH}')
-        self.assertEqual('init', args.command)
-        self.assertFalse(args.dry_run)
-        self.assertFalse(args.verbose)
-        self.assertEqual(args.config_file, self.TEST_CONFIG_PATH)
-        self.assertFalse(args.debug)
-
-    def test_status(self):
-        """Test oil status"""
-        args = self.cli(f'status --config-file {self.TEST_CONFIG_PATH}')
-        self.assertEqual('status', args.command)
-        self.assertFalse(args.dry_run)
-        self.assertFalse(args.verbose)
-        self.assertEqual(args.config_file, self.TEST_CONFIG_PATH)
-        self.assertFalse(args.debug)
-
-    def test_load(self):
-        """Test oil load"""
-        args = self.cli(f"load -e emd_1234 --config-file {self.TEST_CONFIG_PATH}")
-        self.assertEqual(args.command, 'load')
-        self.assertFalse(args.dry_run)
-        self.assertEqual(args.entry_name, 'emd_1234')
-        self.assertFalse(args.purge)
-        self.assertFalse(args.force)
-        self.assertIsNone(args.map_dir)
-        self.assertIsNone(args.extension)
-        self.assertFalse(args.no_summary)
-        self.assertEqual(args.limit, 1000)
-        args = self.cli(f"load -p /path/to/emd_1234.map --config-file {self.TEST_CONFIG_PATH}")
-        self.assertEqual(
-            [
-                pathlib.Path('/path/to/emd_1234.map'),
-            ],
-            args.entry_path
-        )
-        args = self.cli(f"load -f /path/to/entries.txt --config-file {self.TEST_CONFIG_PATH}")
-        self.assertEqual(
-            pathlib.Path('/path/to/entries.txt'),
-            args.entries_file
-        )
-        args = self.cli(f"load --no-summary --config-file {self.TEST_CONFIG_PATH}")
-        self.assertTrue(args.no_summary)
-        args = self.cli(f"load -e emd_1234 --purge --force --config-file {self.TEST_CONFIG_PATH}")
-        self.assertTrue(args.purge)
-        self.assertTrue(args.force)
-        args = self.cli(f"load -c {self.TEST_CONFIG_PATH} --use-ssh -e emd_1234")
-        self.assertTrue(args.use_ssh)
-
-    def test_prep(self):
-        """Test oil prep"""
-        args = self.cli(f"prep --config-file {self.TEST_CONFIG_PATH}")
-        self.assertEqual(args.command, 'prep')
-        self.assertEqual(args.limit, 1000)
-        self.assertFalse(args.dry_run)
-        self.assertIsNone(args.entry_name)
-        self.assertIsNone(args.entries_file)
-        self.assertFalse(args.verbose)
-        self.assertEqual(args.config_file, self.TEST_CONFIG_PATH)
-        self.assertFalse(args.debug)
-        self.assertFalse(args.no_retry)
-        args = self.cli(f"prep -c {self.TEST_CONFIG_PATH} --use-ssh")
-        self.assertTrue(args.use_ssh)
-        # self.assertTrue(args._configs.getboolean('omero', 'use_ssh'))
-        # new_path = secrets.token_urlsafe(random.randint(10, 20))
-        # os.mkdir(new_path)
-        # args = self.cli(f"prep --map-dir {new_path}")
-        # map_dir = args._configs.get('dirs', 'map_dir')
-        # self.assertEqual(map_dir, os.path.join(os.path.dirname(os.path.dirname(__file__)), new_path))
-        # # map_dir must be abs path
-        # self.assertTrue(os.path.isabs(map_dir))
-        # os.rmdir(new_path)
-        # self.assertFalse(os.path.exists(new_path))
-
-    def test_build(self):
-        """Test oil build"""
-        parser = CLIParser(parser_spec=self.parser_spec)
-        print(parser.print_help())
-
-    def test_import(self):
-        """Test oil import"""
-
-    def test_reset(self):
-        """Test oil reset"""
-
-    def test_clean(self):
-        """Test oil clean"""
-
-    def test_list(self):
-        """Test oil list"""
-
-    def test_search(self):
-        """Test oil search"""
-
-    def test_delete(self):
-        """Test oil delete"""
-
-    def test_purge(self):
-        """Test oil purge"""
-
-    def test_fix(self):
-        """Test oil fix"""
-
-    def test_sync(self):
-        """Test oil sync"""
-
-    def test_collate(self):
-        """Test oil collate"""
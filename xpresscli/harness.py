@@ -0,0 +1,370 @@
+"""Check that every way of parsing a spec behaves exactly like an eagerly built :class:`CLIParser`
+
+Command lines are generated at random (reproducibly, from a seed) out of the actions of the parser: valid ones which
+pick options, values, commands and mutually exclusive options as the spec allows, and invalid ones which break a
+valid line with an unknown option, a bad choice or type, an unknown command, a missing argument or conflicting
+options. Each engine parses every line and its namespace, or its exit status and error output, is compared with that
+of the reference. The time each engine takes per line is recorded. The run fails if an engine's throughput falls
+below its share of the reference's (:data:`MIN_RATIOS`), or by more than a threshold against a saved baseline.
+
+Run it with ``python -m xpresscli.harness [spec_file ...]``; without spec files the seed specs in :data:`SEED_DIR`
+(which the tests share) are used.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from .experiment import CLIParser
+
+#: the engine every other engine is compared with
+REFERENCE = 'eager'
+
+#: the version of the baseline file format
+BASELINE_VERSION = 1
+
+#: the fraction of its baseline throughput an engine may lose before the check fails
+THRESHOLD = 0.25
+
+#: the least throughput of each engine as a fraction of the reference's; unlike a baseline these hold on any machine
+MIN_RATIOS = {'lazy': 0.7, 'lazy-cold': 0.05, 'compiled': 0.7, 'invoke': 0.5}
+
+#: the directory of the seed specs and their names
+SEED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'seeds')
+SEEDS = ('tests', 'oil')
+
+_WORDS = ('alpha', 'beta', 'gamma', 'delta', 'emd_1234', 'entries.json', 'input.txt', 'config.ini')
+
+
+class Outcome(NamedTuple):
+    """What parsing one command line gave"""
+    #: the parsed arguments, or None if the parser exited
+    namespace: Optional[dict]
+    #: the exit status; zero for a successful parse
+    status: int = 0
+    #: what the parser wrote to stderr
+    stderr: str = ''
+
+
+class Mismatch(NamedTuple):
+    """An engine that disagreed with the reference"""
+    argv: List[str]
+    engine: str
+    expected: Outcome
+    actual: Outcome
+
+
+class Report(NamedTuple):
+    """The results of a run of the harness"""
+    #: every generated command line
+    cases: List[List[str]]
+    #: the engines that disagreed with the reference, per command line
+    mismatches: List[Mismatch]
+    #: the seconds each engine spent on each command line, in the order of ``cases``
+    timings: Dict[str, List[float]]
+
+    def throughput(self) -> Dict[str, float]:
+        """The command lines each engine parsed per second"""
+        return {engine: len(seconds) / (sum(seconds) or 1e-9) for engine, seconds in self.timings.items()}
+
+
+class ArgvGenerator:
+    """Generate command lines for a parser from its actions"""
+
+    def __init__(self, parser: argparse.ArgumentParser, seed=0):
+        self.parser = parser
+        self.random = random.Random(seed)
+
+    def _value(self, action):
+        if action.choices is not None:
+            return str(self.random.choice(list(action.choices)))
+        if action.type is int:
+            return str(self.random.randint(0, 100))
+        if action.type is float:
+            return f"{self.random.uniform(0, 100):.2f}"
+        return self.random.choice(_WORDS)
+
+    def _values(self, action) -> List[str]:
+        nargs = action.nargs
+        if nargs is None:
+            count = 1
+        elif nargs == argparse.OPTIONAL:
+            count = self.random.randint(0, 1)
+        elif nargs in (argparse.ZERO_OR_MORE, argparse.REMAINDER):
+            count = self.random.randint(0, 2)
+        elif nargs == argparse.ONE_OR_MORE:
+            count = self.random.randint(1, 2)
+        else:
+            count = nargs
+        return [self._value(action) for _ in range(count)]
+
+    def _excluded(self, parser) -> set:
+        """The options left out so that at most one of each mutually exclusive group is used"""
+        excluded = set()
+        for group in parser._mutually_exclusive_groups:
+            actions = list(group._group_actions)
+            chosen = self.random.choice(actions) if group.required or self.random.random() < 0.5 else None
+            excluded.update(action for action in actions if action is not chosen)
+        return excluded
+
+    def _tokens(self, parser) -> List[str]:
+        """Options and positionals for one parser, followed by a command if it has any"""
+        excluded = self._excluded(parser)
+        grouped = {action for group in parser._mutually_exclusive_groups for action in group._group_actions}
+        optionals, positionals, subparsers = list(), list(), None
+        for action in parser._actions:
+            if isinstance(action, (argparse._HelpAction, argparse._VersionAction)) or action in excluded:
+                continue
+            if isinstance(action, argparse._SubParsersAction):
+                subparsers = action
+            elif not action.option_strings:
+                positionals.extend(self._values(action))
+            elif action.required or action in grouped or self.random.random() < 0.4:
+                repeat = self.random.randint(1, 2) if isinstance(action, argparse._AppendAction) else 1
+                for _ in range(repeat):
+                    optionals.append(self.random.choice(action.option_strings))
+                    optionals.extend(self._values(action))
+        self.random.shuffle(pairs := _pairs(optionals))
+        tokens = [token for pair in pairs for token in pair] + positionals
+        if subparsers is not None and (subparsers.required or self.random.random() < 0.8):
+            name = self.random.choice(list(subparsers.choices))
+            get_parser = getattr(subparsers, 'get_parser', subparsers.choices.get)
+            tokens += [name, *self._tokens(get_parser(name))]
+        return tokens
+
+    def valid(self) -> List[str]:
+        """A command line the parser should accept"""
+        return self._tokens(self.parser)
+
+    def invalid(self) -> List[str]:
+        """A valid command line broken in one of several ways"""
+        argv = self.valid()
+        mutation = self.random.choice(['unknown_option', 'bad_value', 'unknown_command', 'truncate', 'conflict'])
+        if mutation == 'unknown_option':
+            argv.insert(self.random.randint(0, len(argv)), '--no-such-option')
+        elif mutation == 'bad_value':
+            for index, token in enumerate(argv):
+                action = self._action(argv[:index], token)
+                if action is not None and (action.choices is not None or action.type in (int, float)):
+                    if index + 1 < len(argv):
+                        argv[index + 1] = 'not-a-value'
+                        break
+            else:
+                argv.append('not-a-value')
+        elif mutation == 'unknown_command':
+            argv.append('no-such-command')
+        elif mutation == 'truncate' and argv:
+            del argv[self.random.randrange(len(argv)):]
+        else:
+            for group in self._groups(argv):
+                argv += [token for action in group._group_actions for token in
+                         [action.option_strings[0], *([] if action.nargs == 0 else [self._value(action)])]]
+                break
+            else:
+                argv.append('--no-such-option')
+        return argv
+
+    def _parser_at(self, argv):
+        """The parser the last command named in ``argv`` is parsed with"""
+        parser = self.parser
+        for token in argv:
+            subparsers = parser._subparsers._group_actions[0] if parser._subparsers is not None else None
+            if subparsers is not None and token in subparsers.choices:
+                get_parser = getattr(subparsers, 'get_parser', subparsers.choices.get)
+                parser = get_parser(token)
+        return parser
+
+    def _action(self, before, token):
+        return self._parser_at(before)._option_string_actions.get(token)
+
+    def _groups(self, argv):
+        return list(self._parser_at(argv)._mutually_exclusive_groups)
+
+    def cases(self, count, invalid_fraction=0.3) -> List[List[str]]:
+        return [self.invalid() if self.random.random() < invalid_fraction else self.valid() for _ in range(count)]
+
+
+def _pairs(tokens):
+    """Group option strings with their values so that shuffling keeps them together"""
+    pairs = list()
+    for token in tokens:
+        if token.startswith('-') or not pairs:
+            pairs.append([token])
+        else:
+            pairs[-1].append(token)
+    return pairs
+
+
+def _parse(parser, argv) -> Outcome:
+    stderr = io.StringIO()
+    try:
+        with contextlib.redirect_stderr(stderr), contextlib.redirect_stdout(io.StringIO()):
+            namespace = parser.parse_args(argv)
+    except SystemExit as exit:
+        return Outcome(None, exit.code, stderr.getvalue())
+    return Outcome(vars(namespace), 0, stderr.getvalue())
+
+
+_captured = threading.local()
+
+
+def namespace_manager(args) -> int:
+    """Stands in for every manager of the 'invoke' engine"""
+    return 0
+
+
+def engines(parser_spec) -> Dict[str, callable]:
+    """The ways of parsing a command line with the spec, by name, each returning an :class:`Outcome`"""
+    from .client import Client
+    from .compiler import compile_spec
+
+    def parser(**kwargs):
+        return CLIParser(copy.deepcopy(parser_spec), **kwargs)
+
+    eager = parser(lazy_commands=False)
+    lazy = parser()
+    module = dict()
+    exec(compile(compile_spec(parser_spec), '<harness>', 'exec'), module)
+    compiled = module['build_parser']()
+    invoke_spec = copy.deepcopy(parser_spec)
+    for command in (invoke_spec['parser'].get('subparsers') or dict()).get('commands', []):
+        command['manager'] = f"{__name__}.namespace_manager"
+        command.pop('retry', None)
+        command.pop('timeout', None)
+    client = Client(parser_spec=invoke_spec)
+    parse_args = client.parser.parse_args
+
+    def capture(*args, **kwargs):
+        namespace = parse_args(*args, **kwargs)
+        _captured.namespace = vars(namespace)
+        return namespace
+
+    # only parsing is compared; what the client does with a parsed command line (e.g. without a command) is not
+    client.parser.parse_args = capture
+
+    def invoke(argv):
+        _captured.namespace = None
+        result = client.invoke(argv)
+        if _captured.namespace is not None:
+            return Outcome(_captured.namespace)
+        return Outcome(None, result.exit_status, result.stderr)
+
+    return {
+        REFERENCE: lambda argv: _parse(eager, argv),
+        'lazy': lambda argv: _parse(lazy, argv),
+        'lazy-cold': lambda argv: _parse(parser(), argv),
+        'compiled': lambda argv: _parse(compiled, argv),
+        'invoke': invoke,
+    }
+
+
+def run(parser_spec, count=200, seed=0) -> Report:
+    """Parse ``count`` generated command lines with every engine and compare them with the reference"""
+    engine_map = engines(parser_spec)
+    cases = ArgvGenerator(CLIParser(copy.deepcopy(parser_spec), lazy_commands=False), seed).cases(count)
+    mismatches = list()
+    timings = {engine: list() for engine in engine_map}
+    for argv in cases:
+        outcomes = dict()
+        for engine, parse in engine_map.items():
+            start = time.perf_counter()
+            outcomes[engine] = parse(list(argv))
+            timings[engine].append(time.perf_counter() - start)
+        for engine, outcome in outcomes.items():
+            if outcome != outcomes[REFERENCE]:
+                mismatches.append(Mismatch(argv, engine, outcomes[REFERENCE], outcome))
+    return Report(cases, mismatches, timings)
+
+
+def regressions(throughput: Dict[str, float], baseline: Dict[str, float], threshold=THRESHOLD) -> Dict[str, tuple]:
+    """The engines whose throughput fell by more than ``threshold`` of the baseline, with (baseline, measured)"""
+    return {
+        engine: (baseline[engine], measured) for engine, measured in throughput.items()
+        if engine in baseline and measured < baseline[engine] * (1 - threshold)
+    }
+
+
+def slow_engines(throughput: Dict[str, float], ratios=None) -> Dict[str, tuple]:
+    """The engines slower than their least throughput relative to the reference, with (least, measured) ratios"""
+    ratios = MIN_RATIOS if ratios is None else ratios
+    reference = throughput[REFERENCE]
+    return {
+        engine: (ratios[engine], measured / reference) for engine, measured in throughput.items()
+        if engine in ratios and measured < reference * ratios[engine]
+    }
+
+
+def read_baseline(filename) -> dict:
+    """The throughput per spec and engine saved by :func:`write_baseline`"""
+    try:
+        with open(filename) as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        return dict()
+    if baseline.get('version') != BASELINE_VERSION:
+        return dict()
+    return baseline.get('specs', dict())
+
+
+def write_baseline(filename, specs: Dict[str, Dict[str, float]]):
+    with open(filename, 'w') as f:
+        json.dump({'version': BASELINE_VERSION, 'specs': specs}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def seed_specs() -> Dict[str, dict]:
+    """The seed specs in :data:`SEED_DIR` by name, which the tests use too"""
+    from .spec import load_spec
+    return {name: load_spec(os.path.join(SEED_DIR, f"{name}.json")) for name in SEEDS}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m xpresscli.harness', description=__doc__.split('\n\n')[0])
+    parser.add_argument('spec_files', nargs='*', help="the JSON parser specs [default: the test specs]")
+    parser.add_argument('-n', '--count', type=int, default=500, help="command lines per spec [default: 500]")
+    parser.add_argument('-s', '--seed', type=int, default=0, help="the random seed [default: 0]")
+    parser.add_argument('-b', '--baseline', help="compare throughput with this baseline file")
+    parser.add_argument('-u', '--update-baseline', action='store_true', help="save the throughput as the baseline")
+    parser.add_argument('-t', '--threshold', type=float, default=THRESHOLD,
+                        help=f"the fraction of throughput that may be lost [default: {THRESHOLD}]")
+    args = parser.parse_args(argv)
+    if args.spec_files:
+        from .spec import load_spec, normalize_spec
+        specs = {spec_file: normalize_spec(load_spec(spec_file)) for spec_file in args.spec_files}
+    else:
+        specs = seed_specs()
+    baseline = read_baseline(args.baseline) if args.baseline else dict()
+    measured = dict()
+    exit_status = 0
+    for name, parser_spec in specs.items():
+        report = run(parser_spec, args.count, args.seed)
+        measured[name] = report.throughput()
+        print(f"{name}: {len(report.cases)} command lines, {len(report.mismatches)} mismatches")
+        for engine, throughput in measured[name].items():
+            print(f"  {engine:<10} {throughput:10.0f} per second")
+        for mismatch in report.mismatches:
+            print(f"  mismatch in {mismatch.engine} for {mismatch.argv}:\n"
+                  f"    expected {mismatch.expected}\n    actual   {mismatch.actual}")
+            exit_status = 1
+        for engine, (before, after) in regressions(measured[name], baseline.get(name, {}), args.threshold).items():
+            print(f"  regression in {engine}: {after:.0f} per second against {before:.0f}")
+            exit_status = 1
+        for engine, (least, ratio) in slow_engines(measured[name]).items():
+            print(f"  {engine} is too slow: {ratio:.2f} of the throughput of {REFERENCE}, at least {least:.2f}")
+            exit_status = 1
+    if args.baseline and args.update_baseline:
+        write_baseline(args.baseline, measured)
+    return exit_status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
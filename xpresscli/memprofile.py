@@ -0,0 +1,169 @@
+"""Profile the memory used to build the parser, parse the command line and run the manager
+
+Run a program with ``--xcli-memprofile PATH`` (or ``XPRESSCLI_MEMPROFILE=PATH`` in the environment) and
+:class:`Client` traces allocations with :mod:`tracemalloc`. It writes a JSON report to ``PATH``: for each phase
+(``build``, ``parse`` and ``dispatch``) the net memory allocated, the peak and the top allocation sites, and for the
+whole run the memory still held at the end. The report looks like::
+
+    {
+      "version": 1,
+      "argv": ["load", "-e", "emd_1234"],
+      "phases": [
+        {"name": "build", "size": 181337, "blocks": 1642, "peak": 215904,
+         "top": [{"file": "argparse.py", "line": 1455, "size": 24160, "blocks": 151}, ...]},
+        ...
+      ],
+      "retained": {"size": 202146, "blocks": 1870, "top": [...]}
+    }
+
+Sizes are in bytes. Files are given relative to the ``sys.path`` entry they were imported from, so that reports
+from different installations can be compared. Before Python 3.9 the peak of a phase is the peak since tracing
+started, as :func:`tracemalloc.reset_peak` is not available.
+"""
+from __future__ import annotations
+
+import contextlib
+import os
+import sys
+
+#: the version of the report format
+PROFILE_VERSION = 1
+
+#: the option that turns profiling on for one run
+FLAG = '--xcli-memprofile'
+
+#: the environment variable that turns profiling on
+ENV_VAR = 'XPRESSCLI_MEMPROFILE'
+
+#: how many allocation sites are reported per phase
+TOP = 20
+
+
+def strip_flag(argv):
+    """Remove ``--xcli-memprofile PATH`` from the command line and return the rest and the path (or None)"""
+    for index, arg in enumerate(argv):
+        if arg == FLAG and index + 1 < len(argv):
+            return argv[:index] + argv[index + 2:], argv[index + 1]
+        if arg.startswith(f"{FLAG}="):
+            return argv[:index] + argv[index + 1:], arg.split('=', 1)[1]
+    return list(argv), None
+
+
+def requested(argv=None, environ=None):
+    """The report path asked for on the command line or in the environment, if any"""
+    _, filename = strip_flag(sys.argv[1:] if argv is None else argv)
+    if filename is None:
+        filename = (os.environ if environ is None else environ).get(ENV_VAR) or None
+    return filename
+
+
+def numbered(filename, number) -> str:
+    """The path of report ``number`` of those written to ``filename``: ``profile.json``, ``profile-2.json``, ..."""
+    if number == 1:
+        return filename
+    root, extension = os.path.splitext(filename)
+    return f"{root}-{number}{extension}"
+
+
+def _relative(filename) -> str:
+    """The file name relative to the longest ``sys.path`` entry containing it"""
+    for entry in sorted((entry for entry in sys.path if entry), key=len, reverse=True):
+        if filename.startswith(entry.rstrip(os.sep) + os.sep):
+            return filename[len(entry.rstrip(os.sep)) + 1:]
+    return filename
+
+
+class MemoryProfile:
+    """Trace the allocations of the phases of one run and write them to a file
+
+    Use it as a context manager around the run and :meth:`phase` around each phase.
+    """
+
+    def __init__(self, filename, top=TOP):
+        self.filename = filename
+        self.top = top
+        self.argv = None
+        self.phases = list()
+        self._started = False
+        self._baseline = None
+
+    def start(self):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        self._baseline = self._snapshot()
+        return self
+
+    def _snapshot(self):
+        import tracemalloc
+        # leave out the snapshots themselves
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def _difference(self, before, after) -> dict:
+        stats = after.compare_to(before, 'lineno')
+        return {
+            'size': sum(stat.size_diff for stat in stats),
+            'blocks': sum(stat.count_diff for stat in stats),
+            'top': [
+                {
+                    'file': _relative(stat.traceback[0].filename),
+                    'line': stat.traceback[0].lineno,
+                    'size': stat.size_diff,
+                    'blocks': stat.count_diff,
+                }
+                for stat in sorted(stats, key=lambda stat: (-stat.size_diff, str(stat.traceback)))[:self.top]
+                if stat.size_diff > 0
+            ],
+        }
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Record the allocations made in the block as the phase ``name``"""
+        import tracemalloc
+        before = self._snapshot()
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1] - start
+            difference = self._difference(before, self._snapshot())
+            # the snapshots are left out of the size but not of the peak
+            self.phases.append({'name': name, **difference, 'peak': max(peak, difference['size'])})
+
+    def report(self) -> dict:
+        return {
+            'version': PROFILE_VERSION,
+            'argv': self.argv,
+            'phases': self.phases,
+            'retained': self._difference(self._baseline, self._snapshot()),
+        }
+
+    def finish(self):
+        """Write the report and stop tracing if this profile started it"""
+        import json
+        import tracemalloc
+        report = self.report()
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+        with open(self.filename, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+        return report
+
+    def __enter__(self):
+        if self._baseline is None:
+            self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.finish()
+        return False
+
+
+def phase(profile, name):
+    """``profile.phase(name)`` or a no-op if there is no profile"""
+    return contextlib.nullcontext() if profile is None else profile.phase(name)
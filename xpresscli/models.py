@@ -1,6 +1,9 @@
 import argparse
 import configparser
+import copy
 import json
+import os
+import sys
 
 
 class Validator:
@@ -97,6 +100,12 @@ class Manager:
 
 
 class DynamicParser:
+    """Builds a parser from a spec in the ``program_name``/``commands``/``arguments`` format
+
+    The spec is translated by :func:`spec.normalize_spec` and built by :class:`CLIParser` so that it gets the same lazy
+    construction and fast paths as ``parser`` specs; ``self.parser`` is the :class:`CLIParser`.
+    """
+
     def __init__(self, config_filename):
         self.config = self._load_parser_config(config_filename)
         self.parser = self._create_parser_from_config()
@@ -106,32 +115,13 @@ class DynamicParser:
             return json.load(f)
 
     def _create_parser_from_config(self):
-        parser = argparse.ArgumentParser(prog=self.config["program_name"], description=self.config["description"])
-        subparsers = parser.add_subparsers(dest="command")
-
-        for subcommand in self.config["commands"]:
-            subparser = subparsers.add_parser(subcommand["name"], help=subcommand["help"])
-            for arg in subcommand["arguments"]:
-                kwargs = {
-                    'help': arg.get('help', ''),
-                    'default': arg.get('default')
-                }
-
-                if 'choices' in arg:
-                    kwargs['choices'] = arg['choices']
-
-                arg_type = arg.get('type')
-                if arg_type == "store_true":
-                    kwargs['action'] = 'store_true'
-                elif arg_type:
-                    kwargs['type'] = eval(arg_type)  # Using eval to map the type string to an actual type
-
-                subparser.add_argument(arg["name"], **kwargs)
-
-        return parser
+        # imported here so that the module can still be run as a script (see the end of the module)
+        from .experiment import CLIParser
+        from .spec import normalize_spec
+        return CLIParser(normalize_spec(copy.deepcopy(self.config)))
 
-    def parse_args(self):
-        return self.parser.parse_args()
+    def parse_args(self, args=None):
+        return self.parser.parse_args(args)
 
 
 def main():
@@ -143,4 +133,8 @@ def main():
 
 
 if __name__ == "__main__":
+    if not __package__:
+        # run as ``python models.py``: make the package importable so that the relative imports resolve
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        __package__ = 'xpresscli'
     main()
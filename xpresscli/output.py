@@ -0,0 +1,208 @@
+"""Stream the records produced by generator managers
+
+A manager may return an iterator or an async iterator of records instead of an exit status. Records are written in
+batches of :data:`BATCH_SIZE` (a table waits for its first :data:`TABLE_SAMPLE` records to size its columns), so memory
+use does not depend on the number of records. The records produced before a manager raises are still written. A
+generator's return value becomes the exit status once the stream has been drained (async generators, and other
+iterators, exit with zero).
+
+Records are usually mappings; sequences and scalars are written as they are (CSV and tables without a header). The
+CSV and table columns are the keys of the first record: like :class:`csv.DictWriter`, a later record with other keys
+raises :class:`ValueError`, while missing keys are left empty.
+"""
+from __future__ import annotations
+
+import collections.abc
+import sys
+
+from .experiment import STREAM_FORMATS as FORMATS
+
+#: how many records to write at a time
+BATCH_SIZE = 1000
+
+#: how many records a table looks at to size its columns
+TABLE_SAMPLE = 100
+
+#: the widest a table column may be
+TABLE_MAX_WIDTH = 40
+
+_OPENERS = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'lzma',
+}
+
+
+def is_stream(value) -> bool:
+    """Whether a manager returned records rather than an exit status"""
+    return isinstance(value, (collections.abc.Iterator, collections.abc.AsyncIterator))
+
+
+def open_output(filename=None):
+    """Open a text stream for the records, compressed according to the file name's suffix
+
+    ``None`` or ``-`` is standard output, which is not closed by :func:`stream_records`.
+    """
+    if filename is None or str(filename) == '-':
+        return sys.stdout
+    filename = str(filename)
+    for suffix, module in _OPENERS.items():
+        if filename.endswith(suffix):
+            import importlib
+            return importlib.import_module(module).open(filename, 'wt', encoding='utf-8', newline='')
+    return open(filename, 'w', encoding='utf-8', newline='', buffering=1 << 16)
+
+
+class _Records:
+    """Iterate over the records and keep the value returned by a generator"""
+
+    def __init__(self, records):
+        self._records = records
+        self.exit_status = None
+
+    def __iter__(self):
+        self.exit_status = yield from self._records
+
+
+class _Writer:
+    """Write records to a text stream in batches"""
+
+    def __init__(self, stream, output_format='jsonl'):
+        if output_format not in FORMATS:
+            raise ValueError(f"output format must be one of {', '.join(FORMATS)}, not {output_format!r}")
+        self.stream = stream
+        self.format = output_format
+        self.count = 0
+        self._batch = list()
+        self._columns = None
+        self._column_set = None
+        self._widths = None
+        self._sample = list() if output_format == 'table' else None
+        self._csv = None
+        if output_format == 'csv':
+            import csv
+            self._csv = csv.writer(_ListWriter(self._batch), lineterminator='\n')
+        elif output_format == 'jsonl':
+            import json
+            self._dumps = json.dumps
+
+    def write(self, record):
+        self.count += 1
+        if self._sample is not None:
+            self._sample.append(record)
+            if len(self._sample) >= TABLE_SAMPLE:
+                self._flush_sample()
+            return
+        self._write(record)
+        if len(self._batch) >= BATCH_SIZE:
+            self.flush()
+
+    def _write(self, record):
+        if self.format == 'jsonl':
+            self._batch.append(self._dumps(record, default=str) + '\n')
+        elif self.format == 'csv':
+            if self._columns is None:
+                self._set_columns(record)
+                if self._columns:
+                    self._csv.writerow(self._columns)
+            self._csv.writerow(self._cells(record))
+        else:
+            self._batch.append('  '.join(
+                self._fit(cell, width) for cell, width in zip(self._cells(record), self._widths)
+            ).rstrip() + '\n')
+
+    def _set_columns(self, first):
+        self._columns = list(first) if isinstance(first, collections.abc.Mapping) else False
+        self._column_set = set(self._columns or ())
+
+    def _cells(self, record):
+        if isinstance(record, collections.abc.Mapping):
+            if not self._columns:
+                return list(record.values())
+            if len(record) > len(self._column_set) or not self._column_set.issuperset(record):
+                extra = ', '.join(repr(key) for key in record if key not in self._column_set)
+                raise ValueError(f"record keys {extra} are not columns (the keys of the first record)")
+            return [record.get(column, '') for column in self._columns]
+        if isinstance(record, (list, tuple)):
+            return list(record)
+        return [record]
+
+    @staticmethod
+    def _fit(cell, width):
+        text = str(cell)
+        if len(text) > width:
+            text = text[:width - 1] + '…'
+        return text.ljust(width)
+
+    def _flush_sample(self):
+        """Size the table columns on the records seen so far and write them"""
+        sample, self._sample = self._sample, None
+        if not sample:
+            return
+        self._set_columns(sample[0])
+        rows = [self._cells(record) for record in sample]
+        header = [str(column) for column in self._columns] if self._columns else None
+        widths = [0] * max(len(row) for row in rows + ([header] if header else []))
+        for row in rows + ([header] if header else []):
+            for index, cell in enumerate(row):
+                widths[index] = min(TABLE_MAX_WIDTH, max(widths[index], len(str(cell))))
+        self._widths = widths
+        if header:
+            self._write(dict(zip(self._columns, header)))
+        for record in sample:
+            self._write(record)
+        self.flush()
+
+    def flush(self):
+        if self._sample is not None:
+            self._flush_sample()
+        if self._batch:
+            self.stream.write(''.join(self._batch))
+            self._batch.clear()
+
+
+class _ListWriter:
+    """A file-like object that appends what the csv module writes to a list"""
+
+    def __init__(self, lines):
+        self.write = lines.append
+
+
+def write_records(records, stream, output_format='jsonl') -> int:
+    """Write the records to the text stream and return how many were written"""
+    writer = _Writer(stream, output_format)
+    try:
+        for record in records:
+            writer.write(record)
+    finally:
+        writer.flush()
+    return writer.count
+
+
+async def write_async_records(records, stream, output_format='jsonl') -> int:
+    """Write the records from an async iterator to the text stream and return how many were written"""
+    writer = _Writer(stream, output_format)
+    try:
+        async for record in records:
+            writer.write(record)
+    finally:
+        writer.flush()
+    return writer.count
+
+
+def stream_records(records, output_format='jsonl', filename=None) -> int:
+    """Drain the records into the output and return the exit status"""
+    stream = open_output(filename)
+    try:
+        if isinstance(records, collections.abc.AsyncIterator):
+            import asyncio
+            asyncio.run(write_async_records(records, stream, output_format))
+            return 0
+        records = _Records(records)
+        write_records(records, stream, output_format)
+        return records.exit_status or 0
+    finally:
+        if stream is sys.stdout:
+            stream.flush()
+        else:
+            stream.close()
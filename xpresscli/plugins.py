@@ -0,0 +1,115 @@
+"""Discover commands contributed by installed distributions
+
+A distribution contributes commands through an entry point in the group named by the spec, e.g.::
+
+    [project.entry-points."oil.commands"]
+    export = "oil_export.cli:COMMAND"
+
+The entry point refers to a command spec (a mapping as found under ``subparsers.commands``), a list of them or a
+callable returning either. Keep it in a light module apart from the handler: it is imported only when the installed
+packages are scanned, while the module named by the command's ``manager`` is imported only when the command is run.
+
+Scanning package metadata is slow so the commands found are kept in an index under :func:`cache.cache_dir` which is
+rebuilt whenever a directory on the search path (e.g. site-packages) changes.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import warnings
+
+from . import cache
+from .spec import copy_spec
+
+#: the version of the index file format
+INDEX_VERSION = 1
+
+
+def _fingerprint(path) -> list:
+    """Identify the state of the search path by the modification times of its directories"""
+    fingerprint = [sys.version]
+    for entry in path:
+        try:
+            fingerprint.append([entry, os.stat(entry or '.').st_mtime_ns])
+        except OSError:
+            fingerprint.append([entry, None])
+    return fingerprint
+
+
+def _index_file(group) -> str:
+    import hashlib
+    digest = hashlib.sha1(group.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache.cache_dir(), f"plugins-{digest}.json")
+
+
+def _load(entry_point) -> list:
+    """Copies of the command specs an entry point refers to, which the parser is free to consume"""
+    spec = entry_point.load()
+    if callable(spec):
+        spec = spec()
+    commands = [spec] if isinstance(spec, dict) else list(spec)
+    for command in commands:
+        if not isinstance(command, dict) or 'name' not in command or 'manager' not in command:
+            raise ValueError(f"plugin command {entry_point.value!r} must have a 'name' and a 'manager'")
+    return copy_spec(commands)
+
+
+def _scan(group, path) -> list:
+    """Load the command specs from every entry point in the group
+
+    An entry point that cannot be loaded is skipped with a warning so that one broken distribution does not break
+    the whole command line.
+    """
+    from importlib import metadata
+    commands = list()
+    for distribution in metadata.distributions(path=path):
+        for entry_point in distribution.entry_points:
+            if entry_point.group != group:
+                continue
+            try:
+                commands.extend(_load(entry_point))
+            except Exception as err:
+                warnings.warn(f"ignoring plugin {entry_point.value!r}: {type(err).__name__}: {err}")
+    return commands
+
+
+def discover_commands(group, path=None) -> list:
+    """Return the command specs contributed to the entry point group
+
+    The index is only rebuilt, and the plugin spec modules imported, if the search path has changed.
+    """
+    path = list(sys.path if path is None else path)
+    fingerprint = _fingerprint(path)
+    index_file = _index_file(group)
+    index = cache.read_json(index_file, default=dict())
+    if index.get('version') == INDEX_VERSION and index.get('group') == group and index.get('fingerprint') == fingerprint:
+        return index['commands']
+    commands = _scan(group, path)
+    cache.write_json(index_file, {
+        'version': INDEX_VERSION,
+        'group': group,
+        'fingerprint': fingerprint,
+        'commands': commands,
+    })
+    return commands
+
+
+def merge_plugin_commands(parser_spec: dict, path=None) -> dict:
+    """Add the commands found through the entry point group named by ``subparsers.plugins`` to the spec
+
+    Commands defined in the spec take precedence over plugin commands of the same name. :class:`CLIParser` and
+    :func:`compiler.compile_spec` call this on the specs they are given.
+    """
+    subparsers_spec = parser_spec['parser'].get('subparsers')
+    if subparsers_spec is None or 'plugins' not in subparsers_spec:
+        return parser_spec
+    group = subparsers_spec.pop('plugins')
+    commands = subparsers_spec.setdefault('commands', list())
+    names = {command['name'] for command in commands}
+    for command in discover_commands(group, path=path):
+        if command['name'] in names:
+            warnings.warn(f"ignoring plugin command {command['name']!r} which is already defined")
+            continue
+        names.add(command['name'])
+        commands.append(command)
+    return parser_spec
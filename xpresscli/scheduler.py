@@ -0,0 +1,208 @@
+"""A local stand-in for a cluster job scheduler
+
+Jobs are commands run as subprocesses. A job may request an amount of memory, which becomes its address space limit,
+and may depend on earlier jobs, so the jobs always form a DAG. The scheduler starts every job whose dependencies have
+completed as long as the number of running jobs stays within ``max_jobs`` (the CPU count by default) and their
+requested memory within ``memory_budget`` (physical memory by default). Jobs whose dependencies failed are skipped.
+The state of every job is written to a JSON file at each transition.
+"""
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import time
+
+from . import cache
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+#: the version of the state file format
+STATE_VERSION = 1
+
+
+def physical_memory():
+    """The physical memory in MiB or None if it cannot be determined"""
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def _memory_limit(memory):
+    """Return a function that limits the address space of the child process to ``memory`` MiB"""
+
+    def limit():
+        import resource
+        limit_bytes = memory * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit_bytes, limit_bytes))
+
+    return limit
+
+
+class Job:
+    """A command to be run by the :class:`LocalScheduler`"""
+
+    def __init__(self, job_id, command, name=None, memory=None, depends_on=(), env=None):
+        self.job_id = job_id
+        self.command = list(command)
+        self.name = name
+        self.memory = memory
+        self.depends_on = list(depends_on)
+        self.env = env
+        self.state = PENDING
+        self.exit_status = None
+        self.reason = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.process = None
+
+    def as_dict(self):
+        return {
+            'id': self.job_id,
+            'name': self.name,
+            'command': self.command,
+            'memory': self.memory,
+            'depends_on': self.depends_on,
+            'state': self.state,
+            'exit_status': self.exit_status,
+            'reason': self.reason,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+    def __repr__(self):
+        return f"Job({self.job_id!r}, name={self.name!r}, state={self.state!r})"
+
+
+class LocalScheduler:
+    """Run jobs as local subprocesses within CPU and memory budgets"""
+
+    def __init__(self, state_file=None, max_jobs=None, memory_budget=None, log_dir=None, poll_interval=0.05):
+        if state_file is None:
+            state_file = os.path.join(cache.cache_dir(), 'jobs', f"{os.getpid()}.json")
+        self.state_file = state_file
+        self.max_jobs = max_jobs or os.cpu_count() or 1
+        self.memory_budget = memory_budget if memory_budget is not None else physical_memory()
+        self.log_dir = log_dir
+        self.poll_interval = poll_interval
+        self.jobs = dict()
+        self._names = dict()
+
+    def _job(self, job_id_or_name):
+        job_id = self._names.get(job_id_or_name, job_id_or_name)
+        try:
+            return self.jobs[job_id]
+        except KeyError:
+            raise ValueError(f"unknown job {job_id_or_name!r}; jobs may only depend on jobs submitted before them")
+
+    def submit(self, command, name=None, memory=None, depends_on=(), env=None) -> str:
+        """Add a job and return its ID
+
+        :param command: the command line as a list of strings
+        :param name: a short name which other jobs may also use to depend on this job
+        :param memory: the memory to allow the job in MiB
+        :param depends_on: IDs or names of jobs which must complete successfully first
+        :param env: the environment for the job [default: that of this process]
+        """
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        dependencies = [self._job(dependency).job_id for dependency in depends_on]
+        job_id = str(len(self.jobs) + 1)
+        self.jobs[job_id] = Job(job_id, command, name=name, memory=memory, depends_on=dependencies, env=env)
+        if name is not None:
+            self._names[name] = job_id
+        self._write_state()
+        return job_id
+
+    def submit_command(self, parser_file, argv, **kwargs) -> str:
+        """Add a job which runs an xpresscli command from the spec in ``parser_file``"""
+        return self.submit([sys.executable, '-m', 'xpresscli', 'run', str(parser_file), *argv], **kwargs)
+
+    def _write_state(self):
+        cache.write_json(self.state_file, {
+            'version': STATE_VERSION,
+            'jobs': [job.as_dict() for job in self.jobs.values()],
+        })
+
+    def _finish(self, job, state, exit_status=None, reason=None):
+        job.state = state
+        job.exit_status = exit_status
+        job.reason = reason
+        job.finished = time.time()
+        job.process = None
+
+    def _start(self, job):
+        kwargs = dict()
+        if job.memory is not None and os.name == 'posix':
+            kwargs['preexec_fn'] = _memory_limit(job.memory)
+        if self.log_dir is not None:
+            os.makedirs(self.log_dir, exist_ok=True)
+            kwargs['stdout'] = open(os.path.join(self.log_dir, f"{job.job_id}.out"), 'w')
+            kwargs['stderr'] = open(os.path.join(self.log_dir, f"{job.job_id}.err"), 'w')
+        try:
+            job.process = subprocess.Popen(job.command, env=job.env, **kwargs)
+        except OSError as err:
+            self._finish(job, FAILED, reason=str(err))
+        else:
+            job.state = RUNNING
+            job.started = time.time()
+        finally:
+            for stream in ['stdout', 'stderr']:
+                if stream in kwargs:
+                    kwargs[stream].close()
+
+    def _schedule(self, running):
+        """Start or skip every pending job that can be; return whether anything changed"""
+        changed = False
+        memory_in_use = sum(job.memory or 0 for job in running)
+        for job in self.jobs.values():
+            if job.state != PENDING:
+                continue
+            states = {self.jobs[dependency].state for dependency in job.depends_on}
+            if states & {FAILED, SKIPPED}:
+                self._finish(job, SKIPPED, reason="a dependency did not complete")
+                changed = True
+            elif states <= {DONE}:
+                if self.memory_budget is not None and (job.memory or 0) > self.memory_budget:
+                    self._finish(job, FAILED, reason=f"requested {job.memory} MiB exceeds the budget of "
+                                                     f"{self.memory_budget} MiB")
+                    changed = True
+                elif len(running) < self.max_jobs and (
+                        self.memory_budget is None or memory_in_use + (job.memory or 0) <= self.memory_budget):
+                    self._start(job)
+                    if job.state == RUNNING:
+                        running.append(job)
+                        memory_in_use += job.memory or 0
+                    changed = True
+        return changed
+
+    def run(self) -> dict:
+        """Run all pending jobs and return the final state of every job by ID"""
+        running = [job for job in self.jobs.values() if job.state == RUNNING]
+        while True:
+            changed = self._schedule(running)
+            for job in list(running):
+                exit_status = job.process.poll()
+                if exit_status is not None:
+                    running.remove(job)
+                    self._finish(job, DONE if exit_status == 0 else FAILED, exit_status=exit_status)
+                    changed = True
+            if changed:
+                self._write_state()
+            if not running and not any(job.state == PENDING for job in self.jobs.values()):
+                return {job_id: job.state for job_id, job in self.jobs.items()}
+            if not changed:
+                time.sleep(self.poll_interval)
+
+
+def read_state(state_file) -> dict:
+    """Return the recorded jobs by ID"""
+    state = cache.read_json(state_file, default=dict())
+    return {job['id']: job for job in state.get('jobs', [])}
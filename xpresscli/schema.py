@@ -0,0 +1,363 @@
+"""Validate a parser spec before it is built
+
+Every problem in the spec is reported at once with its JSON path (e.g. ``$.parser.subparsers.commands[2].parents[0]``)
+rather than the first one surfacing as an exception from deep inside argparse. The checks are:
+
+- unknown keys and values of the wrong type;
+- flags that are not strings, positionals with several names, and option keywords that the action does not take
+  (e.g. ``type`` with ``store_true``) or an unknown ``action``, ``type`` or ``nargs``;
+- flags defined twice for one parser, including those of its parent parsers and ``-h/--help``;
+- duplicate command names and commands naming parent parsers that do not exist;
+- indexed ``choices`` mappings that do not give exactly one source.
+
+A spec that passes is remembered by its hash under :func:`cache.cache_dir` so later runs skip the checks.
+"""
+from __future__ import annotations
+
+import argparse
+import builtins
+import os
+import re
+from typing import List
+
+from . import cache
+from .experiment import stream_options
+from .spec import SpecError
+
+#: changes whenever the checks do so that specs passed by older checks are validated again
+SCHEMA_VERSION = 1
+
+_DOTTED_NAME = re.compile(r'[A-Za-z_]\w*(\.[A-Za-z_]\w*)*')
+
+# keyword arguments of argparse.ArgumentParser
+_PARSER_KEYS = {
+    'prog': str, 'usage': str, 'description': str, 'epilog': str, 'prefix_chars': str,
+    'fromfile_prefix_chars': str, 'argument_default': object, 'conflict_handler': str, 'add_help': bool,
+    'allow_abbrev': bool, 'exit_on_error': bool,
+}
+
+_TOP_KEYS = {
+    **_PARSER_KEYS, 'parent_parsers': list, 'subparsers': dict, 'options': list, 'groups': list,
+    'mutually_exclusive_groups': list, 'chain': dict, 'config_option': str,
+}
+
+_CHAIN_KEYS = {'separator': str, 'short_circuit': bool}
+
+_PARENT_KEYS = {**_PARSER_KEYS, 'options': list}
+
+_SUBPARSERS_KEYS = {
+    'title': str, 'description': str, 'prog': str, 'dest': str, 'required': bool, 'help': str, 'metavar': str,
+    'commands': list, 'subparsers': object, 'plugins': (str, dict),
+}
+
+_COMMAND_KEYS = {
+    **_PARSER_KEYS, 'name': str, 'aliases': list, 'help': str, 'options': list, 'groups': list,
+    'mutually_exclusive_groups': list, 'manager': str, 'retry': dict, 'timeout': (int, float), 'parents': list,
+    'stream': (bool, dict),
+}
+
+_RETRY_KEYS = {
+    'max_attempts': int, 'backoff': (int, float), 'max_backoff': (int, float), 'jitter': bool, 'exit_codes': list,
+    'exceptions': list, 'disable_flag': str,
+}
+
+_STREAM_KEYS = {'format': str, 'format_flag': list, 'output_flag': list}
+
+_GROUP_KEYS = {'title': str, 'description': str, 'options': list, 'argument_default': object,
+               'conflict_handler': str, 'prefix_chars': str}
+
+_MUTEX_GROUP_KEYS = {'title': str, 'required': bool, 'options': list}
+
+_OPTION_KEYS = {
+    'flag': list, 'action': str, 'nargs': (int, str), 'const': object, 'default': object, 'type': str,
+    'choices': (list, dict), 'required': bool, 'help': str, 'metavar': (str, list), 'dest': str, 'version': str,
+    'env': (str, list), 'config': str,
+}
+
+
+def _action_keywords(action_class) -> set:
+    """The keywords the argparse action class takes, read from the signature of its constructor"""
+    code = action_class.__init__.__code__
+    return set(code.co_varnames[1:code.co_argcount + code.co_kwonlyargcount]) - {'option_strings'}
+
+
+# the keywords each action takes besides flag, env and config
+_ACTION_KEYS = {
+    name: _action_keywords(action_class)
+    for name, action_class in argparse.ArgumentParser(add_help=False)._registries['action'].items()
+    if isinstance(name, str) and name != 'parsers'
+}
+
+# indexed choices give exactly one of these
+_CHOICES_KEYS = {'values': list, 'file': str, 'callable': str}
+
+_COMMON_OPTION_KEYS = {'flag', 'action', 'env', 'config'}
+
+_NARGS = ('?', '*', '+', '...', 'A...')
+
+
+def _type_name(types) -> str:
+    if isinstance(types, tuple):
+        return ' or '.join(t.__name__ for t in types)
+    return types.__name__
+
+
+class InvalidSpec(SpecError):
+    """Raised for a spec with problems; ``errors`` holds a :class:`SpecError` for each of them"""
+
+    def __init__(self, errors: List[SpecError], filename=None):
+        self.errors = errors
+        message = f"{len(errors)} problem{'s' if len(errors) != 1 else ''} in the spec:" + ''.join(
+            f"\n  {error.path}: {error.message}" for error in errors
+        )
+        super().__init__(message, '$', filename)
+
+
+class _Validator:
+    """Walks the spec once and collects the problems"""
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.errors = list()
+
+    def error(self, message, path):
+        self.errors.append(SpecError(message, path, self.filename))
+
+    def mapping(self, node, keys, path, required=()) -> bool:
+        """Check the keys and value types of a mapping; return False if it is not a mapping"""
+        if not isinstance(node, dict):
+            self.error(f"expected a mapping, not {type(node).__name__}", path)
+            return False
+        for key in required:
+            if key not in node:
+                self.error(f"missing '{key}'", path)
+        for key, value in node.items():
+            if key not in keys:
+                self.error(f"unknown key '{key}'", f"{path}.{key}")
+            elif value is not None and keys[key] is not object and not isinstance(value, keys[key]):
+                self.error(f"expected {_type_name(keys[key])}, not {type(value).__name__}", f"{path}.{key}")
+        return True
+
+    def items(self, node, key, path):
+        """The (path, item) pairs of a list under the key"""
+        value = node.get(key)
+        if not isinstance(value, list):
+            return []
+        return [(f"{path}.{key}[{index}]", item) for index, item in enumerate(value)]
+
+    def spec(self, parser_spec):
+        if not self.mapping(parser_spec, {'parser': dict, 'includes': list, 'definitions': dict}, '$', ['parser']):
+            return
+        parser = parser_spec.get('parser')
+        if not isinstance(parser, dict):
+            return
+        path = '$.parser'
+        self.mapping(parser, _TOP_KEYS, path)
+        if isinstance(parser.get('chain'), dict):
+            self.mapping(parser['chain'], _CHAIN_KEYS, f"{path}.chain")
+        parents = dict()
+        for parent_path, parent in self.items(parser, 'parent_parsers', path):
+            if self.mapping(parent, _PARENT_KEYS, parent_path, ['prog', 'options']):
+                scope = self.scope(parent, parent_path, add_help=parent.get('add_help', True))
+                if isinstance(parent.get('prog'), str):
+                    parents[parent['prog']] = scope
+        subparsers = parser.get('subparsers')
+        if isinstance(subparsers, dict):
+            self.subparsers(subparsers, f"{path}.subparsers", parents)
+        self.scope(parser, path, add_help=parser.get('add_help', True))
+
+    def subparsers(self, subparsers, path, parents):
+        self.mapping(subparsers, _SUBPARSERS_KEYS, path)
+        names = dict()
+        for command_path, command in self.items(subparsers, 'commands', path):
+            if not self.mapping(command, _COMMAND_KEYS, command_path, ['name']):
+                continue
+            for index, alias in enumerate([command.get('name'), *(command.get('aliases') or [])]):
+                if not isinstance(alias, str):
+                    continue
+                alias_path = f"{command_path}.name" if index == 0 else f"{command_path}.aliases[{index - 1}]"
+                if alias in names:
+                    self.error(f"command '{alias}' is already defined at {names[alias]}", alias_path)
+                else:
+                    names[alias] = alias_path
+            manager = command.get('manager')
+            if isinstance(manager, str) and not (_DOTTED_NAME.fullmatch(manager) and '.' in manager):
+                self.error(f"the manager must be a dotted path such as 'package.module.function', not {manager!r}",
+                           f"{command_path}.manager")
+            if isinstance(command.get('retry'), dict):
+                self.mapping(command['retry'], _RETRY_KEYS, f"{command_path}.retry")
+            if isinstance(command.get('stream'), dict):
+                self.mapping(command['stream'], _STREAM_KEYS, f"{command_path}.stream")
+            timeout = command.get('timeout')
+            if isinstance(timeout, (int, float)) and timeout <= 0:
+                self.error("the timeout must be positive", f"{command_path}.timeout")
+            inherited = dict()
+            for parent_path, parent in self.items(command, 'parents', command_path):
+                if parent not in parents:
+                    known = ', '.join(repr(name) for name in parents) or 'none'
+                    self.error(f"unknown parent parser {parent!r} (defined: {known})", parent_path)
+                    continue
+                for flag, flag_path in parents[parent].items():
+                    if flag in inherited and command.get('conflict_handler') != 'resolve':
+                        self.error(f"'{flag}' of parent {parent!r} is also defined at {inherited[flag]}", parent_path)
+                    inherited.setdefault(flag, flag_path)
+            self.scope(command, command_path, add_help=command.get('add_help', True), inherited=inherited)
+
+    def scope(self, parser, path, add_help=True, inherited=None) -> dict:
+        """Check the options of one parser and return the path of each of its flags
+
+        With ``"conflict_handler": "resolve"`` a flag defined again replaces the earlier definition.
+        """
+        flags = dict(inherited or {})
+        resolve = parser.get('conflict_handler') == 'resolve'
+        if add_help:
+            clashes = [flag for flag in ['-h', '--help'] if flag in flags]
+            if clashes and not resolve:
+                self.error(f"the help option clashes with '{clashes[0]}' at {flags[clashes[0]]}; "
+                           f"set \"add_help\": false on one of them", path)
+            flags.update({'-h': f"{path} (help)", '--help': f"{path} (help)"})
+        prefix_chars = parser.get('prefix_chars') or '-'
+        for option_path, option in self.items(parser, 'options', path):
+            self.define(flags, self.option(option, option_path, prefix_chars), f"{option_path}.flag", resolve)
+        # CLIParser adds the output options of a streaming command after its own options
+        stream = parser.get('stream')
+        if stream and isinstance(stream, (bool, dict)):
+            for key, option in zip(['format_flag', 'output_flag'], stream_options(stream)):
+                if isinstance(option['flag'], list):
+                    given = isinstance(stream, dict) and key in stream
+                    flag_path = f"{path}.stream.{key}" if given else f"{path}.stream"
+                    self.define(flags, [flag for flag in option['flag'] if isinstance(flag, str)], flag_path, resolve)
+        for group_key, keys, required in [('groups', _GROUP_KEYS, ['title', 'options']),
+                                          ('mutually_exclusive_groups', _MUTEX_GROUP_KEYS, ['title', 'options'])]:
+            for group_path, group in self.items(parser, group_key, path):
+                if self.mapping(group, keys, group_path, required):
+                    # argument groups may handle conflicts their own way; mutually exclusive groups do as the parser
+                    group_resolve = group.get('conflict_handler', parser.get('conflict_handler')) == 'resolve'
+                    for option_path, option in self.items(group, 'options', group_path):
+                        option_flags = self.option(option, option_path, prefix_chars)
+                        self.define(flags, option_flags, f"{option_path}.flag", group_resolve)
+        return flags
+
+    def define(self, flags, new_flags, path, resolve=False):
+        """Record where each of the flags is defined, reporting those that already are unless conflicts resolve"""
+        for flag in new_flags:
+            if flag in flags and not resolve:
+                self.error(f"'{flag}' is already defined at {flags[flag]}", path)
+            else:
+                flags[flag] = path
+
+    def option(self, option, path, prefix_chars) -> list:
+        """Check one option and return its option strings"""
+        if not self.mapping(option, _OPTION_KEYS, path, ['flag']):
+            return []
+        flag = option.get('flag')
+        if not isinstance(flag, list) or not flag:
+            if isinstance(flag, list):
+                self.error("'flag' must not be empty", f"{path}.flag")
+            return []
+        strings = list()
+        for index, name in enumerate(flag):
+            if not isinstance(name, str) or not name:
+                self.error(f"expected a flag such as '--name', not {name!r}", f"{path}.flag[{index}]")
+            elif re.search(r"""['",\s]""", name):
+                self.error(f"malformed flag {name!r}; give each flag as a separate string", f"{path}.flag[{index}]")
+            else:
+                strings.append(name)
+        optional = [name for name in strings if name[0] in prefix_chars]
+        if optional and len(optional) != len(strings):
+            self.error("a flag cannot mix option strings and a positional name", f"{path}.flag")
+        elif not optional and len(strings) > 1:
+            self.error("a positional takes a single name", f"{path}.flag")
+        elif not optional and strings:
+            for key in ['required', 'dest', 'env', 'config']:
+                if key in option:
+                    self.error(f"'{key}' cannot be used with a positional", f"{path}.{key}")
+        action = option.get('action', 'store')
+        if action not in _ACTION_KEYS:
+            self.error(f"unknown action {action!r}; one of {', '.join(_ACTION_KEYS)}", f"{path}.action")
+        else:
+            for key in option:
+                if key in _OPTION_KEYS and key not in _COMMON_OPTION_KEYS and key not in _ACTION_KEYS[action]:
+                    self.error(f"'{key}' cannot be used with action {action!r}", f"{path}.{key}")
+        self.type(option.get('type'), f"{path}.type")
+        if isinstance(option.get('choices'), dict):
+            self.choices(option['choices'], f"{path}.choices")
+        nargs = option.get('nargs')
+        if nargs is not None:
+            if isinstance(nargs, bool) or (isinstance(nargs, int) and nargs < 0) or \
+                    (isinstance(nargs, str) and nargs not in _NARGS):
+                self.error(f"nargs must be a number or one of {', '.join(_NARGS)}, not {nargs!r}", f"{path}.nargs")
+            elif nargs == 0 and action in ('store', 'append', 'extend'):
+                self.error(f"nargs must not be 0 for action {action!r}; use store_true or store_const instead",
+                           f"{path}.nargs")
+            elif 'const' in option and action == 'store' and nargs != '?':
+                self.error("nargs must be '?' to supply const", f"{path}.nargs")
+        env = option.get('env')
+        if isinstance(env, list) and not all(isinstance(name, str) for name in env):
+            self.error("'env' must be a variable name or a list of names", f"{path}.env")
+        if isinstance(option.get('config'), str) and '.' not in option['config']:
+            self.error("'config' must be given as 'section.option'", f"{path}.config")
+        return optional
+
+    def choices(self, choices, path):
+        if not self.mapping(choices, _CHOICES_KEYS, path):
+            return
+        if sum(key in choices for key in _CHOICES_KEYS) != 1:
+            self.error(f"indexed choices give exactly one of {', '.join(_CHOICES_KEYS)}", path)
+        function = choices.get('callable')
+        if isinstance(function, str) and not (_DOTTED_NAME.fullmatch(function) and '.' in function):
+            self.error(f"the callable must be a dotted path such as 'package.module.function', not {function!r}",
+                       f"{path}.callable")
+
+    def type(self, type_string, path):
+        if not isinstance(type_string, str):
+            return
+        if type_string in _ACTION_KEYS:
+            self.error(f"{type_string!r} is an action, not a type; use \"action\": {type_string!r}", path)
+        elif not _DOTTED_NAME.fullmatch(type_string):
+            self.error(f"the type must be a name such as 'int' or 'pathlib.Path', not {type_string!r}", path)
+        elif '.' not in type_string and not callable(getattr(builtins, type_string, None)):
+            self.error(f"unknown type {type_string!r}", path)
+
+
+def validate_spec(parser_spec, filename=None) -> List[SpecError]:
+    """Return every problem in the spec; an empty list means it is valid"""
+    validator = _Validator(filename)
+    validator.spec(parser_spec)
+    return validator.errors
+
+
+def spec_hash(parser_spec) -> str:
+    """A hash of the spec's content which does not depend on the order of its keys"""
+    import hashlib
+    import json
+    content = json.dumps([SCHEMA_VERSION, parser_spec], sort_keys=True, default=repr, separators=(',', ':'))
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def _marker(digest) -> str:
+    return os.path.join(cache.cache_dir(), 'valid-specs', digest)
+
+
+def check_spec(parser_spec, filename=None, use_cache=True):
+    """Raise :class:`InvalidSpec` unless the spec is valid; valid specs are remembered and not checked again"""
+    digest = spec_hash(parser_spec) if use_cache else None
+    if digest is not None and os.path.exists(_marker(digest)):
+        return
+    errors = validate_spec(parser_spec, filename)
+    if errors:
+        raise InvalidSpec(errors, filename)
+    if digest is not None:
+        cache.write_json(_marker(digest), SCHEMA_VERSION)
+
+
+def handle_validate(args) -> int:
+    """The manager for the 'validate' command."""
+    from .spec import load_spec, normalize_spec
+    try:
+        errors = validate_spec(normalize_spec(load_spec(args.spec_file)), str(args.spec_file))
+    except SpecError as err:
+        errors = [err]
+    for error in errors:
+        print(error)
+    return 1 if errors else 0
@@ -0,0 +1,155 @@
+"""An interactive shell which runs many commands in one warm process
+
+The parser, the managers and whatever the managers import stay loaded between commands. Parse errors and exits
+from managers are reported and the shell carries on.
+"""
+from __future__ import annotations
+
+import cmd
+import os
+import shlex
+import sys
+import traceback
+
+from .choices import IndexedChoices
+from .experiment import ParserExit
+
+#: words that leave the shell unless the spec defines commands of the same name
+EXIT_WORDS = ('exit', 'quit')
+
+
+def _exit_status(code) -> int:
+    """The exit status for a ``sys.exit`` argument or a manager's return value"""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    return 1
+
+
+class Shell(cmd.Cmd):
+    """Read command lines and run them with the client's prebuilt parser and managers"""
+
+    def __init__(self, client, history_file=None, stdin=None, stdout=None):
+        super().__init__(stdin=stdin, stdout=stdout)
+        if stdin is not None:
+            self.use_rawinput = False
+        self.client = client
+        self.parser = client.parser
+        prog = self.parser.prog
+        self.prompt = f"({prog}) "
+        self.intro = f"{prog} interactive shell; type 'help' for help and 'exit' or Ctrl-D to leave"
+        self.history_file = history_file or os.path.join(os.path.expanduser('~'), f".{prog}_history")
+        self.exit_status = 0
+
+    @property
+    def commands(self):
+        return self.parser.subparsers.choices if self.parser.subparsers is not None else dict()
+
+    def _readline(self):
+        if not self.use_rawinput:
+            return None
+        try:
+            import readline
+        except ImportError:
+            return None
+        return readline
+
+    def preloop(self):
+        readline = self._readline()
+        if readline is not None:
+            # complete whole words: the default delimiters split options at '-'
+            self._completer_delims = readline.get_completer_delims()
+            readline.set_completer_delims(' \t\n')
+            try:
+                readline.read_history_file(self.history_file)
+            except OSError:
+                pass
+
+    def postloop(self):
+        readline = self._readline()
+        if readline is not None:
+            readline.set_completer_delims(self._completer_delims)
+            try:
+                readline.write_history_file(self.history_file)
+            except OSError:
+                pass
+
+    def emptyline(self):
+        # do not repeat the last command
+        return False
+
+    def onecmd(self, line):
+        """Run the command line; return True to leave the shell"""
+        if line == 'EOF':
+            self.stdout.write('\n')
+            return True
+        try:
+            argv = shlex.split(line)
+        except ValueError as err:
+            self.stdout.write(f"error: {err}\n")
+            self.exit_status = 2
+            return False
+        if not argv:
+            return False
+        if argv[0] in EXIT_WORDS and argv[0] not in self.commands:
+            return True
+        if argv[0] == 'help' and 'help' not in self.commands:
+            argv = [*argv[1:2], '-h']
+        if argv[:1] == ['--shell']:
+            self.stdout.write("error: already in the shell\n")
+            return False
+        self.exit_status = self.run(argv)
+        return False
+
+    def run(self, argv) -> int:
+        """Run one command and return its exit status without leaving the shell"""
+        try:
+            return _exit_status(self.client.execute(argv))
+        except ParserExit as exit:
+            return exit.status
+        except SystemExit as exit:
+            if exit.code is not None and not isinstance(exit.code, int):
+                print(exit.code, file=sys.stderr)
+            return _exit_status(exit.code)
+        except KeyboardInterrupt:
+            self.stdout.write('\n')
+            return 130
+        except Exception:
+            traceback.print_exc()
+            return 1
+
+    def completions(self, before, text) -> list:
+        """The completions for ``text`` given the part of the line before it"""
+        try:
+            tokens = shlex.split(before)
+        except ValueError:
+            tokens = before.split()
+        command = next((token for token in tokens if token in self.commands), None)
+        parser = self.parser if command is None else self.parser.subparsers.get_parser(command)
+        previous = parser._option_string_actions.get(tokens[-1]) if tokens else None
+        if previous is not None and previous.nargs != 0 and isinstance(previous.choices, IndexedChoices):
+            candidates = [str(choice) for choice in previous.choices.completions(text)]
+        elif previous is not None and previous.nargs != 0 and previous.choices is not None:
+            candidates = [str(choice) for choice in previous.choices]
+        elif text.startswith('-') or command is not None:
+            candidates = list(parser._option_string_actions)
+        else:
+            candidates = [*self.commands, 'help', *EXIT_WORDS]
+        return sorted({candidate for candidate in candidates if candidate.startswith(text)})
+
+    def complete(self, text, state):
+        if state == 0:
+            import readline
+            line = readline.get_line_buffer()
+            begidx = readline.get_begidx()
+            # readline replaces only ``text``, which may be the end of a word if the delimiters were changed
+            start = max(line.rfind(space, 0, begidx) for space in ' \t\n') + 1
+            prefix = line[start:begidx]
+            self.completion_matches = [
+                match[len(prefix):] for match in self.completions(line[:start], prefix + text)
+            ]
+        try:
+            return self.completion_matches[state]
+        except IndexError:
+            return None
@@ -0,0 +1,255 @@
+"""Load parser specs composed from reusable fragments
+
+A spec file may list other spec files under ``includes`` and refer to fragments with ``{"$ref": "<file>#<pointer>"}``
+where ``<pointer>`` is a JSON pointer such as ``/definitions/limit`` and ``<file>`` is relative to the referring file
+(omit it to refer to the same file). Local pointers that are not found fall back to the included files in order.
+
+- a reference to a list inside a list (e.g. a block of options) is spliced into the enclosing list;
+- any other keys next to ``$ref`` override the keys of the referenced mapping.
+
+Every file is parsed once and every fragment is resolved once; both are cached by file identity (path, modification
+time and size) so that large multi-file specs load in time proportional to their unique content.
+"""
+from __future__ import annotations
+
+import copy
+import os
+
+#: keys of a spec file that hold fragments rather than the parser spec
+FRAGMENT_KEYS = ('includes', 'definitions')
+
+_documents = dict()
+
+
+class SpecError(ValueError):
+    """Raised when a spec is malformed; ``path`` locates the problem in JSON path notation"""
+
+    def __init__(self, message, path='$', filename=None):
+        self.message = message
+        self.path = path
+        self.filename = filename
+        location = f"{filename}: {path}" if filename is not None else path
+        super().__init__(f"{location}: {message}")
+
+
+def _identity(filename):
+    """Identify a file by its real path, modification time and size"""
+    filename = os.path.realpath(filename)
+    stat = os.stat(filename)
+    return filename, stat.st_mtime_ns, stat.st_size
+
+
+class _Document:
+    """A parsed spec file and the fragments of it that have been resolved so far"""
+
+    def __init__(self, filename, identity, data):
+        self.filename = filename
+        self.identity = identity
+        self.data = data
+        self.fragments = dict()
+        # the documents whose fragments were used to resolve this one
+        self.dependencies = set()
+        includes = data.get('includes', []) if isinstance(data, dict) else []
+        if not isinstance(includes, list):
+            raise SpecError("'includes' must be a list of file names", '$.includes', filename)
+        self.includes = [
+            self._relative(include, f"$.includes[{index}]") for index, include in enumerate(includes)
+        ]
+
+    def _relative(self, other, path):
+        if not isinstance(other, str):
+            raise SpecError(f"expected a file name, not {other!r}", path, self.filename)
+        return os.path.join(os.path.dirname(self.filename), other)
+
+    def lookup(self, pointer):
+        """Return the raw node at the JSON pointer or raise KeyError"""
+        node = self.data
+        for token in pointer.split('/')[1:] if pointer else []:
+            token = token.replace('~1', '/').replace('~0', '~')
+            if isinstance(node, list):
+                node = node[int(token)] if token.isdigit() and int(token) < len(node) else None
+                if node is None:
+                    raise KeyError(pointer)
+            elif isinstance(node, dict) and token in node:
+                node = node[token]
+            else:
+                raise KeyError(pointer)
+        return node
+
+    def resolve(self, pointer, stack=()):
+        """Return the resolved fragment at the JSON pointer, falling back to the included files"""
+        if pointer in self.fragments:
+            return self.fragments[pointer]
+        key = (self.filename, pointer)
+        if key in stack:
+            chain = ' -> '.join(f"{os.path.basename(f)}#{p}" for f, p in stack + (key,))
+            raise SpecError(f"circular reference: {chain}", 'ref', self.filename)
+        try:
+            node = self.lookup(pointer)
+        except KeyError:
+            for include in self.includes:
+                document = _document(include)
+                self.dependencies.add(document)
+                try:
+                    return document.resolve(pointer, stack)
+                except SpecError as err:
+                    if not err.message.startswith('no fragment'):
+                        raise
+            raise SpecError(f"no fragment at '#{pointer}'", 'ref', self.filename) from None
+        if not pointer and isinstance(node, dict):
+            node = {key: value for key, value in node.items() if key not in FRAGMENT_KEYS}
+        path = '$' + ''.join(f"[{t}]" if t.isdigit() else f".{t}" for t in pointer.split('/')[1:])
+        resolved = self._resolve_node(node, path, stack + (key,))
+        self.fragments[pointer] = resolved
+        return resolved
+
+    def _ref(self, ref, path, stack):
+        if not isinstance(ref, str):
+            raise SpecError(f"'$ref' must be a string, not {ref!r}", path, self.filename)
+        filename, _, pointer = ref.partition('#')
+        if filename:
+            document = _document(self._relative(filename, path))
+            self.dependencies.add(document)
+        else:
+            document = self
+        try:
+            return document.resolve(pointer, stack)
+        except SpecError as err:
+            if err.path == 'ref':
+                raise SpecError(f"cannot resolve {ref!r}: {err.message}", path, self.filename) from None
+            raise
+
+    def _resolve_node(self, node, path, stack):
+        if isinstance(node, dict):
+            if '$ref' in node:
+                target = self._ref(node['$ref'], f"{path}.$ref", stack)
+                overrides = {key: value for key, value in node.items() if key != '$ref'}
+                if not overrides:
+                    return target
+                if not isinstance(target, dict):
+                    raise SpecError(f"cannot override keys of a non-mapping fragment {node['$ref']!r}", path,
+                                    self.filename)
+                return {**target, **self._resolve_node(overrides, path, stack)}
+            return {key: self._resolve_node(value, f"{path}.{key}", stack) for key, value in node.items()}
+        if isinstance(node, list):
+            resolved = list()
+            for index, item in enumerate(node):
+                value = self._resolve_node(item, f"{path}[{index}]", stack)
+                if isinstance(item, dict) and '$ref' in item and isinstance(value, list):
+                    resolved.extend(value)
+                else:
+                    resolved.append(value)
+            return resolved
+        return node
+
+
+def _document(filename) -> _Document:
+    """Return the cached document for the file, reading it if it has not been read yet or has changed
+
+    Included and referenced files are looked up here too, so a changed file is read again whichever file refers
+    to it.
+    """
+    filename = os.path.realpath(filename)
+    document = _documents.get(filename)
+    if document is None or not _is_current(document, dict()):
+        import json
+        try:
+            identity = _identity(filename)
+            with open(filename) as f:
+                data = json.load(f)
+        except OSError as err:
+            raise SpecError(f"cannot read spec: {err.strerror}", '$', filename) from None
+        except ValueError as err:
+            raise SpecError(f"invalid JSON: {err}", '$', filename) from None
+        document = _documents[filename] = _Document(filename, identity, data)
+    return document
+
+
+def _is_current(document, checked) -> bool:
+    """Whether the document and every document it depends on are unchanged; stale documents are evicted"""
+    if document.filename in checked:
+        return checked[document.filename]
+    checked[document.filename] = True
+    try:
+        current = _identity(document.filename) == document.identity
+    except OSError:
+        current = False
+    # check every dependency so that all stale documents are evicted
+    dependencies = [_documents.get(dep.filename) is dep and _is_current(dep, checked) for dep in document.dependencies]
+    current = current and all(dependencies)
+    checked[document.filename] = current
+    if not current and _documents.get(document.filename) is document:
+        del _documents[document.filename]
+    return current
+
+
+def load_document(filename) -> _Document:
+    """Return the parsed spec file, reading it again only if it or a file it refers to has changed"""
+    return _document(filename)
+
+
+def copy_spec(node):
+    """A deep copy of the spec in which no mapping or list is shared
+
+    Fragments used in several places resolve to the same object; :func:`copy.deepcopy` would keep them shared, and
+    :class:`CLIParser` consumes the option specs it is given.
+    """
+    if isinstance(node, dict):
+        return {key: copy_spec(value) for key, value in node.items()}
+    if isinstance(node, list):
+        return [copy_spec(item) for item in node]
+    return copy.deepcopy(node)
+
+
+def load_spec(filename) -> dict:
+    """Load the spec file with all includes and references resolved
+
+    The result is a fresh copy which the caller (e.g. :class:`CLIParser`) is free to modify.
+    """
+    return copy_spec(load_document(filename).resolve(''))
+
+
+def clear_cache():
+    """Forget all parsed files and resolved fragments"""
+    _documents.clear()
+
+
+def normalize_spec(spec) -> dict:
+    """Translate a spec in any supported format into the ``{"parser": ...}`` format that :class:`CLIParser` builds
+
+    Besides that format, the format of ``models.DynamicParser`` (``program_name``, ``commands`` and ``arguments``
+    with ``"type": "store_true"`` standing for the action) is accepted; it is translated so that the parser behaves
+    exactly as one built by the old ``DynamicParser`` did. Specs already in the ``parser`` format are returned as
+    they are.
+    """
+    if not isinstance(spec, dict) or 'parser' in spec:
+        return spec
+    if 'program_name' not in spec and 'commands' not in spec:
+        raise SpecError("unknown spec format; expected a 'parser' or a 'program_name' and 'commands'")
+    commands = list()
+    for index, command in enumerate(spec.get('commands', [])):
+        command = dict(command)
+        arguments = command.pop('arguments', [])
+        options = list()
+        for argument in arguments:
+            option = {key: value for key, value in argument.items() if key not in ['name', 'type']}
+            option['flag'] = [argument['name']] if isinstance(argument['name'], str) else list(argument['name'])
+            # DynamicParser always passed help and default
+            option['help'] = argument.get('help', '')
+            option['default'] = argument.get('default')
+            if argument.get('type') == 'store_true':
+                option['action'] = 'store_true'
+            elif argument.get('type'):
+                option['type'] = argument['type']
+            options.append(option)
+        commands.append({**command, 'options': options})
+    return {
+        "parser": {
+            "prog": spec.get('program_name'),
+            "description": spec.get('description'),
+            "subparsers": {
+                "dest": "command",
+                "commands": commands,
+            }
+        }
+    }
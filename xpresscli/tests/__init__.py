@@ -0,0 +1,13 @@
+"""The tests of xpresscli
+
+The caches written by the code under test (the markers of validated specs, the plugin index) go to a temporary
+directory instead of the user's cache directory.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+_cache_dir = tempfile.mkdtemp(prefix='xpresscli-tests-')
+atexit.register(shutil.rmtree, _cache_dir, ignore_errors=True)
+os.environ['XPRESSCLI_CACHE_DIR'] = _cache_dir
@@ -0,0 +1,36 @@
+"""The parser specs and managers shared by the tests"""
+import argparse
+import os
+
+
+def command_manager(args: argparse.Namespace) -> int:
+    """The manager for the 'command' command."""
+    print(f"{args = }")
+    return 0
+
+
+def command2_manager(args: argparse.Namespace) -> int:
+    """The manager for the 'command' command."""
+    print(f"{args = }")
+    return 0
+
+
+def _seed(name) -> dict:
+    """A fresh copy of the seed spec the harness also checks; read directly so as to leave the spec cache alone"""
+    import json
+    from ..harness import SEED_DIR
+    with open(os.path.join(SEED_DIR, f"{name}.json")) as f:
+        return json.load(f)
+
+
+def tests_parser_spec():
+    """The parser spec used by the Tests test case"""
+    return _seed('tests')
+
+
+tests_parser_spec.__test__ = False  # not a test, whatever pytest makes of the name
+
+
+def oil_parser_spec():
+    """The parser spec for the oil project github.com/emdb-empiar/oil"""
+    return _seed('oil')
@@ -0,0 +1,114 @@
+import contextlib
+import io
+import os
+import unittest
+
+from ..choices import IndexedChoices, clear_cache
+from ..experiment import CLIParser, ParserExit
+
+ENTRY_IDS = [f"emd_{index}" for index in range(20_000)]
+
+
+class TestIndexedChoices(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.addCleanup(clear_cache)
+        self.filename = os.path.join(self._tmp.name, 'entries.txt')
+        with open(self.filename, 'w') as f:
+            f.write('# entry ids\n' + '\n'.join(ENTRY_IDS) + '\n\n')
+        del _calls[:]
+
+    def parser(self, choices, **option):
+        return CLIParser({
+            "parser": {
+                "prog": "oil",
+                "subparsers": {
+                    "dest": "command",
+                    "commands": [
+                        {
+                            "name": "load",
+                            "help": "load entries",
+                            "options": [
+                                {"flag": ["-e", "--entry-name"], "choices": choices, "help": "one of %(choices)s",
+                                 **option},
+                            ],
+                        },
+                    ],
+                },
+            },
+        })
+
+    def test_sources(self):
+        """Values, files and callables give the same choices"""
+        for choices in [{"values": ENTRY_IDS}, {"file": self.filename}, {"callable": f"{__name__}.entry_ids"}]:
+            with self.subTest(choices=choices):
+                parser = self.parser(choices)
+                self.assertEqual('emd_19999', parser.parse_args(['load', '-e', 'emd_19999']).entry_name)
+                with self.assertRaises(ParserExit), contextlib.redirect_stderr(io.StringIO()):
+                    parser.parse_args(['load', '-e', 'emd_20000'])
+
+    def test_lazy(self):
+        """The source is read when a value is first checked, and only once"""
+        parser = self.parser({"callable": f"{__name__}.entry_ids"})
+        load = parser.subparsers.get_parser('load')
+        self.assertIn('ENTRY_NAME', load.format_usage())
+        self.assertEqual([], _calls)
+        parser.parse_args(['load', '-e', 'emd_1'])
+        parser.parse_args(['load', '-e', 'emd_2'])
+        self.assertEqual(1, len(_calls))
+
+    def test_file_cache(self):
+        """A file is read again only if it changes"""
+        first = IndexedChoices(filename=self.filename)
+        second = IndexedChoices(filename=self.filename)
+        self.assertIs(first.values, second.values)
+        with open(self.filename, 'a') as f:
+            f.write('emd_20000\n')
+        third = IndexedChoices(filename=self.filename)
+        self.assertIn('emd_20000', third)
+        self.assertNotIn('emd_20000', first)
+
+    def test_type(self):
+        """The values of a file are converted with the option's type"""
+        with open(self.filename, 'w') as f:
+            f.write('1\n2\n3\n')
+        parser = self.parser({"file": self.filename}, type='int')
+        self.assertEqual(3, parser.parse_args(['load', '-e', '3']).entry_name)
+
+    def test_rendering(self):
+        """Help and errors show the first few choices"""
+        parser = self.parser({"file": self.filename})
+        load = parser.subparsers.get_parser('load')
+        help_text = ' '.join(load.format_help().split())
+        self.assertIn("one of 'emd_0', 'emd_1', 'emd_10', 'emd_100', 'emd_1000', ... (20000 choices)", help_text)
+        self.assertLess(len(help_text), 1000)
+        stderr = io.StringIO()
+        with self.assertRaises(ParserExit), contextlib.redirect_stderr(stderr):
+            parser.parse_args(['load', '-e', 'emd_x'])
+        self.assertIn("invalid choice: 'emd_x' (choose from 'emd_0', 'emd_1', ", stderr.getvalue())
+        self.assertLess(len(stderr.getvalue()), 1000)
+
+    def test_completions(self):
+        choices = IndexedChoices(ENTRY_IDS)
+        self.assertEqual(['emd_1999', 'emd_19990', 'emd_19991', 'emd_19992', 'emd_19993', 'emd_19994', 'emd_19995',
+                          'emd_19996', 'emd_19997', 'emd_19998', 'emd_19999'], choices.completions('emd_1999'))
+        self.assertEqual([], choices.completions('xyz'))
+        self.assertEqual(len(ENTRY_IDS), len(choices.completions('')))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            IndexedChoices()
+        with self.assertRaises(ValueError):
+            IndexedChoices.from_spec({"values": ['a'], "file": self.filename})
+        with self.assertRaises(ValueError):
+            IndexedChoices.from_spec({"items": ['a']})
+
+
+_calls = list()
+
+
+def entry_ids():
+    _calls.append(1)
+    return iter(ENTRY_IDS)
@@ -0,0 +1,223 @@
+import contextlib
+import io
+import os
+import shlex
+import sys
+import unittest
+
+from ..client import Client, InvocationResult, get_environ
+
+
+class TestClient(unittest.TestCase):
+    def setUp(self):
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        commands = spec['parser']['subparsers']['commands']
+        commands[0]['manager'] = f"{__name__}.record_manager"
+        commands[1]['manager'] = f"{__name__}.fail_manager"
+        self.client = Client(parser_spec=spec)
+        del _calls[:]
+
+    def test_execute(self):
+        self.assertEqual(0, self.client.execute(['command', 'a.txt']))
+        self.assertEqual(['a.txt'], _calls)
+
+    def test_chain(self):
+        """Chained commands run in order with the same parser and managers"""
+        self.assertEqual(0, self.client.execute(shlex.split('command a.txt ++ command b.txt ++ command c.txt')))
+        self.assertEqual(['a.txt', 'b.txt', 'c.txt'], _calls)
+
+    def test_short_circuit(self):
+        """A failing command stops the chain unless asked to keep going"""
+        argv = shlex.split('command a.txt ++ command2 b.txt -g ++ command c.txt')
+        self.assertEqual(7, self.client.execute(argv))
+        self.assertEqual(['a.txt', 'b.txt'], _calls)
+        del _calls[:]
+        self.assertEqual(7, self.client.execute(argv, short_circuit=False))
+        self.assertEqual(['a.txt', 'b.txt', 'c.txt'], _calls)
+
+    def test_dynamic_parser_format(self):
+        """Specs in the DynamicParser format are accepted; commands without managers are parsed but not run"""
+        client = Client(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'parser_config.json'))
+        self.assertIn('calculate', client.invoke(['-h']).stdout)
+        result = client.invoke(['calculate', 'add', '1', '2'])
+        self.assertEqual(1, result.exit_status)
+        self.assertEqual("no manager for command 'calculate'", result.error.split('error: ')[-1])
+
+    def test_parsed_first(self):
+        """Nothing runs if any command in the chain is invalid"""
+        import contextlib
+        import io
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            self.client.execute(shlex.split('command a.txt ++ command --no-such-option'))
+        self.assertEqual([], _calls)
+
+
+class TestStream(unittest.TestCase):
+    def setUp(self):
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        commands = spec['parser']['subparsers']['commands']
+        commands[0]['manager'] = f"{__name__}.records_manager"
+        commands[0]['stream'] = True
+        commands[1]['manager'] = f"{__name__}.async_records_manager"
+        self.client = Client(parser_spec=spec)
+
+    def test_stream(self):
+        """Records are written and the generator's return value is the exit status"""
+        result = self.client.invoke(['command', 'a.txt'])
+        self.assertEqual(0, result.exit_status)
+        self.assertEqual('{"index": 0, "input_file": "a.txt"}\n{"index": 1, "input_file": "a.txt"}\n', result.stdout)
+        result = self.client.invoke(['command', 'a.txt', '--output-format', 'csv'])
+        self.assertEqual("index,input_file\n0,a.txt\n1,a.txt\n", result.stdout)
+        self.assertEqual(3, self.client.invoke(['command', 'fail.txt']).exit_status)
+
+    def test_async(self):
+        """Async generators are drained too; commands without stream options write JSON lines"""
+        result = self.client.invoke(['command2', 'a.txt', '-g'])
+        self.assertEqual(0, result.exit_status)
+        self.assertEqual(2, len(result.stdout.splitlines()))
+
+    def test_output_file(self):
+        """The records go to a file, compressed according to its suffix"""
+        import gzip
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'records.jsonl.gz')
+            result = self.client.invoke(['command', 'a.txt', '--output', filename])
+            self.assertEqual('', result.stdout)
+            with gzip.open(filename, 'rt') as f:
+                self.assertEqual(2, len(f.readlines()))
+
+
+class TestInvoke(unittest.TestCase):
+    def setUp(self):
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        commands = spec['parser']['subparsers']['commands']
+        commands[0]['manager'] = f"{__name__}.echo_manager"
+        commands[1]['manager'] = f"{__name__}.raise_manager"
+        self.client = Client(parser_spec=spec)
+
+    def test_result(self):
+        """The output and exit status are returned"""
+        result = self.client.invoke(['command', 'a.txt'])
+        self.assertEqual(InvocationResult(5, "a.txt\n", "", None, None), result)
+
+    def test_parse_error(self):
+        """Parse errors are returned rather than raised"""
+        result = self.client.invoke(['command', 'a.txt', '--no-such-option'])
+        self.assertEqual(2, result.exit_status)
+        self.assertIn('unrecognized arguments: --no-such-option', result.error)
+        self.assertIn('usage:', result.stderr)
+        result = self.client.invoke(['-h'])
+        self.assertEqual(0, result.exit_status)
+        self.assertIsNone(result.error)
+        self.assertIn('valid subcommands', result.stdout)
+
+    def test_commands(self):
+        """Commands are run by any of their names and a parser that cannot tell the command asks for one"""
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        command = spec['parser']['subparsers']['commands'][0]
+        command['manager'] = f"{__name__}.echo_manager"
+        command['aliases'] = ['c']
+        result = Client(parser_spec=spec).invoke(['c', 'a.txt'])
+        self.assertEqual(InvocationResult(5, "a.txt\n", "", None, None), result)
+        del spec['parser']['subparsers']['dest']
+        without_dest = Client(parser_spec=spec)
+        without_subparsers = Client(parser_spec={"parser": {"prog": "tool", "options": [{"flag": ["-v"]}]}})
+        for client, argv in [(without_dest, ['command', 'a.txt']), (without_subparsers, ['-v', '1'])]:
+            with self.subTest(argv=argv):
+                result = client.invoke(argv)
+                self.assertEqual(2, result.exit_status)
+                self.assertIn('a command is required', result.error)
+
+    def test_exceptions(self):
+        """Exceptions raised by managers are returned"""
+        result = self.client.invoke(['command2', 'a.txt', '-g'])
+        self.assertEqual(1, result.exit_status)
+        self.assertIsInstance(result.exception, RuntimeError)
+        self.assertIn('RuntimeError: a.txt', result.stderr)
+
+    def test_stdin_and_env(self):
+        """Managers read the stdin and environment of the call"""
+        result = self.client.invoke(['command', '-'], stdin="from stdin", env={'ECHO_SUFFIX': '!'})
+        self.assertEqual("from stdin!\n", result.stdout)
+        self.assertNotIn('ECHO_SUFFIX', get_environ())
+
+    def test_env_fallbacks(self):
+        """Options fall back on the environment of the call"""
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        command = spec['parser']['subparsers']['commands'][0]
+        command['options'][1]['env'] = 'OUTPUT_FILE'
+        command['manager'] = f"{__name__}.output_manager"
+        client = Client(parser_spec=spec)
+        self.assertEqual("out.txt\n", client.invoke(['command', 'a.txt'], env={'OUTPUT_FILE': 'out.txt'}).stdout)
+        self.assertEqual("b.txt\n", client.invoke(['command', 'a.txt', '-o', 'b.txt'], env={'OUTPUT_FILE': 'x'}).stdout)
+        self.assertEqual("None\n", client.invoke(['command', 'a.txt'], env={}).stdout)
+
+    def test_sys_argv_untouched(self):
+        argv = list(sys.argv)
+        self.client.invoke(['command', 'a.txt'])
+        self.assertEqual(argv, sys.argv)
+
+    def test_concurrent(self):
+        """Many threads share one client and each gets its own output"""
+        import concurrent.futures
+
+        def invoke(index):
+            if index % 5 == 0:
+                return index, self.client.invoke(['command', '--bad'])
+            return index, self.client.invoke(['command', f"file{index}.txt"], env={'ECHO_SUFFIX': f"#{index}"})
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(invoke, range(200)))
+        for index, result in results:
+            if index % 5 == 0:
+                self.assertEqual(2, result.exit_status)
+                self.assertEqual('', result.stdout)
+            else:
+                self.assertEqual(f"file{index}.txt#{index}\n", result.stdout)
+                self.assertEqual(len(f"file{index}.txt"), result.exit_status)
+                self.assertEqual('', result.stderr)
+
+
+_calls = list()
+
+
+def record_manager(args) -> int:
+    _calls.append(args.input_file)
+    return 0
+
+
+def fail_manager(args) -> int:
+    _calls.append(args.input_file)
+    return 7
+
+
+def echo_manager(args) -> int:
+    text = sys.stdin.read() if args.input_file == '-' else args.input_file
+    print(f"{text}{get_environ().get('ECHO_SUFFIX', '')}")
+    return len(args.input_file)
+
+
+def output_manager(args) -> int:
+    print(args.o)
+    return 0
+
+
+def raise_manager(args) -> int:
+    raise RuntimeError(args.input_file)
+
+
+def records_manager(args):
+    for index in range(2):
+        yield {'index': index, 'input_file': args.input_file}
+    return 3 if args.input_file == 'fail.txt' else 0
+
+
+async def async_records_manager(args):
+    for index in range(2):
+        yield {'index': index, 'input_file': args.input_file}
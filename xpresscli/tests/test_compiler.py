@@ -0,0 +1,169 @@
+import copy
+import unittest
+
+from ..compiler import compile_spec
+
+
+class TestCompiler(unittest.TestCase):
+    @staticmethod
+    def load(source):
+        """Import the generated source as a fresh module"""
+        import types
+        module = types.ModuleType('_cli')
+        exec(compile(source, '_cli.py', 'exec'), module.__dict__)
+        return module
+
+    def assertSameParse(self, parser_spec, argv):
+        from ..experiment import CLIParser
+        expected = CLIParser(copy.deepcopy(parser_spec)).parse_args(argv)
+        generated = self.load(compile_spec(parser_spec)).build_parser().parse_args(argv)
+        self.assertEqual(vars(expected), vars(generated))
+
+    def test_oil(self):
+        """The generated oil parser gives the same results as CLIParser"""
+        from .fixtures import oil_parser_spec
+        spec = oil_parser_spec()
+        for argv in [
+            'init --config-file /path/to/config.ini',
+            'status -v -d --dry-run',
+            'load -e emd_1234 --purge --force -c config.ini',
+            'load -p /path/to/emd_1234.map -p /path/to/emd_1235.map --limit 10',
+            'prep -j entries.json --use-ssh --lsf --lsf-memory 4096 --lsf-array-size 4',
+        ]:
+            with self.subTest(argv=argv):
+                self.assertSameParse(spec, argv.split())
+
+    def test_tests(self):
+        """The generated parser handles top-level options, groups and mutex groups"""
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        for argv in [
+            '-x 37 -w -y 1 -z -c c -b -n n command input.txt -o output.txt --verbose',
+            'command2 input.txt -o output.txt --verbose -f nothing',
+            'command --config-file /path/to/file --dry-run input.txt',
+        ]:
+            with self.subTest(argv=argv):
+                self.assertSameParse(spec, argv.split())
+
+    def test_help(self):
+        """The generated parser renders the same help"""
+        from ..experiment import CLIParser
+        from .fixtures import oil_parser_spec
+        spec = oil_parser_spec()
+        expected = CLIParser(copy.deepcopy(spec))
+        generated = self.load(compile_spec(spec)).build_parser()
+        self.assertEqual(expected.format_help(), generated.format_help())
+
+    def test_standalone(self):
+        """The generated module needs neither json nor xpresscli"""
+        from .fixtures import oil_parser_spec
+        spec = oil_parser_spec()
+        # env fallbacks need xpresscli at run time
+        self.assertIn('from xpresscli.experiment import', compile_spec(spec))
+        del spec['parser']['parent_parsers'][0]['options'][1]['env']
+        source = compile_spec(spec)
+        self.assertNotIn('import json', source)
+        self.assertNotIn('eval(', source)
+        self.assertNotIn('xpresscli', source.split('"""', 2)[2])
+        self.assertIn('import pathlib', source)
+        module = self.load(source)
+        self.assertEqual(('oil.handlers', 'load'), module.MANAGERS['load'])
+        self.assertEqual('command', module.COMMAND_DEST)
+
+    def test_dispatch(self):
+        """The generated main imports the manager and returns its exit status"""
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        for command in spec['parser']['subparsers']['commands']:
+            command['manager'] = 'xpresscli.tests.fixtures.command_manager'
+        module = self.load(compile_spec(spec))
+        import contextlib
+        import io
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(0, module.main(['command', 'input.txt']))
+
+    def test_dispatch_errors(self):
+        """The generated main reports a missing command or manager as Client does"""
+        import contextlib
+        import io
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        spec['parser']['subparsers']['required'] = False
+        spec['parser']['subparsers']['commands'][0]['manager'] = 'xpresscli.tests.fixtures.command_manager'
+        spec['parser']['subparsers']['commands'][1].pop('manager', None)
+        spec['parser']['subparsers']['commands'][0]['aliases'] = ['c']
+        module = self.load(compile_spec(spec))
+        self.assertEqual(module.MANAGERS['command'], module.MANAGERS['c'])
+        del spec['parser']['subparsers']['dest']
+        without_dest = self.load(compile_spec(spec))
+        without_subparsers = self.load(compile_spec({"parser": {"prog": "tool", "options": [{"flag": ["-v"]}]}}))
+        for main, argv, status, message in [
+            (module.main, [], 2, "a command is required"),
+            (module.main, ['command2', 'input.txt', '-g'], 1, "no manager for command 'command2'"),
+            (without_subparsers.main, ['-v', '1'], 2, "a command is required"),
+            (without_dest.main, ['command', 'input.txt'], 2, "a command is required"),
+        ]:
+            with self.subTest(argv=argv):
+                stderr = io.StringIO()
+                with self.assertRaises(SystemExit) as context, contextlib.redirect_stderr(stderr):
+                    main(argv)
+                self.assertEqual(status, context.exception.code)
+                self.assertIn(message, stderr.getvalue())
+
+    def test_policies(self):
+        """Commands with retry or timeout policies are dispatched through Manager"""
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        command = spec['parser']['subparsers']['commands'][0]
+        command['manager'] = 'xpresscli.tests.fixtures.command_manager'
+        command['retry'] = {"max_attempts": 2, "backoff": 0, "exit_codes": [75]}
+        command['timeout'] = 10
+        module = self.load(compile_spec(spec))
+        self.assertEqual({'retry': command['retry'], 'timeout': 10}, module.POLICIES['command'])
+        import contextlib
+        import io
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(0, module.main(['command', 'input.txt']))
+
+    def test_stream(self):
+        """Streaming commands get the output options and their records are written"""
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        command = spec['parser']['subparsers']['commands'][0]
+        command['manager'] = 'xpresscli.tests.test_client.records_manager'
+        command['stream'] = {"format": "csv"}
+        self.assertSameParse(spec, ['command', 'input.txt', '--output-format', 'table'])
+        module = self.load(compile_spec(spec))
+        self.assertEqual(('command',), module.STREAMS)
+        import contextlib
+        import io
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            self.assertEqual(0, module.main(['command', 'input.txt']))
+        self.assertEqual("index,input_file\n0,input.txt\n1,input.txt\n", stdout.getvalue())
+
+    def test_fallbacks(self):
+        """Options with env or config fallbacks resolve them as CLIParser does"""
+        from .fixtures import oil_parser_spec
+        spec = oil_parser_spec()
+        spec['parser']['config_option'] = 'config_file'
+        self.assertSameParse(spec, ['init'])
+        self.assertSameParse(spec, ['init', '-c', 'oil.ini'])
+        parser = self.load(compile_spec(spec)).build_parser()
+        self.assertEqual('config_file', parser.config_option)
+        args = parser.parse_args(['init'], env={'OILCONF': '/etc/oil.ini'})
+        self.assertEqual('/etc/oil.ini', str(args.config_file))
+
+    def test_indexed_choices(self):
+        """Options with indexed choices check them as CLIParser does"""
+        from .fixtures import oil_parser_spec
+        spec = oil_parser_spec()
+        load = spec['parser']['subparsers']['commands'][2]
+        entry_name = load['mutually_exclusive_groups'][0]['options'][0]
+        entry_name['choices'] = {"values": ["emd_1234", "emd_1235"]}
+        self.assertSameParse(spec, ['load', '-e', 'emd_1234'])
+        parser = self.load(compile_spec(spec)).build_parser()
+        import contextlib
+        import io
+        with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()) as stderr:
+            parser.parse_args(['load', '-e', 'emd_1'])
+        self.assertIn("invalid choice: 'emd_1' (choose from 'emd_1234', 'emd_1235')", stderr.getvalue())
@@ -0,0 +1,563 @@
+import argparse
+import inspect
+import pathlib
+import shlex
+import sys
+import threading
+import time
+import unittest
+
+from ..experiment import CLIParser, Manager, ManagerTimeout, ParserExit, RetryPolicy
+from .fixtures import oil_parser_spec, tests_parser_spec
+
+
+class Tests(unittest.TestCase):
+    def setUp(self):
+        self.parser_spec = tests_parser_spec()
+
+    def test_create_parser(self):
+        """
+        Test the example provided in the question.
+        """
+        # todo: there will have to be a way to prevent the wrong arguments from being passed; perhaps a schema enforced?
+        sys.argv = shlex.split('script.py -x 37 -w')
+        parser_spec = self.parser_spec  # json.loads(self.parser_spec)
+        parser_spec['parser']['subparsers']['required'] = False
+        parser = CLIParser(parser_spec=parser_spec)
+        args = parser.parse_args()
+        self.assertIsInstance(args, argparse.Namespace)
+        self.assertEqual('37', args.x)
+        self.assertTrue(args.w)
+
+    def test_create_subparser(self):
+        """
+        Test the example provided in the question.
+        """
+        parser = CLIParser(parser_spec=self.parser_spec)
+        self.assertIsInstance(parser, CLIParser)
+        self.assertIsNotNone(parser.subparsers)
+
+    def test_create_command(self):
+        """Add a command to a subparser."""
+        parser = CLIParser(parser_spec=self.parser_spec)
+        sys.argv = shlex.split('script.py command input.txt -o output.txt --verbose')
+        args = parser.parse_args()
+        self.assertEqual('command', args.subcommand)
+        sys.argv = shlex.split('script.py command2 input.txt -o output.txt --verbose -f nothing')
+        args = parser.parse_args()
+        self.assertEqual('command2', args.subcommand)
+
+    def test_manager_class(self):
+        """Test that the manager attribute can be fired
+         and an appropriate error is raised if it is not.
+         """
+        # todo: what should a manager do?
+        # 1. it should take a string
+        # 2. it should partition the string into the module and function
+        # 3. it should import the module
+        # 4. it should call the function
+        # 5. it should return the exit status
+        # manager = Manager("xpresscli.tests.fixtures.command_manager")
+        # exit_status = manager(args)
+        sys.argv = shlex.split('script.py command input.txt -o output.txt --verbose')
+        parser = CLIParser(parser_spec=self.parser_spec)
+        args = parser.parse_args()
+        manager = parser.managers[args.subcommand]
+        self.assertTrue(hasattr(manager, "module"))
+        self.assertTrue(hasattr(manager, "function"))
+        self.assertTrue(hasattr(manager, "__call__"))
+        self.assertTrue(inspect.ismethod(getattr(manager, "__call__")))
+        self.assertEqual("xpresscli.tests.fixtures.command_manager", str(manager))
+        # trigger the manager
+        exit_status = manager(args)
+        self.assertEqual(0, exit_status)
+
+    def test_option_groups(self):
+        """Test that the option groups are added to the parser."""
+        parser = CLIParser(parser_spec=self.parser_spec)
+        self.assertIsInstance(parser, CLIParser)
+        self.assertIsNotNone(parser.groups)
+        self.assertEqual(2, len(parser.groups))
+        self.assertIn('group1', parser.groups)
+        self.assertIn('group2', parser.groups)
+        self.assertIsInstance(parser.groups['group1'], argparse._ArgumentGroup)
+        self.assertIsInstance(parser.groups['group2'], argparse._ArgumentGroup)
+        self.assertIsInstance(parser.groups, dict)
+
+    def test_mutually_exclusive_groups(self):
+        """Test that the mutually exclusive groups are added to the parser."""
+        parser = CLIParser(parser_spec=self.parser_spec)
+        self.assertIsInstance(parser, CLIParser)
+        self.assertIsNotNone(parser.mutually_exclusive_groups)
+        self.assertEqual(1, len(parser.mutually_exclusive_groups))
+        self.assertIn('mutex_group', parser.mutually_exclusive_groups)
+        self.assertIsInstance(parser.mutually_exclusive_groups['mutex_group'], argparse._MutuallyExclusiveGroup)
+        self.assertIsInstance(parser.mutually_exclusive_groups, dict)
+
+    def test_parent_parser(self):
+        """Test that the parent parser is added to the parser."""
+        parser = CLIParser(parser_spec=self.parser_spec)
+        self.assertIsInstance(parser.parent_parsers, dict)
+        self.assertIn('parent1', parser.parent_parsers)
+        self.assertIsInstance(parser.parent_parsers['parent1'], argparse.ArgumentParser)
+        sys.argv = shlex.split('oil -n something command --config-file /path/to/file --dry-run'
+                               ' input.txt -o output.txt --verbose')
+        args = parser.parse_args()
+        self.assertEqual(pathlib.Path('/path/to/file'), args.config_file)
+        self.assertTrue(args.dry_run)
+        self.assertEqual('input.txt', args.input_file)
+        self.assertEqual('output.txt', args.o)
+        self.assertTrue(args.verbose)
+
+    # def test_config(self):
+    #     """Test that we can define a config file"""
+    #     parser = CLIParser(parser_spec=self.parser_spec)
+    #     self.assertIsInstance(parser.configs, LocalConfigParser)
+
+
+class TestOil(unittest.TestCase):
+    """Test using expresscli on the oil project github.com/emdb-empiar/oil"""
+
+    def setUp(self):
+        self.parser_spec = oil_parser_spec()
+        self.parser = CLIParser(parser_spec=self.parser_spec)
+        self.cli = lambda command_str: self.parser.parse_args(shlex.split(command_str))
+        self.TEST_CONFIG_PATH = pathlib.Path(__file__).parent / 'test_config.ini'
+        # os.environ['OILCONF'] = str(self.TEST_CONFIG_PATH)
+
+        # def tearDown(self):
+        #     del os.environ['OILCONF']
+
+    def test_init(self):
+        """Test oil initialisation"""
+        args = self.cli(f'init --config-file {self.TEST_CONFIG_PATH}')
+        self.assertEqual('init', args.command)
+        self.assertFalse(args.dry_run)
+        self.assertFalse(args.verbose)
+        self.assertEqual(args.config_file, self.TEST_CONFIG_PATH)
+        self.assertFalse(args.debug)
+
+    def test_status(self):
+        """Test oil status"""
+        args = self.cli(f'status --config-file {self.TEST_CONFIG_PATH}')
+        self.assertEqual('status', args.command)
+        self.assertFalse(args.dry_run)
+        self.assertFalse(args.verbose)
+        self.assertEqual(args.config_file, self.TEST_CONFIG_PATH)
+        self.assertFalse(args.debug)
+
+    def test_load(self):
+        """Test oil load"""
+        args = self.cli(f"load -e emd_1234 --config-file {self.TEST_CONFIG_PATH}")
+        self.assertEqual(args.command, 'load')
+        self.assertFalse(args.dry_run)
+        self.assertEqual(args.entry_name, 'emd_1234')
+        self.assertFalse(args.purge)
+        self.assertFalse(args.force)
+        self.assertIsNone(args.map_dir)
+        self.assertIsNone(args.extension)
+        self.assertFalse(args.no_summary)
+        self.assertEqual(args.limit, 1000)
+        args = self.cli(f"load -p /path/to/emd_1234.map --config-file {self.TEST_CONFIG_PATH}")
+        self.assertEqual(
+            [
+                pathlib.Path('/path/to/emd_1234.map'),
+            ],
+            args.entry_path
+        )
+        args = self.cli(f"load -f /path/to/entries.txt --config-file {self.TEST_CONFIG_PATH}")
+        self.assertEqual(
+            pathlib.Path('/path/to/entries.txt'),
+            args.entries_file
+        )
+        args = self.cli(f"load --no-summary --config-file {self.TEST_CONFIG_PATH}")
+        self.assertTrue(args.no_summary)
+        args = self.cli(f"load -e emd_1234 --purge --force --config-file {self.TEST_CONFIG_PATH}")
+        self.assertTrue(args.purge)
+        self.assertTrue(args.force)
+        args = self.cli(f"load -c {self.TEST_CONFIG_PATH} --use-ssh -e emd_1234")
+        self.assertTrue(args.use_ssh)
+
+    def test_prep(self):
+        """Test oil prep"""
+        args = self.cli(f"prep --config-file {self.TEST_CONFIG_PATH}")
+        self.assertEqual(args.command, 'prep')
+        self.assertEqual(args.limit, 1000)
+        self.assertFalse(args.dry_run)
+        self.assertIsNone(args.entry_name)
+        self.assertIsNone(args.entries_file)
+        self.assertFalse(args.verbose)
+        self.assertEqual(args.config_file, self.TEST_CONFIG_PATH)
+        self.assertFalse(args.debug)
+        self.assertFalse(args.no_retry)
+        args = self.cli(f"prep -c {self.TEST_CONFIG_PATH} --use-ssh")
+        self.assertTrue(args.use_ssh)
+        # self.assertTrue(args._configs.getboolean('omero', 'use_ssh'))
+        # new_path = secrets.token_urlsafe(random.randint(10, 20))
+        # os.mkdir(new_path)
+        # args = self.cli(f"prep --map-dir {new_path}")
+        # map_dir = args._configs.get('dirs', 'map_dir')
+        # self.assertEqual(map_dir, os.path.join(os.path.dirname(os.path.dirname(__file__)), new_path))
+        # # map_dir must be abs path
+        # self.assertTrue(os.path.isabs(map_dir))
+        # os.rmdir(new_path)
+        # self.assertFalse(os.path.exists(new_path))
+
+    def test_build(self):
+        """Test oil build"""
+        parser = CLIParser(parser_spec=self.parser_spec)
+        print(parser.print_help())
+
+    def test_import(self):
+        """Test oil import"""
+
+    def test_reset(self):
+        """Test oil reset"""
+
+    def test_clean(self):
+        """Test oil clean"""
+
+    def test_list(self):
+        """Test oil list"""
+
+    def test_search(self):
+        """Test oil search"""
+
+    def test_delete(self):
+        """Test oil delete"""
+
+    def test_purge(self):
+        """Test oil purge"""
+
+    def test_fix(self):
+        """Test oil fix"""
+
+    def test_sync(self):
+        """Test oil sync"""
+
+    def test_collate(self):
+        """Test oil collate"""
+
+
+class TestLazyCommands(unittest.TestCase):
+    """Command parsers are only completed when the command is selected"""
+
+    def setUp(self):
+        self.parser = CLIParser(parser_spec=oil_parser_spec())
+        self.eager_parser = CLIParser(parser_spec=oil_parser_spec(), lazy_commands=False)
+
+    def test_unselected_commands_are_bare(self):
+        """Parent options are not copied into commands that have not been used"""
+        for name in ['init', 'status', 'load', 'prep']:
+            self.assertNotIn('--dry-run', self.parser.subparsers.choices[name]._option_string_actions)
+        self.parser.parse_args(shlex.split('load -e emd_1234'))
+        self.assertIn('--dry-run', self.parser.subparsers.choices['load']._option_string_actions)
+        self.assertNotIn('--dry-run', self.parser.subparsers.choices['prep']._option_string_actions)
+
+    def test_parent_actions_are_shared(self):
+        """The parent actions are shared by reference rather than copied"""
+        parent_action = self.parser.parent_parsers['parent1']._option_string_actions['--dry-run']
+        load_parser = self.parser.subparsers.get_parser('load')
+        prep_parser = self.parser.subparsers.get_parser('prep')
+        self.assertIs(parent_action, load_parser._option_string_actions['--dry-run'])
+        self.assertIs(parent_action, prep_parser._option_string_actions['--dry-run'])
+
+    def test_concurrent_build(self):
+        """Threads selecting the same unbuilt command all see the complete parser"""
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                lambda _: self.parser.parse_args(shlex.split('load -e emd_1234 --dry-run --limit 3')), range(32)
+            ))
+        for args in results:
+            self.assertTrue(args.dry_run)
+            self.assertEqual(3, args.limit)
+
+    def test_same_as_eager(self):
+        """Lazy and eager parsers give the same results and help"""
+        self.assertEqual(self.eager_parser.format_help(), self.parser.format_help())
+        for argv in [
+            'init -c config.ini',
+            'load -e emd_1234 --purge --force --limit 10',
+            'prep -j entries.json --lsf --lsf-memory 2048',
+        ]:
+            self.assertEqual(
+                vars(self.eager_parser.parse_args(shlex.split(argv))),
+                vars(self.parser.parse_args(shlex.split(argv)))
+            )
+        for name in ['init', 'status', 'load', 'prep']:
+            self.assertEqual(
+                self.eager_parser.subparsers.choices[name].format_help(),
+                self.parser.subparsers.get_parser(name).format_help()
+            )
+
+
+class TestManagerPolicies(unittest.TestCase):
+    """Retry and timeout policies declared for a command"""
+
+    @staticmethod
+    def flaky_args(succeed_on, raises=False, **kwargs):
+        return argparse.Namespace(calls=0, succeed_on=succeed_on, raises=raises, **kwargs)
+
+    def test_retry_exit_codes(self):
+        """Retryable exit codes cause the manager to run again"""
+        manager = Manager(f"{__name__}.flaky_manager", retry={"max_attempts": 3, "backoff": 0, "exit_codes": [75]})
+        args = self.flaky_args(succeed_on=3)
+        self.assertEqual(0, manager(args))
+        self.assertEqual(3, args.calls)
+        args = self.flaky_args(succeed_on=4)
+        self.assertEqual(75, manager(args))
+        self.assertEqual(3, args.calls)
+
+    def test_retry_exceptions(self):
+        """Retryable exceptions cause the manager to run again; others propagate"""
+        manager = Manager(f"{__name__}.flaky_manager", retry={"backoff": 0, "exceptions": ["OSError"]})
+        args = self.flaky_args(succeed_on=2, raises=True)
+        self.assertEqual(0, manager(args))
+        self.assertEqual(2, args.calls)
+        manager = Manager(f"{__name__}.flaky_manager", retry={"backoff": 0, "exceptions": ["ValueError"]})
+        with self.assertRaises(ConnectionError):
+            manager(self.flaky_args(succeed_on=2, raises=True))
+
+    def test_disable_flag(self):
+        """The disable flag turns retries off"""
+        manager = Manager(f"{__name__}.flaky_manager",
+                          retry={"backoff": 0, "exit_codes": [75], "disable_flag": "no_retry"})
+        args = self.flaky_args(succeed_on=2, no_retry=True)
+        self.assertEqual(75, manager(args))
+        self.assertEqual(1, args.calls)
+
+    def test_backoff(self):
+        """Delays grow exponentially up to the maximum and jitter stays within them"""
+        policy = RetryPolicy(backoff=0.5, max_backoff=3, jitter=False)
+        self.assertEqual([0.5, 1, 2, 3], [policy.delay(attempt) for attempt in range(1, 5)])
+        policy = RetryPolicy(backoff=0.5, max_backoff=3)
+        for attempt in range(1, 5):
+            self.assertLessEqual(policy.delay(attempt), min(3, 0.5 * 2 ** (attempt - 1)))
+
+    def test_timeout(self):
+        """Sync and async managers are cancelled when they run too long"""
+        for function in ['slow_manager', 'async_slow_manager']:
+            with self.subTest(function=function):
+                manager = Manager(f"{__name__}.{function}", timeout=0.1)
+                self.assertEqual(0, manager(argparse.Namespace(seconds=0)))
+                start = time.monotonic()
+                with self.assertRaises(ManagerTimeout):
+                    manager(argparse.Namespace(seconds=5))
+                self.assertLess(time.monotonic() - start, 2)
+
+    def test_timeout_in_thread(self):
+        """Managers called outside the main thread still time out"""
+        manager = Manager(f"{__name__}.slow_manager", timeout=0.1)
+        outcome = list()
+
+        def call():
+            try:
+                manager(argparse.Namespace(seconds=1))
+            except ManagerTimeout as exception:
+                outcome.append(exception)
+
+        thread = threading.Thread(target=call)
+        thread.start()
+        thread.join()
+        self.assertIsInstance(outcome[0], ManagerTimeout)
+
+    def test_retry_timeouts(self):
+        """Timeouts can be retried"""
+        manager = Manager(f"{__name__}.slow_manager", timeout=0.05,
+                          retry={"max_attempts": 2, "backoff": 0, "exceptions": ["TimeoutError"]})
+        with self.assertRaises(ManagerTimeout):
+            manager(argparse.Namespace(seconds=0.5))
+
+    def test_spec(self):
+        """Policies are declared on the command in the spec"""
+        spec = oil_parser_spec()
+        load = spec['parser']['subparsers']['commands'][2]
+        load['retry'] = {"max_attempts": 5, "exit_codes": [75], "disable_flag": "no_retry"}
+        load['timeout'] = 3600
+        parser = CLIParser(spec)
+        self.assertEqual(5, parser.managers['load'].retry.max_attempts)
+        self.assertEqual(3600, parser.managers['load'].timeout)
+        self.assertIsNone(parser.managers['init'].retry)
+        args = parser.parse_args(shlex.split('load -e emd_1234 --no-retry 1'))
+        self.assertEqual(1, parser.managers['load'].retry.attempts(args))
+
+
+class TestParserExit(unittest.TestCase):
+    """Parsers raise ParserExit rather than calling sys.exit"""
+
+    def setUp(self):
+        self.parser = CLIParser(parser_spec=oil_parser_spec())
+
+    def test_errors(self):
+        """Errors in the main parser and in command parsers raise ParserExit"""
+        import contextlib
+        import io
+        for argv in ['nothing', 'load --no-such-option', 'load --limit many']:
+            with self.subTest(argv=argv), contextlib.redirect_stderr(io.StringIO()) as stderr:
+                with self.assertRaises(ParserExit) as context:
+                    self.parser.parse_args(shlex.split(argv))
+                self.assertEqual(2, context.exception.status)
+                self.assertEqual(2, context.exception.code)
+                self.assertIn('error:', context.exception.message)
+                self.assertIn(context.exception.message, stderr.getvalue())
+
+    def test_help(self):
+        """Help exits with status 0"""
+        import contextlib
+        import io
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            with self.assertRaises(ParserExit) as context:
+                self.parser.parse_args(['load', '-h'])
+        self.assertEqual(0, context.exception.status)
+        self.assertIn('--entry-name', stdout.getvalue())
+
+
+class TestChain(unittest.TestCase):
+    """Several commands on one command line"""
+
+    def test_split_chain(self):
+        parser = CLIParser(parser_spec=oil_parser_spec())
+        self.assertEqual(
+            [['prep', '-e', 'emd_1'], ['load', '-e', 'emd_1']],
+            parser.split_chain(shlex.split('prep -e emd_1 ++ load -e emd_1'))
+        )
+        self.assertEqual([['status']], parser.split_chain(['status', '++']))
+        self.assertEqual([[]], parser.split_chain([]))
+        self.assertTrue(parser.short_circuit)
+
+    def test_separator_as_value(self):
+        """Values equal to the separator are attached to their flag or given after '--'"""
+        parser = CLIParser(parser_spec=oil_parser_spec())
+        chain = parser.split_chain(['load', '--entry-name=++', '++', 'load', '-e++'])
+        self.assertEqual([['load', '--entry-name=++'], ['load', '-e++']], chain)
+        self.assertEqual(['++', '++'], [parser.parse_args(args).entry_name for args in chain])
+        self.assertEqual(
+            [['status'], ['init', '--', '++', 'x']],
+            parser.split_chain(shlex.split('status ++ init -- ++ x'))
+        )
+
+    def test_chain_spec(self):
+        """The separator and short-circuiting are set in the spec"""
+        spec = oil_parser_spec()
+        spec['parser']['chain'] = {"separator": "then", "short_circuit": False}
+        parser = CLIParser(parser_spec=spec)
+        self.assertEqual([['status'], ['init']], parser.split_chain(['status', 'then', 'init']))
+        self.assertFalse(parser.short_circuit)
+        self.assertEqual([['status', '++']], parser.split_chain(['status', '++']))
+
+
+class TestFallbacks(unittest.TestCase):
+    """Options taking their values from the environment or a config file"""
+
+    def setUp(self):
+        self.parser_spec = oil_parser_spec()
+        load = self.command_spec('load')
+        entry_name = load['mutually_exclusive_groups'][0]['options'][0]
+        entry_name['env'] = ['OIL_ENTRY', 'EMDB_ENTRY']
+        entry_name['config'] = 'load.entry'
+        load['options'].extend([
+            {"flag": ["--limit-from-env"], "type": "int", "default": "5", "env": "OIL_LIMIT", "config": "load.limit"},
+            {"flag": ["--quiet"], "action": "store_true", "env": "OIL_QUIET"},
+        ])
+        self.parser = CLIParser(parser_spec=self.parser_spec)
+
+    def command_spec(self, name):
+        return next(command for command in self.parser_spec['parser']['subparsers']['commands']
+                    if command['name'] == name)
+
+    def test_precedence(self):
+        """argv, then the environment, then the config, then the default"""
+        env = {'OILCONF': '/etc/oil.ini', 'OIL_LIMIT': '7', 'OIL_QUIET': 'yes'}
+        args = self.parser.parse_args(['load', '-e', 'emd_1', '--limit-from-env', '3'], env=env)
+        self.assertEqual(('emd_1', 3, True), (args.entry_name, args.limit_from_env, args.quiet))
+        self.assertEqual(pathlib.Path('/etc/oil.ini'), args.config_file)
+        args = self.parser.parse_args(['load', '-e', 'emd_1'], env=env, config={'load': {'limit': '9'}})
+        self.assertEqual(7, args.limit_from_env)
+        args = self.parser.parse_args(['load', '-e', 'emd_1'], env={}, config={'load': {'limit': '9'}})
+        self.assertEqual((9, False), (args.limit_from_env, args.quiet))
+        self.assertIsNone(args.config_file)
+        args = self.parser.parse_args(['load', '-e', 'emd_1'], env={})
+        self.assertEqual(5, args.limit_from_env)
+
+    def test_config_option(self):
+        """The config file named on the command line or in the environment is read"""
+        import tempfile
+        self.parser_spec = oil_parser_spec()
+        self.parser_spec['parser']['config_option'] = 'config_file'
+        self.command_spec('load')['options'].append({"flag": ["--threads"], "type": "int", "config": "load.threads"})
+        parser = CLIParser(parser_spec=self.parser_spec)
+        with tempfile.NamedTemporaryFile('w', suffix='.ini') as f:
+            f.write("[load]\nthreads = 4\n")
+            f.flush()
+            args = parser.parse_args(['load', '-e', 'emd_1'], env={'OILCONF': f.name})
+            self.assertEqual(4, args.threads)
+            args = parser.parse_args(['load', '-e', 'emd_1', '-c', f.name, '--threads', '2'], env={})
+            self.assertEqual(2, args.threads)
+        self.assertIsNone(parser.parse_args(['load', '-e', 'emd_1'], env={}).threads)
+
+    def test_accumulating(self):
+        """Options whose values build on their default take fallbacks too"""
+        self.parser_spec = oil_parser_spec()
+        self.command_spec('load')['options'].extend([
+            {"flag": ["--item"], "action": "append", "env": "OIL_ITEMS"},
+            {"flag": ["--items"], "action": "extend", "nargs": "+", "env": "OIL_ITEMS"},
+            {"flag": ["--tag"], "action": "append_const", "const": "x", "dest": "tags", "env": "OIL_TAG"},
+            {"flag": ["-V"], "action": "count", "dest": "verbosity", "default": 0, "env": "OIL_VERBOSITY"},
+        ])
+        parser = CLIParser(parser_spec=self.parser_spec)
+        env = {'OIL_ITEMS': 'c d', 'OIL_TAG': 'yes', 'OIL_VERBOSITY': '3'}
+        args = parser.parse_args(['load', '-e', '1', '--item', 'a', '--items', 'a', 'b', '--tag', '-VV'], env=env)
+        self.assertEqual((['a'], ['a', 'b'], ['x'], 2), (args.item, args.items, args.tags, args.verbosity))
+        args = parser.parse_args(['load', '-e', '1'], env=env)
+        self.assertEqual((['c d'], ['c', 'd'], ['x'], 3), (args.item, args.items, args.tags, args.verbosity))
+        args = parser.parse_args(['load', '-e', '1'], env={})
+        self.assertEqual((None, None, None, 0), (args.item, args.items, args.tags, args.verbosity))
+
+    def test_mutually_exclusive(self):
+        """An option in a mutually exclusive group is not taken from the environment if a sibling is given"""
+        args = self.parser.parse_args(['load', '-p', 'emd_1.map'], env={'OIL_ENTRY': 'emd_2'})
+        self.assertIsNone(args.entry_name)
+        self.assertEqual([pathlib.Path('emd_1.map')], args.entry_path)
+        args = self.parser.parse_args(['load'], env={'EMDB_ENTRY': 'emd_2'})
+        self.assertEqual('emd_2', args.entry_name)
+
+    def test_errors(self):
+        """Invalid values from the environment are reported with their source"""
+        import contextlib
+        import io
+        with contextlib.redirect_stderr(io.StringIO()) as stderr, self.assertRaises(ParserExit):
+            self.parser.parse_args(['load', '-e', 'emd_1'], env={'OIL_LIMIT': 'many'})
+        self.assertIn("invalid int value: 'many' (from environment variable OIL_LIMIT)", stderr.getvalue())
+
+    def test_help(self):
+        """The help names the environment variables and is otherwise unchanged"""
+        load = self.parser.subparsers.get_parser('load')
+        self.assertIn('[env: OILCONF]', load.format_help())
+        self.assertTrue(
+            load._option_string_actions['-e'].help.endswith('[env: OIL_ENTRY, EMDB_ENTRY; config: load.entry]')
+        )
+        self.assertEqual('5', str(load._option_string_actions['--limit-from-env'].default))
+
+
+def flaky_manager(args: argparse.Namespace) -> int:
+    """A manager that only succeeds on attempt ``args.succeed_on``."""
+    args.calls += 1
+    if args.calls < args.succeed_on:
+        if args.raises:
+            raise ConnectionError("flaky")
+        return 75
+    return 0
+
+
+def slow_manager(args: argparse.Namespace) -> int:
+    """A manager that takes ``args.seconds`` to finish."""
+    time.sleep(args.seconds)
+    return 0
+
+
+async def async_slow_manager(args: argparse.Namespace) -> int:
+    """An async manager that takes ``args.seconds`` to finish."""
+    import asyncio
+    await asyncio.sleep(args.seconds)
+    return 0
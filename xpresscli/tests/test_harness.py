@@ -0,0 +1,70 @@
+import contextlib
+import io
+import unittest
+
+from ..experiment import CLIParser
+from ..harness import (
+    MIN_RATIOS, REFERENCE, ArgvGenerator, _parse, engines, main, read_baseline, regressions, run, seed_specs,
+    slow_engines, write_baseline,
+)
+from .fixtures import oil_parser_spec, tests_parser_spec
+
+
+class TestHarness(unittest.TestCase):
+    def test_equivalence(self):
+        """Every engine agrees with the eagerly built parser on the seed specs"""
+        for name, parser_spec in seed_specs().items():
+            with self.subTest(spec=name):
+                report = run(parser_spec, count=150, seed=7)
+                self.assertEqual([], report.mismatches)
+                self.assertEqual(150, len(report.timings['lazy']))
+
+    def test_cases(self):
+        """Generation is reproducible and produces both accepted and rejected command lines"""
+        parser = CLIParser(oil_parser_spec(), lazy_commands=False)
+        cases = ArgvGenerator(parser, seed=3).cases(100)
+        self.assertEqual(cases, ArgvGenerator(CLIParser(oil_parser_spec()), seed=3).cases(100))
+        statuses = {_parse(parser, argv).status for argv in cases}
+        self.assertEqual({0, 2}, statuses)
+
+    def test_mismatch(self):
+        """A parser that behaves differently is reported"""
+        parser_spec = tests_parser_spec()
+        report = run(parser_spec, count=20, seed=1)
+        changed = tests_parser_spec()
+        changed['parser']['options'][1]['action'] = 'store_false'
+        changed_parser = CLIParser(changed, lazy_commands=False)
+        reference = engines(parser_spec)[REFERENCE]
+        mismatches = [argv for argv in report.cases if _parse(changed_parser, argv) != reference(argv)]
+        self.assertTrue(mismatches)
+
+    def test_regressions(self):
+        throughput = {'eager': 1000.0, 'lazy': 1000.0}
+        self.assertEqual({}, regressions(throughput, {'eager': 1100.0, 'lazy': 900.0}))
+        self.assertEqual({'lazy': (2000.0, 1000.0)}, regressions(throughput, {'lazy': 2000.0}))
+
+    def test_ratios(self):
+        """Every engine keeps its share of the reference's throughput"""
+        self.assertEqual({}, slow_engines({'eager': 1000.0, 'lazy': 800.0, 'other': 1.0}))
+        self.assertEqual({'lazy': (0.7, 0.5)}, slow_engines({'eager': 1000.0, 'lazy': 500.0}))
+        for name, parser_spec in seed_specs().items():
+            with self.subTest(spec=name):
+                throughput = run(parser_spec, count=300, seed=11).throughput()
+                self.assertEqual(set(MIN_RATIOS), set(throughput) - {REFERENCE})
+                self.assertEqual({}, slow_engines(throughput))
+
+    def test_baseline(self):
+        import os
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'baseline.json')
+            self.assertEqual({}, read_baseline(filename))
+            write_baseline(filename, {'oil': {'eager': 1000.0}})
+            self.assertEqual({'oil': {'eager': 1000.0}}, read_baseline(filename))
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(0, main(['-n', '100', '-b', filename]))
+            write_baseline(filename, {'oil': {'eager': 1e9}})
+            with contextlib.redirect_stdout(io.StringIO()) as stdout:
+                self.assertEqual(1, main(['-n', '20', '-b', filename]))
+            self.assertIn('regression in eager', stdout.getvalue())
+
@@ -0,0 +1,95 @@
+import os
+import sys
+import unittest
+
+from ..memprofile import ENV_VAR, FLAG, PROFILE_VERSION, requested, strip_flag
+
+
+class TestMemoryProfile(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.filename = os.path.join(self._tmp.name, 'profile.json')
+        del _retained[:]
+
+    def test_strip_flag(self):
+        self.assertEqual((['load', '-e', '1'], 'p.json'), strip_flag(['load', FLAG, 'p.json', '-e', '1']))
+        self.assertEqual((['load'], 'p.json'), strip_flag([f"{FLAG}=p.json", 'load']))
+        self.assertEqual((['load'], None), strip_flag(['load']))
+        self.assertEqual('env.json', requested(['load'], {ENV_VAR: 'env.json'}))
+        self.assertIsNone(requested(['load'], {}))
+
+    def test_profile(self):
+        """Each phase and the retained memory are reported"""
+        import json
+        from unittest import mock
+        from ..client import Client
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        spec['parser']['subparsers']['commands'][0]['manager'] = f"{__name__}.retaining_manager"
+        with mock.patch.object(sys, 'argv', ['oil', FLAG, self.filename, 'command', 'a.txt']):
+            client = Client(parser_spec=spec)
+            self.assertEqual(0, client.execute())
+        with open(self.filename) as f:
+            report = json.load(f)
+        self.assertEqual(PROFILE_VERSION, report['version'])
+        self.assertEqual(['command', 'a.txt'], report['argv'])
+        self.assertEqual(['build', 'parse', 'dispatch'], [phase['name'] for phase in report['phases']])
+        dispatch = report['phases'][2]
+        self.assertGreater(dispatch['size'], 1_000_000)
+        self.assertGreaterEqual(dispatch['peak'], dispatch['size'])
+        self.assertTrue(dispatch['top'][0]['file'].endswith('memprofile.py'))
+        self.assertEqual({'file', 'line', 'size', 'blocks'}, set(dispatch['top'][0]))
+        self.assertGreater(report['retained']['size'], 1_000_000)
+
+    def test_env(self):
+        """The environment variable turns profiling on for commands given to execute"""
+        from unittest import mock
+        from ..client import Client
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        spec['parser']['subparsers']['commands'][0]['manager'] = f"{__name__}.retaining_manager"
+        with mock.patch.dict(os.environ, {ENV_VAR: self.filename}):
+            self.assertEqual(0, Client(parser_spec=spec).execute(['command', 'a.txt']))
+        self.assertTrue(os.path.exists(self.filename))
+
+    def test_without_execute(self):
+        """Tracing stops and the build is reported when the client is not used to execute a command"""
+        import json
+        import tracemalloc
+        from unittest import mock
+        from ..client import Client
+        from .fixtures import tests_parser_spec
+        with mock.patch.dict(os.environ, {ENV_VAR: self.filename}):
+            client = Client(parser_spec=tests_parser_spec())
+            self.assertTrue(tracemalloc.is_tracing())
+            self.assertEqual(0, client.invoke(['command', 'a.txt']).exit_status)
+            self.assertFalse(tracemalloc.is_tracing())
+            with mock.patch.object(Client, 'shell', return_value=0):
+                self.assertEqual(0, Client(parser_spec=tests_parser_spec()).execute(['--shell']))
+            self.assertFalse(tracemalloc.is_tracing())
+        with open(self.filename) as f:
+            self.assertEqual(['build'], [phase['name'] for phase in json.load(f)['phases']])
+
+    def test_numbered(self):
+        """Each command executed by one client writes its own report"""
+        import json
+        from unittest import mock
+        from ..client import Client
+        from .fixtures import tests_parser_spec
+        with mock.patch.dict(os.environ, {ENV_VAR: self.filename}):
+            client = Client(parser_spec=tests_parser_spec())
+            for _ in range(3):
+                self.assertEqual(0, client.execute(['command', 'a.txt']))
+        self.assertEqual(['profile-2.json', 'profile-3.json', 'profile.json'], sorted(os.listdir(self._tmp.name)))
+        with open(os.path.join(self._tmp.name, 'profile-3.json')) as f:
+            self.assertEqual(['parse', 'dispatch'], [phase['name'] for phase in json.load(f)['phases']])
+
+
+_retained = list()
+
+
+def retaining_manager(args) -> int:
+    _retained.append(bytearray(2_000_000))
+    return 0
@@ -0,0 +1,106 @@
+import io
+import json
+import unittest
+
+from ..output import TABLE_MAX_WIDTH, stream_records, write_records
+
+
+class TestOutput(unittest.TestCase):
+    RECORDS = [{'id': 'emd_1234', 'size': 10}, {'id': 'emd_1235', 'size': 200}]
+
+    def test_jsonl(self):
+        stream = io.StringIO()
+        self.assertEqual(2, write_records(iter(self.RECORDS), stream))
+        self.assertEqual(self.RECORDS, [json.loads(line) for line in stream.getvalue().splitlines()])
+
+    def test_csv(self):
+        stream = io.StringIO()
+        write_records(iter(self.RECORDS), stream, 'csv')
+        self.assertEqual("id,size\nemd_1234,10\nemd_1235,200\n", stream.getvalue())
+
+    def test_table(self):
+        stream = io.StringIO()
+        write_records(iter(self.RECORDS + [{'id': 'x' * 100, 'size': 1}]), stream, 'table')
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(['id', 'size'], lines[0].split())
+        self.assertEqual(['emd_1234', '10'], lines[1].split())
+        self.assertTrue(lines[3].startswith('x' * (TABLE_MAX_WIDTH - 1) + '…'))
+
+    def test_failure(self):
+        """The records produced before a generator raises are written"""
+        import os
+        import tempfile
+
+        def records():
+            yield from ({'index': index} for index in range(10))
+            raise RuntimeError("failed")
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'records.jsonl')
+            with self.assertRaises(RuntimeError):
+                stream_records(records(), filename=filename)
+            with open(filename) as f:
+                self.assertEqual(10, len(f.readlines()))
+
+    def test_columns(self):
+        """Records with keys that are not columns are rejected and missing keys are left empty"""
+        for output_format in ['csv', 'table']:
+            with self.subTest(output_format=output_format):
+                stream = io.StringIO()
+                write_records(iter([{'a': 1, 'b': 2}, {'a': 3}]), stream, output_format)
+                self.assertEqual(3, len(stream.getvalue().splitlines()))
+                with self.assertRaises(ValueError):
+                    write_records(iter([{'a': 1}, {'a': 2, 'b': 3}]), io.StringIO(), output_format)
+
+    def test_exit_status(self):
+        """A generator's return value is the exit status"""
+
+        def records():
+            yield from self.RECORDS
+            return 3
+
+        stream = io.StringIO()
+        import contextlib
+        with contextlib.redirect_stdout(stream):
+            self.assertEqual(3, stream_records(records()))
+        self.assertEqual(2, len(stream.getvalue().splitlines()))
+
+    def test_async(self):
+        async def records():
+            for record in self.RECORDS:
+                yield record
+
+        import contextlib
+        stream = io.StringIO()
+        with contextlib.redirect_stdout(stream):
+            self.assertEqual(0, stream_records(records(), 'csv'))
+        self.assertEqual(3, len(stream.getvalue().splitlines()))
+
+    def test_compression(self):
+        import gzip
+        import os
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'records.jsonl.gz')
+            stream_records(iter(self.RECORDS), filename=filename)
+            with gzip.open(filename, 'rt') as f:
+                self.assertEqual(self.RECORDS, [json.loads(line) for line in f])
+
+    def test_flat_memory(self):
+        """Memory does not grow with the number of records"""
+        import os
+        import tempfile
+        import tracemalloc
+
+        def records(count):
+            for index in range(count):
+                yield {'id': f"emd_{index}", 'size': index, 'path': f"/data/emd_{index}.map"}
+
+        with tempfile.TemporaryDirectory() as directory:
+            peaks = list()
+            for count in [10_000, 100_000]:
+                tracemalloc.start()
+                stream_records(records(count), filename=os.path.join(directory, 'records.jsonl'))
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+        self.assertLess(peaks[1], 2 * peaks[0])
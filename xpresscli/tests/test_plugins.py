@@ -0,0 +1,123 @@
+import os
+import sys
+import unittest
+
+from ..plugins import _index_file, discover_commands, merge_plugin_commands
+
+
+class TestPlugins(unittest.TestCase):
+    GROUP = 'xpresscli.test.commands'
+
+    def setUp(self):
+        import tempfile
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.site = os.path.join(self._tmp.name, 'site-packages')
+        os.makedirs(os.path.join(self.site, 'fakeplugin-1.0.dist-info'))
+        with open(os.path.join(self.site, 'fakeplugin-1.0.dist-info', 'METADATA'), 'w') as f:
+            f.write("Metadata-Version: 2.1\nName: fakeplugin\nVersion: 1.0\n")
+        with open(os.path.join(self.site, 'fakeplugin-1.0.dist-info', 'entry_points.txt'), 'w') as f:
+            f.write(f"[{self.GROUP}]\nhello = fakeplugin_spec:COMMAND\n")
+        with open(os.path.join(self.site, 'fakeplugin_spec.py'), 'w') as f:
+            f.write(
+                "COMMAND = {'name': 'hello', 'help': 'say hello', 'manager': 'fakeplugin_handlers.hello',\n"
+                "           'options': [{'flag': ['--who'], 'default': 'world'}]}\n"
+            )
+        with open(os.path.join(self.site, 'fakeplugin_handlers.py'), 'w') as f:
+            f.write("def hello(args):\n    return len(args.who)\n")
+        sys.path.insert(0, self.site)
+        self.addCleanup(sys.path.remove, self.site)
+        for module in ['fakeplugin_spec', 'fakeplugin_handlers']:
+            self.addCleanup(sys.modules.pop, module, None)
+        from unittest import mock
+        environ = mock.patch.dict(os.environ, {'XPRESSCLI_CACHE_DIR': os.path.join(self._tmp.name, 'cache')})
+        environ.start()
+        self.addCleanup(environ.stop)
+
+    def test_discover(self):
+        """Commands are found through entry points and indexed"""
+        commands = discover_commands(self.GROUP, path=[self.site])
+        self.assertEqual(['hello'], [command['name'] for command in commands])
+        self.assertTrue(os.path.exists(_index_file(self.GROUP)))
+
+    def test_cached(self):
+        """The index is used until the search path changes"""
+        from unittest import mock
+        discover_commands(self.GROUP, path=[self.site])
+        with mock.patch("xpresscli.plugins._scan", side_effect=AssertionError("scanned")):
+            self.assertEqual('hello', discover_commands(self.GROUP, path=[self.site])[0]['name'])
+        # installing a package changes site-packages
+        os.utime(self.site, ns=(0, 0))
+        with mock.patch("xpresscli.plugins._scan", return_value=list()) as scan:
+            self.assertEqual([], discover_commands(self.GROUP, path=[self.site]))
+        scan.assert_called_once()
+
+    def test_merge(self):
+        """Plugin commands are merged into the parser and their managers imported only when selected"""
+        from ..experiment import CLIParser
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        spec['parser']['subparsers']['plugins'] = self.GROUP
+        parser = CLIParser(merge_plugin_commands(spec, path=[self.site]))
+        self.assertIn('hello', parser.managers)
+        self.assertNotIn('fakeplugin_handlers', sys.modules)
+        args = parser.parse_args(['hello', '--who', 'there'])
+        self.assertNotIn('fakeplugin_handlers', sys.modules)
+        self.assertEqual(5, parser.managers[args.subcommand](args))
+        self.assertIn('fakeplugin_handlers', sys.modules)
+
+    def test_parsers(self):
+        """The parser and the compiled module take plugin commands from the spec directly"""
+        from ..compiler import compile_spec
+        from ..experiment import CLIParser
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        spec['parser']['subparsers']['plugins'] = self.GROUP
+        source = compile_spec(spec)
+        self.assertNotIn('plugins', source)
+        module = dict()
+        exec(compile(source, '<compiled>', 'exec'), module)
+        for parser in [CLIParser(spec), module['build_parser']()]:
+            with self.subTest(parser=type(parser).__name__):
+                self.assertEqual('there', parser.parse_args(['hello', '--who', 'there']).who)
+
+    def test_uncached(self):
+        """Plugin commands can be loaded again when the index cannot be written"""
+        from unittest import mock
+        from ..experiment import CLIParser
+        from .fixtures import tests_parser_spec
+        blocker = os.path.join(self._tmp.name, 'file')
+        open(blocker, 'w').close()
+        with mock.patch.dict(os.environ, {'XPRESSCLI_CACHE_DIR': os.path.join(blocker, 'cache')}):
+            for _ in range(2):
+                spec = tests_parser_spec()
+                spec['parser']['subparsers']['plugins'] = self.GROUP
+                self.assertIn('hello', CLIParser(spec).managers)
+
+    def test_unserialisable(self):
+        """Data that is not JSON is not written and leaves no temporary file"""
+        from ..cache import write_json
+        filename = os.path.join(self._tmp.name, 'index.json')
+        self.assertFalse(write_json(filename, {'type': object()}))
+        self.assertEqual([], [name for name in os.listdir(self._tmp.name) if name.startswith('index')])
+
+    def test_broken(self):
+        """Entry points that fail to load or give invalid commands are skipped with a warning"""
+        with open(os.path.join(self.site, 'fakeplugin-1.0.dist-info', 'entry_points.txt'), 'a') as f:
+            f.write("missing = fakeplugin_missing:COMMAND\nnameless = fakeplugin_spec:NAMELESS\n")
+        with open(os.path.join(self.site, 'fakeplugin_spec.py'), 'a') as f:
+            f.write("NAMELESS = {'manager': 'fakeplugin_handlers.hello'}\n")
+        with self.assertWarns(UserWarning) as context:
+            commands = discover_commands(self.GROUP, path=[self.site])
+        self.assertEqual(['hello'], [command['name'] for command in commands])
+        self.assertIn('fakeplugin_missing', str(context.warnings[0].message))
+
+    def test_spec_takes_precedence(self):
+        """A plugin command cannot replace a command defined in the spec"""
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        spec['parser']['subparsers']['plugins'] = self.GROUP
+        spec['parser']['subparsers']['commands'][0]['name'] = 'hello'
+        with self.assertWarns(UserWarning):
+            merge_plugin_commands(spec, path=[self.site])
+        self.assertEqual(2, len(spec['parser']['subparsers']['commands']))
@@ -0,0 +1,94 @@
+import os
+import sys
+import unittest
+
+from ..scheduler import DONE, FAILED, LocalScheduler, SKIPPED, read_state
+
+
+class TestLocalScheduler(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.state_file = os.path.join(self._tmp.name, 'jobs.json')
+
+    def python(self, code):
+        return [sys.executable, '-c', code]
+
+    def test_dependencies(self):
+        """A job only starts once its dependencies have completed"""
+        flag = os.path.join(self._tmp.name, 'flag')
+        scheduler = LocalScheduler(state_file=self.state_file)
+        second = scheduler.submit(self.python(f"import os, sys; sys.exit(not os.path.exists({flag!r}))"),
+                                  depends_on=scheduler.submit(
+                                      self.python(f"import time; time.sleep(0.2); open({flag!r}, 'w').close()"),
+                                      name='first'))
+        third = scheduler.submit(self.python("pass"), depends_on=['first', second])
+        self.assertEqual({'1': DONE, '2': DONE, '3': DONE}, scheduler.run())
+        state = read_state(self.state_file)
+        self.assertLessEqual(state['1']['finished'], state['2']['started'])
+        self.assertEqual(['1', '2'], state[third]['depends_on'])
+
+    def test_failure(self):
+        """Jobs depending on a failed job are skipped"""
+        scheduler = LocalScheduler(state_file=self.state_file)
+        first = scheduler.submit(self.python("import sys; sys.exit(3)"))
+        second = scheduler.submit(self.python("pass"), depends_on=first)
+        third = scheduler.submit(self.python("pass"), depends_on=second)
+        independent = scheduler.submit(self.python("pass"))
+        self.assertEqual({first: FAILED, second: SKIPPED, third: SKIPPED, independent: DONE}, scheduler.run())
+        self.assertEqual(3, read_state(self.state_file)[first]['exit_status'])
+
+    def test_unknown_dependency(self):
+        """Jobs may only depend on jobs submitted before them"""
+        scheduler = LocalScheduler(state_file=self.state_file)
+        with self.assertRaises(ValueError):
+            scheduler.submit(self.python("pass"), depends_on='2')
+
+    def test_concurrency(self):
+        """No more than max_jobs jobs run at once"""
+        scheduler = LocalScheduler(state_file=self.state_file, max_jobs=1)
+        for _ in range(3):
+            scheduler.submit(self.python("import time; time.sleep(0.1)"))
+        scheduler.run()
+        jobs = sorted(read_state(self.state_file).values(), key=lambda job: job['started'])
+        for earlier, later in zip(jobs, jobs[1:]):
+            self.assertLessEqual(earlier['finished'], later['started'])
+
+    def test_memory_budget(self):
+        """Jobs run together only while their memory fits the budget"""
+        scheduler = LocalScheduler(state_file=self.state_file, memory_budget=1000)
+        first = scheduler.submit(self.python("import time; time.sleep(0.1)"), memory=600)
+        second = scheduler.submit(self.python("import time; time.sleep(0.1)"), memory=600)
+        too_big = scheduler.submit(self.python("pass"), memory=2000)
+        self.assertEqual({first: DONE, second: DONE, too_big: FAILED}, scheduler.run())
+        state = read_state(self.state_file)
+        self.assertLessEqual(state[first]['finished'], state[second]['started'])
+        self.assertIsNone(state[too_big]['started'])
+
+    @unittest.skipUnless(os.name == 'posix', "memory limits need POSIX resource limits")
+    def test_memory_limit(self):
+        """A job cannot use more memory than it requested"""
+        scheduler = LocalScheduler(state_file=self.state_file, log_dir=self._tmp.name)
+        greedy = scheduler.submit(self.python("b = bytearray(512 * 1024 * 1024)"), memory=256)
+        modest = scheduler.submit(self.python("b = bytearray(16 * 1024 * 1024)"), memory=256)
+        self.assertEqual({greedy: FAILED, modest: DONE}, scheduler.run())
+
+    def test_submit_command(self):
+        """xpresscli commands run from their spec file"""
+        import json
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        for command in spec['parser']['subparsers']['commands']:
+            command['manager'] = 'xpresscli.tests.fixtures.command_manager'
+        parser_file = os.path.join(self._tmp.name, 'cli.json')
+        with open(parser_file, 'w') as f:
+            json.dump(spec, f)
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+        scheduler = LocalScheduler(state_file=self.state_file, log_dir=self._tmp.name)
+        ok = scheduler.submit_command(parser_file, ['command', 'input.txt', '--verbose'], env=env)
+        bad = scheduler.submit_command(parser_file, ['command', '--no-such-option'], env=env)
+        self.assertEqual({ok: DONE, bad: FAILED}, scheduler.run())
+        self.assertEqual(2, read_state(self.state_file)[bad]['exit_status'])
+        with open(os.path.join(self._tmp.name, f"{ok}.out")) as f:
+            self.assertIn("input_file='input.txt'", f.read())
@@ -0,0 +1,130 @@
+import os
+import unittest
+
+from ..schema import InvalidSpec, check_spec, validate_spec
+
+
+class TestSchema(unittest.TestCase):
+    def test_valid(self):
+        """The specs used by the tests and by xpresscli itself are valid"""
+        from ..__main__ import parser_spec
+        from .fixtures import oil_parser_spec, tests_parser_spec
+        for spec in [tests_parser_spec(), oil_parser_spec(), parser_spec()]:
+            self.assertEqual([], validate_spec(spec))
+
+    def test_errors(self):
+        """Every problem is reported with its path"""
+        from .fixtures import oil_parser_spec
+        spec = oil_parser_spec()
+        parser = spec['parser']
+        parser['options'] = [{"flag": ["-o', '--output"]}, {"flag": ["--quiet"], "type": "store_true"}]
+        parser['subparsers']['commands'][0]['parents'] = ['parent1', 'parent2']
+        parser['subparsers']['commands'][1]['colour'] = 'red'
+        load = parser['subparsers']['commands'][2]
+        load['options'][0]['nargs'] = 1
+        load['options'].append({"flag": ["--dry-run"], "action": "store_true"})
+        load['options'].append({"flag": ["--jobs"], "action": "store_true", "type": "int"})
+        parser['subparsers']['commands'][3]['name'] = 'load'
+        errors = {error.path: error.message for error in validate_spec(spec)}
+        self.assertEqual({
+            '$.parser.options[0].flag[0]': "malformed flag \"-o', '--output\"; give each flag as a separate string",
+            '$.parser.options[1].type': "'store_true' is an action, not a type; use \"action\": 'store_true'",
+            '$.parser.subparsers.commands[0].parents[1]': "unknown parent parser 'parent2' (defined: 'parent1')",
+            '$.parser.subparsers.commands[1].colour': "unknown key 'colour'",
+            '$.parser.subparsers.commands[2].options[0].nargs': "'nargs' cannot be used with action 'store_true'",
+            '$.parser.subparsers.commands[2].options[6].flag': "'--dry-run' is already defined at "
+                                                               "$.parser.parent_parsers[0].options[0].flag",
+            '$.parser.subparsers.commands[2].options[7].type': "'type' cannot be used with action 'store_true'",
+            '$.parser.subparsers.commands[3].name': "command 'load' is already defined at "
+                                                    "$.parser.subparsers.commands[2].name",
+        }, errors)
+
+    def test_choices(self):
+        """Indexed choices give one source"""
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        options = spec['parser']['options']
+        options[0]['choices'] = {"values": ["37"]}
+        options.append({"flag": ["--a"], "choices": {"values": ["x"], "file": "ids.txt"}})
+        options.append({"flag": ["--b"], "choices": {"callable": "entry_ids", "columns": 2}})
+        options.append({"flag": ["--c"], "choices": "ids.txt"})
+        errors = {error.path: error.message for error in validate_spec(spec)}
+        self.assertEqual({
+            '$.parser.options[2].choices': "indexed choices give exactly one of values, file, callable",
+            '$.parser.options[3].choices.columns': "unknown key 'columns'",
+            '$.parser.options[3].choices.callable': "the callable must be a dotted path such as "
+                                                    "'package.module.function', not 'entry_ids'",
+            '$.parser.options[4].choices': "expected list or dict, not str",
+        }, errors)
+
+    def test_stream_clash(self):
+        """The output options of a streaming command must not clash with its own options"""
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        command, command2 = spec['parser']['subparsers']['commands']
+        command['options'][1]['flag'].append('--output')
+        command['stream'] = True
+        command2['stream'] = {"output_flag": ["-o"]}
+        errors = {error.path: error.message for error in validate_spec(spec)}
+        self.assertEqual({
+            '$.parser.subparsers.commands[0].stream': "'--output' is already defined at "
+                                                      "$.parser.subparsers.commands[0].options[1].flag",
+            '$.parser.subparsers.commands[1].stream.output_flag': "'-o' is already defined at "
+                                                                  "$.parser.subparsers.commands[1].options[1].flag",
+        }, errors)
+        command['options'][1]['flag'].pop()
+        command2['stream'] = {"output_flag": ["--results"]}
+        self.assertEqual([], validate_spec(spec))
+
+    def test_action_keywords(self):
+        """Each action takes the keywords argparse accepts for it"""
+        from ..experiment import CLIParser
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        options = spec['parser']['options']
+        options.append({"flag": ["--fast"], "action": "store_const", "const": 1, "dest": "speed", "metavar": "N"})
+        options.append({"flag": ["--tag"], "action": "append_const", "const": "x", "metavar": "T"})
+        self.assertEqual([], validate_spec(spec))
+        CLIParser(spec)
+        spec = tests_parser_spec()
+        spec['parser']['options'].append({"flag": ["--about"], "action": "version", "version": "1", "required": True})
+        errors = {error.path: error.message for error in validate_spec(spec)}
+        self.assertEqual({'$.parser.options[2].required': "'required' cannot be used with action 'version'"}, errors)
+
+    def test_resolve(self):
+        """Flags defined again replace the earlier ones in parsers that resolve conflicts"""
+        from ..experiment import CLIParser
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        command = spec['parser']['subparsers']['commands'][0]
+        command['options'].append({"flag": ["-o", "--out"], "help": "replaces -o"})
+        self.assertEqual(['$.parser.subparsers.commands[0].options[3].flag'],
+                         [error.path for error in validate_spec(spec)])
+        command['conflict_handler'] = 'resolve'
+        self.assertEqual([], validate_spec(spec))
+        self.assertEqual('x', CLIParser(spec).parse_args(['command', 'in.txt', '-o', 'x']).out)
+
+    def test_help_clash(self):
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        spec['parser']['parent_parsers'][0]['add_help'] = True
+        paths = [error.path for error in validate_spec(spec)]
+        self.assertEqual(['$.parser.subparsers.commands[0]'], paths)
+
+    def test_cached(self):
+        """A valid spec is only checked once"""
+        import tempfile
+        from unittest import mock
+        from .fixtures import tests_parser_spec
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.dict(os.environ, {'XPRESSCLI_CACHE_DIR': directory}):
+            spec = tests_parser_spec()
+            with mock.patch("xpresscli.schema.validate_spec", wraps=validate_spec) as validate:
+                check_spec(spec)
+                check_spec(tests_parser_spec())
+                self.assertEqual(1, validate.call_count)
+            spec['parser']['options'][0]['flag'] = ['-w']
+            with self.assertRaises(InvalidSpec) as context:
+                check_spec(spec)
+            self.assertEqual(1, len(context.exception.errors))
+            self.assertIn("'-w' is already defined", str(context.exception))
@@ -0,0 +1,92 @@
+import os
+import unittest
+
+from ..shell import Shell
+
+
+class TestShell(unittest.TestCase):
+    def setUp(self):
+        from ..client import Client
+        from .fixtures import tests_parser_spec
+        spec = tests_parser_spec()
+        for command in spec['parser']['subparsers']['commands']:
+            command['manager'] = 'xpresscli.tests.fixtures.command_manager'
+        spec['parser']['options'].append({"flag": ["--level"], "choices": ["low", "high"]})
+        spec['parser']['options'].append(
+            {"flag": ["--entry"], "choices": {"values": ["emd_1234", "emd_1235", "emd_2"]}}
+        )
+        self.client = Client(parser_spec=spec)
+
+    def run_shell(self, lines):
+        import contextlib
+        import io
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(io.StringIO()) as stderr:
+            shell = Shell(self.client, stdin=io.StringIO(''.join(f"{line}\n" for line in lines)), stdout=stdout)
+            shell.cmdloop()
+        return shell, stdout.getvalue(), stderr.getvalue()
+
+    def test_commands(self):
+        """Several commands run in one session and errors do not end it"""
+        shell, stdout, stderr = self.run_shell([
+            'command input.txt --verbose',
+            'command2 input.txt',
+            'command2 input.txt -f nothing',
+        ])
+        self.assertEqual(2, stdout.count("args = "))
+        self.assertIn("one of the arguments -f -g is required", stderr)
+        self.assertEqual(0, shell.exit_status)
+
+    def test_exit_status(self):
+        """The exit status is that of the last command"""
+        shell, _, _ = self.run_shell(['command --no-such-option'])
+        self.assertEqual(2, shell.exit_status)
+        shell, _, _ = self.run_shell(['command --no-such-option', 'command input.txt'])
+        self.assertEqual(0, shell.exit_status)
+
+    def test_exit(self):
+        """'exit' leaves the shell"""
+        shell, stdout, _ = self.run_shell(['exit', 'command input.txt'])
+        self.assertNotIn("args = ", stdout)
+
+    def test_help(self):
+        """'help' shows the help of the parser or a command"""
+        _, stdout, _ = self.run_shell(['help', 'help command'])
+        self.assertIn('valid subcommands', stdout)
+        self.assertIn('Path to the input file', stdout)
+
+    def test_managers_stay_loaded(self):
+        """The parser and the managers are reused between commands"""
+        parser = self.client.parser
+        self.run_shell(['command input.txt', 'command input.txt'])
+        self.assertIs(parser, self.client.parser)
+
+    def test_completions(self):
+        """Completions come from the spec"""
+        shell = Shell(self.client, history_file=os.devnull)
+        self.assertEqual(['command', 'command2'], shell.completions('', 'comm'))
+        self.assertEqual(['--level'], shell.completions('', '--le'))
+        self.assertEqual(['high', 'low'], shell.completions('--level ', ''))
+        self.assertEqual(['emd_1234', 'emd_1235'], shell.completions('--entry ', 'emd_1'))
+        self.assertEqual(['--verbose'], shell.completions('command input.txt ', '--verb'))
+        self.assertEqual(['--config-file'], shell.completions('command ', '--conf'))
+
+    def test_complete(self):
+        """Options complete through readline whichever completer delimiters it uses"""
+        import sys
+        import types
+        from unittest import mock
+        shell = Shell(self.client, history_file=os.devnull)
+        line = 'command input.txt --verb'
+        for begidx, text in [(len(line) - 6, '--verb'), (len(line) - 4, 'verb')]:
+            readline = types.SimpleNamespace(get_line_buffer=lambda: line, get_begidx=lambda: begidx)
+            with self.subTest(text=text), mock.patch.dict(sys.modules, {'readline': readline}):
+                self.assertEqual(text.replace('verb', 'verbose'), shell.complete(text, 0))
+                self.assertIsNone(shell.complete(text, 1))
+
+    def test_execute_shell_flag(self):
+        """Client.execute starts the shell for a leading --shell"""
+        from unittest import mock
+        with mock.patch.object(self.client, 'shell', return_value=3) as shell:
+            self.assertEqual(3, self.client.execute(['--shell']))
+        shell.assert_called_once()
@@ -0,0 +1,218 @@
+import json
+import os
+import unittest
+
+from ..spec import SpecError, _documents, clear_cache, load_document, load_spec, normalize_spec
+
+
+class TestSpec(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        from .fixtures import oil_parser_spec
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        clear_cache()
+        self.addCleanup(clear_cache)
+        self.oil_spec = oil_parser_spec()
+        parser = self.oil_spec['parser']
+        load, prep = parser['subparsers']['commands'][2:]
+        load_group, = load['mutually_exclusive_groups']
+        prep_group, = prep['mutually_exclusive_groups']
+        # the shared blocks live in a separate file
+        self.write('common.json', {
+            "definitions": {
+                "parent1": parser['parent_parsers'][0],
+                "use_ssh": load['options'][0],
+                "entry_options": load['options'][3:],
+                "input_options": load_group['options'],
+            }
+        })
+        self.write('commands.json', {
+            "includes": ["common.json"],
+            "definitions": {
+                "load": {
+                    **{key: value for key, value in load.items() if key not in ['options', 'mutually_exclusive_groups']},
+                    "options": [
+                        {"$ref": "#/definitions/use_ssh"},
+                        *load['options'][1:3],
+                        {"$ref": "#/definitions/entry_options"},
+                    ],
+                    "mutually_exclusive_groups": [
+                        {"title": "load_input_group", "required": False,
+                         "options": [{"$ref": "common.json#/definitions/input_options"}]}
+                    ]
+                },
+                "prep": {
+                    **{key: value for key, value in prep.items() if key not in ['options', 'mutually_exclusive_groups']},
+                    "options": [{"$ref": "#/definitions/use_ssh"}, {"$ref": "#/definitions/entry_options"}],
+                    "mutually_exclusive_groups": [
+                        {"title": "prep_input_group", "required": False,
+                         "options": [{"$ref": "#/definitions/input_options"}, prep_group['options'][-1]]}
+                    ]
+                },
+            }
+        })
+        self.write('cli.json', {
+            "includes": ["commands.json"],
+            "parser": {
+                **{key: value for key, value in parser.items() if key not in ['parent_parsers', 'subparsers']},
+                "parent_parsers": [{"$ref": "common.json#/definitions/parent1"}],
+                "subparsers": {
+                    **{key: value for key, value in parser['subparsers'].items() if key != 'commands'},
+                    "commands": [
+                        *parser['subparsers']['commands'][:2],
+                        {"$ref": "#/definitions/load"},
+                        {"$ref": "#/definitions/prep"},
+                    ]
+                }
+            }
+        })
+
+    def write(self, name, data):
+        path = os.path.join(self._tmp.name, name)
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        return path
+
+    def test_load_spec(self):
+        """A composed spec resolves to the same spec as the monolithic one"""
+        spec = load_spec(os.path.join(self._tmp.name, 'cli.json'))
+        self.assertEqual(self.oil_spec, spec)
+
+    def test_parse(self):
+        """The resolved spec can be used to build a parser"""
+        from ..experiment import CLIParser
+        parser = CLIParser(load_spec(os.path.join(self._tmp.name, 'cli.json')))
+        args = parser.parse_args(['prep', '-j', 'entries.json', '--limit', '5', '--dry-run'])
+        self.assertEqual(5, args.limit)
+        self.assertTrue(args.dry_run)
+
+    def test_shared_fragments(self):
+        """Commands sharing a fragment can all be built and run in one session"""
+        from ..experiment import CLIParser
+        filename = os.path.join(self._tmp.name, 'cli.json')
+        parser = CLIParser(load_spec(filename), lazy_commands=False)
+        self.assertEqual(5, parser.parse_args(['load', '-e', 'emd_1234', '--limit', '5']).limit)
+        self.assertEqual(5, parser.parse_args(['prep', '-e', 'emd_1234', '--limit', '5']).limit)
+        parser = CLIParser(load_spec(filename))
+        for command in ['load', 'prep']:
+            with self.subTest(command=command):
+                self.assertTrue(parser.parse_args([command, '-e', 'emd_1234', '--use-ssh']).use_ssh)
+
+    def test_fresh_copies(self):
+        """Each load returns an independent copy"""
+        filename = os.path.join(self._tmp.name, 'cli.json')
+        spec = load_spec(filename)
+        spec['parser']['parent_parsers'][0]['options'].clear()
+        self.assertEqual(self.oil_spec, load_spec(filename))
+
+    def test_cached(self):
+        """Each file is parsed and each fragment resolved only once"""
+        filename = os.path.join(self._tmp.name, 'cli.json')
+        load_spec(filename)
+        self.assertEqual(3, len(_documents))
+        common = load_document(os.path.join(self._tmp.name, 'common.json'))
+        fragment = common.fragments['/definitions/entry_options']
+        load_spec(filename)
+        self.assertEqual(3, len(_documents))
+        self.assertIs(fragment, common.fragments['/definitions/entry_options'])
+
+    def test_invalidated(self):
+        """A changed file is read again along with the files that refer to it"""
+        filename = os.path.join(self._tmp.name, 'common.json')
+        load_spec(os.path.join(self._tmp.name, 'cli.json'))
+        first = load_document(filename)
+        with open(filename) as f:
+            data = json.load(f)
+        data['definitions']['use_ssh']['help'] = "changed"
+        self.write('common.json', data)
+        os.utime(filename, ns=(0, 0))
+        second = load_document(filename)
+        self.assertIsNot(first, second)
+        spec = load_spec(os.path.join(self._tmp.name, 'cli.json'))
+        self.assertEqual("changed", spec['parser']['subparsers']['commands'][2]['options'][0]['help'])
+
+    def test_invalidated_include(self):
+        """A changed file is read again when it is first reached from another file"""
+        self.write('other.json', {
+            "includes": ["common.json"],
+            "parser": {"options": [{"$ref": "#/definitions/use_ssh"}]}
+        })
+        load_spec(os.path.join(self._tmp.name, 'cli.json'))
+        filename = os.path.join(self._tmp.name, 'common.json')
+        with open(filename) as f:
+            data = json.load(f)
+        data['definitions']['use_ssh']['help'] = "changed"
+        self.write('common.json', data)
+        os.utime(filename, ns=(0, 0))
+        spec = load_spec(os.path.join(self._tmp.name, 'other.json'))
+        self.assertEqual("changed", spec['parser']['options'][0]['help'])
+
+    def test_overrides(self):
+        """Keys next to '$ref' override the fragment"""
+        filename = self.write('override.json', {
+            "definitions": {"limit": {"flag": ["--limit"], "type": "int", "default": 10}},
+            "parser": {"options": [{"$ref": "#/definitions/limit", "default": 20}]}
+        })
+        self.assertEqual(
+            [{"flag": ["--limit"], "type": "int", "default": 20}],
+            load_spec(filename)['parser']['options']
+        )
+
+    def test_errors(self):
+        """Bad references are reported with their location"""
+        filename = self.write('missing.json', {"parser": {"options": [{"$ref": "#/definitions/nothing"}]}})
+        with self.assertRaises(SpecError) as context:
+            load_spec(filename)
+        self.assertEqual('$.parser.options[0].$ref', context.exception.path)
+        filename = self.write('circular.json', {
+            "definitions": {"a": {"$ref": "#/definitions/b"}, "b": {"$ref": "#/definitions/a"}},
+            "parser": {"options": [{"$ref": "#/definitions/a"}]}
+        })
+        with self.assertRaises(SpecError) as context:
+            load_spec(filename)
+        self.assertIn('circular reference', str(context.exception))
+        with self.assertRaises(SpecError):
+            load_spec(os.path.join(self._tmp.name, 'nothing.json'))
+
+    def test_models_script(self):
+        """models.py still runs as a script from the package directory"""
+        import subprocess
+        import sys
+        directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, 'models.py', 'echo', 'hi'], cwd=directory, capture_output=True,
+                                text=True)
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertIn("command='echo', text='hi'", result.stdout)
+
+    def test_normalize(self):
+        """Specs in the DynamicParser format build the same parser as DynamicParser used to"""
+        import argparse
+        from ..experiment import CLIParser
+        filename = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'parser_config.json')
+        with open(filename) as f:
+            config = json.load(f)
+        # the parser the old DynamicParser built
+        expected = argparse.ArgumentParser(prog=config["program_name"], description=config["description"])
+        subparsers = expected.add_subparsers(dest="command")
+        for subcommand in config["commands"]:
+            subparser = subparsers.add_parser(subcommand["name"], help=subcommand["help"])
+            for arg in subcommand["arguments"]:
+                kwargs = {'help': arg.get('help', ''), 'default': arg.get('default')}
+                if 'choices' in arg:
+                    kwargs['choices'] = arg['choices']
+                if arg.get('type') == "store_true":
+                    kwargs['action'] = 'store_true'
+                elif arg.get('type'):
+                    kwargs['type'] = eval(arg['type'])
+                subparser.add_argument(arg["name"], **kwargs)
+        parser = CLIParser(normalize_spec(config))
+        self.assertEqual(expected.format_help(), parser.format_help())
+        for name in ['echo', 'calculate']:
+            self.assertEqual(subparsers.choices[name].format_help(), parser.subparsers.get_parser(name).format_help())
+        for argv in [['echo', 'hello', '--number', '3', '--verbose'], ['echo', 'hello'], ['calculate', 'add', '1', '2']]:
+            self.assertEqual(expected.parse_args(argv), parser.parse_args(argv))
+        spec = {"parser": {"prog": "oil"}}
+        self.assertIs(spec, normalize_spec(spec))
+        with self.assertRaises(SpecError):
+            normalize_spec({"prog": "oil"})
@@ -0,0 +1,104 @@
+import os
+import subprocess
+import sys
+import unittest
+
+#: run a command with a minimal spec and print the modules it imported, one per line
+_PROGRAM = '''\
+import sys
+before = set(sys.modules)
+from xpresscli import Client
+spec = {
+    "parser": {
+        "prog": "tool",
+        "subparsers": {
+            "dest": "command",
+            "commands": [
+                {
+                    "name": "greet",
+                    # the tests package sets up a cache directory, which imports more than a program would
+                    "manager": "builtins.print",
+                    "options": [{"flag": ["-n", "--name"], "default": "world"}, {"flag": ["-v"], "action": "count"}],
+                },
+            ],
+        },
+    },
+}
+status = Client(parser_spec=spec, validate=sys.argv[1:] == ['--validate']).execute(['greet', '-n', 'you', '-vv'])
+print('\\n'.join(sorted(set(sys.modules) - before)), file=sys.stderr)
+sys.exit(status)
+'''
+
+#: the xpresscli modules a command needs
+RUNTIME = {
+    'xpresscli',
+    'xpresscli.cache',
+    'xpresscli.choices',
+    'xpresscli.client',
+    'xpresscli.experiment',
+    'xpresscli.memprofile',
+    'xpresscli.output',
+    'xpresscli.plugins',
+    'xpresscli.spec',
+}
+
+#: the modules that are only imported by the features that use them
+DEFERRED = (
+    'asyncio',
+    'configparser',
+    'csv',
+    'hashlib',
+    'inspect',
+    'json',
+    'pathlib',
+    'random',
+    'shlex',
+    'signal',
+    'tomllib',
+    'traceback',
+    'tracemalloc',
+    'unittest',
+    'xpresscli.compiler',
+    'xpresscli.config',
+    'xpresscli.harness',
+    'xpresscli.schema',
+)
+
+
+class TestStartup(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+
+    def imported(self, validate=False) -> set:
+        """The modules imported by running a command in a fresh interpreter"""
+        env = dict(
+            os.environ,
+            PYTHONPATH=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+            XPRESSCLI_CACHE_DIR=self._tmp.name,
+        )
+        env.pop('XPRESSCLI_MEMPROFILE', None)
+        result = subprocess.run(
+            [sys.executable, '-c', _PROGRAM] + (['--validate'] if validate else []), env=env, capture_output=True, text=True
+        )
+        self.assertEqual(0, result.returncode, result.stderr)
+        self.assertIn("name='you'", result.stdout)
+        return set(result.stderr.split())
+
+    @staticmethod
+    def package(imported) -> set:
+        return {module for module in imported if module.split('.')[0] == 'xpresscli'}
+
+    def test_minimal(self):
+        """Parsing and dispatching a command imports only what it needs"""
+        imported = self.imported()
+        self.assertEqual(RUNTIME, self.package(imported))
+        self.assertEqual([], [module for module in DEFERRED if module in imported])
+
+    def test_validated(self):
+        """A spec that has been validated before only adds hashing the spec"""
+        self.imported(validate=True)
+        imported = self.imported(validate=True)
+        self.assertEqual(RUNTIME | {'xpresscli.schema'}, self.package(imported))
+        self.assertEqual(['hashlib', 'json', 'xpresscli.schema'], [module for module in DEFERRED if module in imported])